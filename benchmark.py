@@ -0,0 +1,400 @@
+"""
+Benchmarks del Juego del Laberinto.
+
+Uso:
+    python benchmark.py [--tamanos 100 1000 ...] [--etapas combate ...]
+                        [--salida actual.json] [--comparar base.json --tolerancia 0.15]
+    python benchmark.py --memoria-habitacion [100000]
+
+Cada etapa se mide sobre rejillas sintéticas de 1e2 a 1e6 habitaciones (por
+defecto hasta 1e5; 'completo' añade 1e6). Se guardan el mejor tiempo de
+varias repeticiones y la memoria (tracemalloc) en una pasada aparte:
+
+- construccion: Director.procesar_datos (fabricar_laberinto, puertas, bichos).
+- compacta:     lo mismo con Director(compacto=True) (paredes compartidas).
+- busqueda:     Laberinto.obtener_habitacion de todas las habitaciones en
+                orden aleatorio.
+- recorrido:    Laberinto.recorrer (cada elemento del mapa una vez).
+- movimiento:   bichos caminando en orientaciones al azar por puertas
+                abiertas (Orientacion.caminar, Puerta.entrar, índice de
+                ocupantes).
+- instantanea:  capturar y restaurar el estado completo del juego
+                (instantaneas.py) con un bicho por cada 10 habitaciones.
+- combate:      un ataque del personaje en cada habitación con 5 bichos por
+                habitación (Juego.buscar_bichos).
+- combate_lote: lo mismo con el combate por lotes (combate.py).
+
+Los datos sintéticos salen de una semilla fija, así que dos ejecuciones
+hacen exactamente el mismo trabajo. Con --salida se escribe el resultado en
+JSON. Con --comparar se compara contra otro JSON y el programa termina con
+código 1 si alguna medida empeora más de --tolerancia (fracción).
+
+--memoria-habitacion N mide aparte los bytes por habitación (tracemalloc)
+de un laberinto en fila de N habitaciones construido con LaberintoBuilder,
+normal y compacto (paredes compartidas). Sin --etapas solo hace esa medida.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from eventos import SumideroNulo, bus
+from combate import activar_combate
+from instantaneas import capturar, restaurar
+from main import ORIENTACIONES, Bicho, Director, LaberintoBuilder, Personaje
+
+TAMANOS = [100, 1_000, 10_000, 100_000]
+TAMANOS_COMPLETO = TAMANOS + [1_000_000]
+SEMILLA = 12345
+# Diferencias por debajo de este tiempo se consideran ruido al comparar.
+RUIDO_SEGUNDOS = 0.0005
+
+
+# =========================================
+# ==========  DATOS SINTÉTICOS  ===========
+# =========================================
+def generar_json_rejilla(ancho, alto, bichos=0):
+    """
+    Devuelve un dict con el formato que lee Director: una rejilla ancho x alto
+    con puertas Este/Oeste y Norte/Sur entre vecinas y 'bichos' repartidos.
+    """
+    laberinto = [{"tipo": "habitacion", "num": n} for n in range(1, ancho * alto + 1)]
+    puertas = []
+    for fila in range(alto):
+        for col in range(ancho):
+            num = fila * ancho + col + 1
+            if col + 1 < ancho:
+                puertas.append([num, "Este", num + 1, "Oeste"])
+            if fila + 1 < alto:
+                puertas.append([num, "Sur", num + ancho, "Norte"])
+    total = ancho * alto
+    lista_bichos = [
+        {"modo": "Agresivo" if i % 2 else "Perezoso", "posicion": i % total + 1}
+        for i in range(bichos)
+    ]
+    return {"laberinto": laberinto, "puertas": puertas, "bichos": lista_bichos}
+
+
+def dimensiones(total):
+    """
+    (ancho, alto) de la rejilla casi cuadrada con 'total' habitaciones o algo menos.
+    """
+    ancho = max(1, int(total ** 0.5))
+    return ancho, max(1, total // ancho)
+
+
+def construir_juego(total, bichos=0, abiertas=True, compacto=True):
+    """
+    Juego sobre una rejilla de unas 'total' habitaciones.
+    """
+    ancho, alto = dimensiones(total)
+    director = Director(compacto=compacto)
+    director.procesar_datos(generar_json_rejilla(ancho, alto, bichos))
+    juego = director.obtener_juego()
+    if abiertas:
+        juego.abrir_puertas()
+    return juego
+
+
+# =========================================
+# ===============  ETAPAS  ================
+# =========================================
+# Cada etapa prepara su estado (sin medir) y devuelve (trabajo, operaciones):
+# la función que se mide y cuántas operaciones hace, para dar us/operación.
+def etapa_construccion(total, compacto=False):
+    ancho, alto = dimensiones(total)
+    datos = generar_json_rejilla(ancho, alto, bichos=total // 10)
+
+    def trabajo():
+        director = Director(compacto=compacto)
+        director.procesar_datos(datos)
+        return director.obtener_juego()
+    return trabajo, ancho * alto
+
+
+def etapa_compacta(total):
+    return etapa_construccion(total, compacto=True)
+
+
+def etapa_busqueda(total):
+    juego = construir_juego(total, abiertas=False)
+    laberinto = juego.laberinto
+    nums = list(range(1, len(laberinto.habitaciones) + 1))
+    random.Random(SEMILLA).shuffle(nums)
+
+    def trabajo():
+        for num in nums:
+            laberinto.obtener_habitacion(num)
+    return trabajo, len(nums)
+
+
+def etapa_recorrido(total):
+    juego = construir_juego(total, abiertas=False)
+    contador = [0]
+
+    def contar(elemento):
+        contador[0] += 1
+
+    def trabajo():
+        juego.laberinto.recorrer(contar)
+    return trabajo, len(juego.laberinto.habitaciones)
+
+
+def etapa_movimiento(total, pasos=4):
+    juego = construir_juego(total, bichos=max(1, total // 4))
+    rng = random.Random(SEMILLA)
+    orientaciones = list(ORIENTACIONES.values())
+    movimientos = [(b, rng.choice(orientaciones)) for _ in range(pasos) for b in juego.bichos]
+
+    def trabajo():
+        for bicho, orientacion in movimientos:
+            orientacion.caminar(bicho)
+    return trabajo, len(movimientos)
+
+
+def etapa_combate(total, bichos_por_habitacion=5, lotes=False):
+    juego = construir_juego(total, abiertas=False)
+    if lotes:
+        activar_combate(juego)
+    habitaciones = list(juego.laberinto.habitaciones)
+    for i in range(bichos_por_habitacion * len(habitaciones)):
+        b = Bicho()
+        b.ini_perezoso()
+        b.vidas = 10 ** 9  # que nadie muera durante la medida
+        juego.agregar_bicho(b)
+        b.posicion = habitaciones[i % len(habitaciones)]
+    personaje = Personaje("Bench")
+    personaje.juego = juego
+    personaje.poder = 0
+    juego.person = personaje
+
+    def trabajo():
+        for hab in habitaciones:
+            personaje.posicion = hab
+            personaje.atacar()
+    return trabajo, len(habitaciones)
+
+
+def etapa_combate_lote(total):
+    return etapa_combate(total, lotes=True)
+
+
+def etapa_instantanea(total):
+    juego = construir_juego(total, bichos=max(1, total // 10))
+    juego.agregar_personaje("Bench")
+
+    def trabajo():
+        restaurar(juego, capturar(juego))
+    return trabajo, len(juego.laberinto.habitaciones)
+
+
+ETAPAS = {
+    "construccion": etapa_construccion,
+    "compacta": etapa_compacta,
+    "busqueda": etapa_busqueda,
+    "recorrido": etapa_recorrido,
+    "movimiento": etapa_movimiento,
+    "combate": etapa_combate,
+    "combate_lote": etapa_combate_lote,
+    "instantanea": etapa_instantanea,
+}
+
+
+# =========================================
+# ===============  MEDIDA  ================
+# =========================================
+def medir(funcion, *args):
+    """
+    Ejecuta funcion(*args) sin registrar eventos y devuelve (segundos, resultado).
+    """
+    sumideros = bus.sumideros
+    bus.configurar(sumideros=[SumideroNulo()])
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            resultado = funcion(*args)
+            fin = time.perf_counter()
+    finally:
+        bus.configurar(sumideros=sumideros)
+    return fin - inicio, resultado
+
+
+def medir_etapa(nombre, total, repeticiones=3):
+    """
+    Mejor tiempo de 'repeticiones' pasadas (cada una con su preparación) y,
+    en otra pasada bajo tracemalloc, pico y memoria retenida del trabajo.
+    """
+    preparar = ETAPAS[nombre]
+    mejor = None
+    for _ in range(repeticiones):
+        _, (trabajo, operaciones) = medir(preparar, total)
+        segundos, _ = medir(trabajo)
+        mejor = segundos if mejor is None else min(mejor, segundos)
+        del trabajo
+
+    _, (trabajo, _) = medir(preparar, total)
+    tracemalloc.start()
+    try:
+        antes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        _, resultado = medir(trabajo)
+        despues, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del resultado, trabajo
+
+    return {
+        "segundos": mejor,
+        "operaciones": operaciones,
+        "us_por_operacion": mejor / operaciones * 1e6 if operaciones else 0.0,
+        "memoria_pico_kb": (pico - antes) / 1024,
+        "memoria_retenida_kb": (despues - antes) / 1024,
+    }
+
+
+def ejecutar(tamanos=TAMANOS, etapas=tuple(ETAPAS), repeticiones=3, salida=print):
+    """
+    Mide cada etapa en cada tamaño. Devuelve {"metadatos": ..., "resultados":
+    {"etapa/tamaño": medida}} listo para guardar en JSON.
+    """
+    resultados = {}
+    for nombre in etapas:
+        for total in tamanos:
+            medida = medir_etapa(nombre, total, repeticiones)
+            resultados[f"{nombre}/{total}"] = medida
+            salida(f"{nombre:>12} {total:>9}: {medida['segundos']:9.4f} s  "
+                   f"{medida['us_por_operacion']:8.2f} us/op  "
+                   f"pico {medida['memoria_pico_kb']:10.1f} KB")
+    return {"metadatos": metadatos(repeticiones), "resultados": resultados}
+
+
+def metadatos(repeticiones):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticiones": repeticiones,
+        "semilla": SEMILLA,
+    }
+
+
+# =========================================
+# =============  COMPARACIÓN  =============
+# =========================================
+def comparar(base, actual, tolerancia=0.15):
+    """
+    Compara las medidas comunes de dos resultados de ejecutar(). Devuelve la
+    lista de regresiones (clave, métrica, valor_base, valor_actual): tiempo o
+    pico de memoria más de 'tolerancia' por encima de la base.
+    """
+    regresiones = []
+    for clave, medida in actual["resultados"].items():
+        previa = base["resultados"].get(clave)
+        if previa is None:
+            continue
+        t_base, t_actual = previa["segundos"], medida["segundos"]
+        if t_actual > t_base * (1 + tolerancia) and t_actual - t_base > RUIDO_SEGUNDOS:
+            regresiones.append((clave, "segundos", t_base, t_actual))
+        m_base, m_actual = previa["memoria_pico_kb"], medida["memoria_pico_kb"]
+        if m_actual > m_base * (1 + tolerancia) and m_actual - m_base > 1:
+            regresiones.append((clave, "memoria_pico_kb", m_base, m_actual))
+    return regresiones
+
+
+def informe_comparacion(base, actual, tolerancia, salida=print):
+    salida(f"== Comparación (tolerancia {tolerancia:.0%}) ==")
+    for clave, medida in actual["resultados"].items():
+        previa = base["resultados"].get(clave)
+        if previa is None:
+            salida(f"{clave:>22}: (sin base)")
+            continue
+        cambio = medida["segundos"] / previa["segundos"] - 1 if previa["segundos"] else 0.0
+        salida(f"{clave:>22}: {previa['segundos']:9.4f} s -> {medida['segundos']:9.4f} s "
+               f"({cambio:+.1%})")
+    regresiones = comparar(base, actual, tolerancia)
+    for clave, metrica, antes, ahora in regresiones:
+        salida(f"REGRESIÓN {clave} {metrica}: {antes:.4f} -> {ahora:.4f}")
+    return regresiones
+
+
+# =========================================
+# =========  MEMORIA POR HABITACIÓN  ======
+# =========================================
+def bytes_por_habitacion(num_habitaciones, compacto):
+    """
+    Memoria retenida por habitación de un laberinto en fila construido con
+    LaberintoBuilder (habitaciones, paredes y puertas).
+    """
+    tracemalloc.start()
+    builder = LaberintoBuilder(compacto=compacto)
+    builder.fabricar_laberinto()
+    for num in range(1, num_habitaciones + 1):
+        builder.fabricar_habitacion(num)
+    for num in range(1, num_habitaciones):
+        builder.fabricar_puerta_l1(num, "Este", num + 1, "Oeste")
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return actual / num_habitaciones
+
+
+def informe_memoria_habitacion(num_habitaciones=100_000, salida=print):
+    """
+    Bytes por habitación sin y con paredes compartidas. Devuelve el dict
+    {"normal": ..., "compacto": ...}.
+    """
+    _, normal = medir(bytes_por_habitacion, num_habitaciones, False)
+    _, compacto = medir(bytes_por_habitacion, num_habitaciones, True)
+    salida(f"== Memoria por habitación ({num_habitaciones} habitaciones) ==")
+    salida(f"normal:   {normal:8.1f} bytes/habitación")
+    salida(f"compacto: {compacto:8.1f} bytes/habitación "
+           f"({(1 - compacto / normal) * 100:.0f}% menos)")
+    return {"normal": normal, "compacto": compacto}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del Juego del Laberinto.")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=None,
+                        help="número de habitaciones (por defecto 1e2..1e5)")
+    parser.add_argument("--completo", action="store_true", help="incluye 1e6 habitaciones")
+    parser.add_argument("--etapas", nargs="+", choices=list(ETAPAS), default=None)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior (base)")
+    parser.add_argument("--tolerancia", type=float, default=0.15,
+                        help="empeoramiento máximo admitido, en fracción (0.15 = 15%%)")
+    parser.add_argument("--memoria-habitacion", type=int, nargs="?", const=100_000,
+                        default=None, metavar="N",
+                        help="bytes por habitación, normal y compacto (N habitaciones)")
+    args = parser.parse_args(argv)
+
+    if args.memoria_habitacion is not None:
+        informe_memoria_habitacion(args.memoria_habitacion)
+        if args.etapas is None:
+            return 0
+    tamanos = args.tamanos or (TAMANOS_COMPLETO if args.completo else TAMANOS)
+    actual = ejecutar(tamanos, args.etapas or list(ETAPAS), args.repeticiones)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(actual, f, indent=2)
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        if informe_comparacion(base, actual, args.tolerancia):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Caché en disco de mundos ya construidos.
+
+Cada arranque repite Director.leer_archivo, fabricar_laberinto, fabricar_juego
+y fabricar_bichos aunque el JSON no haya cambiado. Con una caché:
+
+    director = Director(cache=CacheLaberintos())
+    director.procesar("nivel.json")
+    juego = director.obtener_juego()
+
+la primera vez se construye como siempre y el resultado se guarda en el
+formato binario de formato_binario.py. Las siguientes se abre ese archivo con
+mmap (LaberintoMapeado): las habitaciones se construyen según se piden, así
+que arrancar cuesta milisegundos aunque el nivel sea enorme. Lo que no se
+ahorra son los bichos: cada uno se crea al abrir y obliga a construir su
+habitación, así que con muchos bichos el arranque crece con ellos.
+
+Clave: sha256 del contenido del JSON y de la variante de construcción (clase
+del Director y del builder, compacto y versión del formato). Para no leer el
+JSON entero en cada arranque se recuerda la clave de cada ruta junto a su
+tamaño y fecha de modificación (indice.json); si cambian, se vuelve a
+calcular.
+
+Cada entrada (<clave>.lab) lleva delante una cabecera con su clave, la
+longitud del contenido y su CRC32. Al abrirla se comprueba todo. Si no
+cuadra (archivo truncado, corrupto o de otra versión) se borra y se
+reconstruye desde el JSON.
+
+Expulsión: al guardar, si las entradas pasan de 'limite_bytes' o de
+'max_entradas' se borran las usadas hace más tiempo (la fecha de
+modificación de cada entrada se actualiza al usarla).
+
+Uso:
+    python cache_laberintos.py nivel.json        # arranque en frío y en caliente
+    python cache_laberintos.py --listar
+    python cache_laberintos.py --vaciar
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+
+import formato_binario
+from formato_binario import LaberintoMapeado, a_bytes
+from main import Director
+
+MAGIA = b"LCH1"
+VERSION = 1
+
+# magia, versión, clave (sha256), longitud y CRC32 del contenido .lab
+_ENTRADA = struct.Struct("<4sH2x32sQI4x")
+_BLOQUE_HASH = 1 << 20
+
+
+def directorio_por_defecto():
+    """
+    $LABERINTO_CACHE, o laberinto/ dentro de $XDG_CACHE_HOME (~/.cache).
+    """
+    propio = os.environ.get("LABERINTO_CACHE")
+    if propio:
+        return propio
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "laberinto")
+
+
+def variante(director):
+    """
+    Texto que distingue cómo construye 'director' (entra en la clave).
+    """
+    if director.builder is None:
+        director.ini_builder()
+    return (f"{type(director).__qualname__}/{type(director.builder).__qualname__}"
+            f"/compacto={bool(director.compacto)}/lab{formato_binario.VERSION}")
+
+
+class EntradaInvalida(Exception):
+    """
+    La entrada de la caché no se puede usar (se reconstruye).
+    """
+
+
+class CacheLaberintos:
+    """
+    Directorio con un .lab por clave y un índice ruta -> clave.
+    """
+    def __init__(self, directorio=None, limite_bytes=1 << 30, max_entradas=64, verificar=True):
+        self.directorio = directorio or directorio_por_defecto()
+        self.limite_bytes = limite_bytes
+        self.max_entradas = max_entradas
+        # verificar=False se salta el CRC32 del contenido (cabecera sí).
+        self.verificar = verificar
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidas = 0
+        self._indice = None
+        os.makedirs(self.directorio, exist_ok=True)
+
+    # -- Claves --
+    def _ruta_indice(self):
+        return os.path.join(self.directorio, "indice.json")
+
+    def _leer_indice(self):
+        if self._indice is None:
+            try:
+                with open(self._ruta_indice(), "r", encoding="utf-8") as f:
+                    self._indice = json.load(f)
+            except (OSError, ValueError):
+                self._indice = {}
+        return self._indice
+
+    def _guardar_indice(self):
+        temporal = f"{self._ruta_indice()}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._indice, f)
+        os.replace(temporal, self._ruta_indice())
+
+    def clave(self, archivo_json, variante_director):
+        """
+        sha256 (hex) del JSON y la variante. Si la ruta no ha cambiado de
+        tamaño ni de fecha desde la última vez, la del índice.
+        """
+        ruta = os.path.abspath(archivo_json)
+        info = os.stat(ruta)
+        firma = [info.st_size, info.st_mtime_ns]
+        indice = self._leer_indice()
+        nombre = f"{ruta}|{variante_director}"
+        anotada = indice.get(nombre)
+        if anotada is not None and anotada[:2] == firma:
+            return anotada[2]
+        h = hashlib.sha256()
+        h.update(MAGIA + variante_director.encode("utf-8") + b"\0")
+        with open(ruta, "rb") as f:
+            while True:
+                bloque = f.read(_BLOQUE_HASH)
+                if not bloque:
+                    break
+                h.update(bloque)
+        clave = h.hexdigest()
+        indice[nombre] = firma + [clave]
+        self._guardar_indice()
+        return clave
+
+    def ruta_entrada(self, clave):
+        return os.path.join(self.directorio, f"{clave}.lab")
+
+    # -- Entradas --
+    def abrir(self, clave):
+        """
+        LaberintoMapeado de la entrada 'clave'. Lanza EntradaInvalida si no
+        existe o no supera las comprobaciones (y entonces la borra).
+        """
+        ruta = self.ruta_entrada(clave)
+        try:
+            with open(ruta, "rb") as f:
+                mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:  # ValueError: archivo vacío
+            if os.path.exists(ruta):
+                self._descartar(ruta)
+            raise EntradaInvalida(f"{ruta}: {e}") from e
+        try:
+            if len(mapa) < _ENTRADA.size:
+                raise EntradaInvalida(f"{ruta}: truncada")
+            magia, version, suya, longitud, crc = _ENTRADA.unpack_from(mapa, 0)
+            if magia != MAGIA or version != VERSION:
+                raise EntradaInvalida(f"{ruta}: no es una entrada v{VERSION}")
+            if suya.hex() != clave:
+                raise EntradaInvalida(f"{ruta}: la clave no coincide")
+            if len(mapa) != _ENTRADA.size + longitud:
+                raise EntradaInvalida(f"{ruta}: longitud {len(mapa)} != {_ENTRADA.size + longitud}")
+            contenido = memoryview(mapa)[_ENTRADA.size:]
+            if self.verificar and zlib.crc32(contenido) != crc:
+                contenido.release()
+                raise EntradaInvalida(f"{ruta}: CRC32 incorrecto")
+            try:
+                laberinto = LaberintoMapeado(buffer=contenido)
+            except (ValueError, struct.error) as e:
+                contenido.release()
+                raise EntradaInvalida(f"{ruta}: {e}") from e
+        except EntradaInvalida:
+            try:
+                mapa.close()
+            except BufferError:
+                pass  # aún hay vistas del mapa; se cerrará al soltarlas
+            self._descartar(ruta)
+            raise
+        os.utime(ruta)  # usada ahora (LRU)
+        return laberinto
+
+    def guardar(self, clave, juego):
+        """
+        Guarda 'juego' como entrada 'clave' (de forma atómica) y expulsa lo
+        que sobre. Devuelve el tamaño en bytes.
+        """
+        contenido = a_bytes(juego)
+        cabecera = _ENTRADA.pack(MAGIA, VERSION, bytes.fromhex(clave), len(contenido),
+                                 zlib.crc32(contenido))
+        ruta = self.ruta_entrada(clave)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(cabecera)
+            f.write(contenido)
+        os.replace(temporal, ruta)
+        self.expulsar(conservar=ruta)
+        return len(cabecera) + len(contenido)
+
+    def _descartar(self, ruta):
+        self.invalidas += 1
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    def entradas(self):
+        """
+        Lista de (ruta, bytes, último uso) de las entradas, de la más antigua
+        a la más reciente.
+        """
+        lista = []
+        with os.scandir(self.directorio) as it:
+            for e in it:
+                if e.name.endswith(".lab") and e.is_file():
+                    info = e.stat()
+                    lista.append((e.path, info.st_size, info.st_mtime))
+        lista.sort(key=lambda x: x[2])
+        return lista
+
+    def expulsar(self, conservar=None):
+        """
+        Borra las entradas usadas hace más tiempo hasta quedar dentro de
+        limite_bytes y max_entradas. Devuelve cuántas ha borrado.
+        """
+        lista = self.entradas()
+        total = sum(tam for _, tam, _ in lista)
+        borradas = 0
+        for ruta, tam, _ in lista:
+            if total <= self.limite_bytes and len(lista) - borradas <= self.max_entradas:
+                break
+            if ruta == conservar:
+                continue
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tam
+            borradas += 1
+        return borradas
+
+    def vaciar(self):
+        for ruta, _, _ in self.entradas():
+            os.remove(ruta)
+        self._indice = {}
+        self._guardar_indice()
+
+    # -- Director --
+    def procesar(self, director, archivo_json):
+        """
+        Deja en 'director' el juego de 'archivo_json': desde la caché si hay
+        una entrada válida y, si no, construyéndolo (y guardándolo).
+        """
+        inicio = time.perf_counter()
+        clave = self.clave(archivo_json, variante(director))
+        try:
+            laberinto = self.abrir(clave)
+        except EntradaInvalida:
+            self.fallos += 1
+            director.leer_archivo(archivo_json)
+            director.procesar_datos(director.dict_data)
+            self.guardar(clave, director.obtener_juego())
+            director.estadisticas = {"cache": "fallo", "clave": clave,
+                                     "segundos": time.perf_counter() - inicio}
+            return
+        self.aciertos += 1
+        director.ini_builder()
+        builder = director.builder
+        builder.laberinto = laberinto
+        builder.fabricar_juego()  # el Juego de la variante del builder
+        laberinto.fabricar_juego(builder.juego)
+        director.estadisticas = {"cache": "acierto", "clave": clave,
+                                 "segundos": time.perf_counter() - inicio}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Caché de laberintos construidos.")
+    parser.add_argument("laberinto", nargs="?", help="archivo JSON")
+    parser.add_argument("--directorio", default=None)
+    parser.add_argument("--compacto", action="store_true")
+    parser.add_argument("--limite-mb", type=float, default=1024)
+    parser.add_argument("--listar", action="store_true")
+    parser.add_argument("--vaciar", action="store_true")
+    args = parser.parse_args(argv)
+
+    cache = CacheLaberintos(args.directorio, limite_bytes=int(args.limite_mb * (1 << 20)))
+    if args.vaciar:
+        cache.vaciar()
+    if args.listar:
+        for ruta, tam, uso in cache.entradas():
+            print(f"{os.path.basename(ruta)}  {tam / (1 << 20):9.2f} MB  "
+                  f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(uso))}")
+    if not args.laberinto:
+        return
+    from eventos import SumideroNulo, bus
+    bus.configurar(sumideros=[SumideroNulo()])
+    for intento in ("primero", "segundo"):
+        director = Director(compacto=args.compacto, cache=cache)
+        director.procesar(args.laberinto)
+        juego = director.obtener_juego()
+        e = director.estadisticas
+        print(f"{intento}: {e['cache']} en {e['segundos'] * 1e3:.1f} ms "
+              f"({len(juego.bichos)} bichos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Búsqueda de caminos por el grafo de habitaciones y puertas.
+
+- vecinas(hab): habitaciones alcanzables desde 'hab' por puertas abiertas.
+- distancias(origen): BFS con el número de puertas hasta cada habitación.
+- buscar_camino(origen, destino, heuristica): A* (BFS si no hay heurística).
+- CampoDistancias: distancias desde todas las habitaciones hasta un ente
+  objetivo, compartidas por todos los bichos. Se recalculan solo cuando el
+  objetivo cambia de habitación o una puerta se cierra en un camino mínimo.
+  Si una puerta se abre, se relajan solo las distancias que mejoran. Cada bicho
+  elige su paso mirando sus cuatro lados, así que perseguir con 100k
+  bichos cuesta una actualización del campo por tick, no una búsqueda por bicho.
+- PaseoAleatorio: en lugar del campo, cada bicho cruza al azar una puerta
+  abierta de su habitación (con un random.Random propio, reproducible).
+
+Ejemplo:
+    campo = activar_persecucion(juego)   # los bichos van hacia juego.person
+"""
+import collections
+import heapq
+import itertools
+import threading
+
+from eventos import TipoEvento, bus
+from main import ORIENTACIONES
+
+LADOS = ("norte", "sur", "este", "oeste")
+
+
+def _otro_lado(puerta, hab):
+    lado1 = puerta.lado1
+    return puerta.lado2 if lado1 == hab else lado1
+
+
+def vecinas(hab):
+    """
+    Genera (nombre_lado, habitacion_vecina) por cada puerta abierta de 'hab'.
+    """
+    for lado in LADOS:
+        elemento = getattr(hab, lado)
+        if elemento is not None and elemento.es_puerta() and elemento.abierta:
+            yield lado, _otro_lado(elemento, hab)
+
+
+def distancias(origen):
+    """
+    Dict habitacion -> número de puertas desde 'origen' (solo las alcanzables).
+    """
+    dist = {origen: 0}
+    cola = collections.deque([origen])
+    while cola:
+        hab = cola.popleft()
+        d = dist[hab] + 1
+        for _, otra in vecinas(hab):
+            if otra not in dist:
+                dist[otra] = d
+                cola.append(otra)
+    return dist
+
+
+def buscar_camino(origen, destino, heuristica=None):
+    """
+    Lista de habitaciones de 'origen' a 'destino' (ambas incluidas) con A*,
+    o None si no hay camino. 'heuristica(hab, destino)' debe ser admisible
+    (no sobrestimar el número de puertas); sin ella equivale a un BFS.
+    """
+    if heuristica is None:
+        def heuristica(hab, destino):
+            return 0
+    orden = itertools.count()
+    abiertos = [(heuristica(origen, destino), next(orden), origen)]
+    coste = {origen: 0}
+    previa = {origen: None}
+    while abiertos:
+        _, _, hab = heapq.heappop(abiertos)
+        if hab == destino:
+            camino = []
+            while hab is not None:
+                camino.append(hab)
+                hab = previa[hab]
+            camino.reverse()
+            return camino
+        g = coste[hab] + 1
+        for _, otra in vecinas(hab):
+            if g < coste.get(otra, g + 1):
+                coste[otra] = g
+                previa[otra] = hab
+                heapq.heappush(abiertos, (g + heuristica(otra, destino), next(orden), otra))
+    return None
+
+
+def manhattan(laberinto):
+    """
+    Heurística para LaberintoRejilla: distancia Manhattan entre celdas.
+    """
+    def heuristica(hab, destino):
+        f1, c1 = laberinto.coordenadas(hab.num)
+        f2, c2 = laberinto.coordenadas(destino.num)
+        return abs(f1 - f2) + abs(c1 - c2)
+    return heuristica
+
+
+class CampoDistancias:
+    """
+    Distancias hasta la habitación de 'objetivo', que se mantienen al día
+    escuchando los eventos de puertas del bus.
+    """
+    def __init__(self, objetivo):
+        self.objetivo = objetivo
+        self.dist = {}
+        self._origen = None
+        self._sucio = True
+        self._cerrojo = threading.RLock()
+        self.actualizaciones = 0
+        bus.suscribir(TipoEvento.PUERTA, self._puerta_cambiada)
+
+    def desactivar(self):
+        bus.desuscribir(TipoEvento.PUERTA, self._puerta_cambiada)
+
+    def actualizar(self):
+        """
+        Recalcula el campo si el objetivo se ha movido o se cerró una puerta
+        de un camino mínimo. Las consultas lo llaman solas.
+        """
+        pos = self.objetivo.posicion
+        if not self._sucio and pos == self._origen:
+            return
+        with self._cerrojo:
+            pos = self.objetivo.posicion
+            if self._sucio or pos != self._origen:
+                self.dist = distancias(pos) if pos is not None else {}
+                self._origen = pos
+                self._sucio = False
+                self.actualizaciones += 1
+
+    def invalidar(self):
+        """
+        Obliga a recalcular en la próxima consulta (p. ej. si las puertas
+        cambiaron sin emitir eventos, al restaurar una instantánea).
+        """
+        with self._cerrojo:
+            self._sucio = True
+
+    def distancia(self, hab):
+        self.actualizar()
+        return self.dist.get(hab)
+
+    def orientacion_hacia_objetivo(self, hab):
+        """
+        Orientación (Norte(), Sur()...) que acerca un paso al objetivo desde
+        'hab', o None si ya está allí o no hay camino.
+        """
+        self.actualizar()
+        d = self.dist.get(hab)
+        if not d:
+            return None
+        for lado, otra in vecinas(hab):
+            if self.dist.get(otra) == d - 1:
+                return ORIENTACIONES[lado]
+        return None
+
+    # -- Puertas --
+    def _puerta_cambiada(self, evento):
+        puerta = evento.datos["puerta"]
+        a, b = puerta.lado1, puerta.lado2
+        with self._cerrojo:
+            if self._sucio:
+                return
+            da, db = self.dist.get(a), self.dist.get(b)
+            if da is None and db is None:
+                return  # no toca la zona alcanzable
+            if evento.datos["abierta"]:
+                self._relajar(a, b, da, db)
+            elif da is not None and db is not None and abs(da - db) == 1:
+                # Puede que fuera parte de un camino mínimo: se rehace al consultar.
+                self._sucio = True
+
+    def _relajar(self, a, b, da, db):
+        # Abrir una puerta solo puede acortar distancias: BFS desde el lado que mejora.
+        if da is None or (db is not None and db < da):
+            a, b, da, db = b, a, db, da
+        if db is not None and db <= da + 1:
+            return
+        self.dist[b] = da + 1
+        cola = collections.deque([b])
+        while cola:
+            hab = cola.popleft()
+            d = self.dist[hab] + 1
+            for _, otra in vecinas(hab):
+                actual = self.dist.get(otra)
+                if actual is None or d < actual:
+                    self.dist[otra] = d
+                    cola.append(otra)
+
+
+def activar_persecucion(juego, objetivo=None):
+    """
+    Hace que los bichos de 'juego' persigan a 'objetivo' (por defecto, al
+    personaje) con un único campo de distancias compartido.
+    """
+    if juego.campo is not None:
+        juego.campo.desactivar()
+    juego.campo = CampoDistancias(objetivo if objetivo is not None else juego.person)
+    return juego.campo
+
+
+def desactivar_persecucion(juego):
+    if juego.campo is not None:
+        juego.campo.desactivar()
+        juego.campo = None
+
+
+class PaseoAleatorio:
+    """
+    Ocupa el lugar de Juego.campo (ver CampoDistancias): cada bicho cruza
+    una puerta abierta de su habitación elegida al azar.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+
+    def orientacion_hacia_objetivo(self, hab):
+        lados = [lado for lado, _ in vecinas(hab)]
+        return ORIENTACIONES[self.rng.choice(lados)] if lados else None
+
+    def invalidar(self):
+        pass
+
+    def desactivar(self):
+        pass
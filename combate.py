@@ -0,0 +1,126 @@
+"""
+Combate por lotes.
+
+Uno a uno, cada ataque es Ente.es_atacado_por (restar poder, dos eventos,
+he_muerto) y cada muerte es Juego.terminar_bicho, que comprueba el fin de la
+partida. En una habitación llena, un ataque del personaje son miles de esas
+cadenas de llamadas.
+
+Con activar_combate(juego, plan), Juego.buscar_bichos y buscar_personaje
+pasan por un Combate:
+
+- Un ataque del personaje resta su poder a todos los bichos de su
+  habitación en una sola pasada, y sus muertes van juntas a
+  Juego.terminar_bichos_en_lote, que comprueba el fin de la partida una
+  sola vez.
+- Los ataques de los bichos al personaje se suman durante el tick y se
+  restan de una vez al final (resolver(), después del al_tick del
+  Planificador). Un golpe que lo mataría no se aplaza: se da en su sitio,
+  así la partida acaba en el mismo ataque y en el mismo instante, y los
+  bichos posteriores ya no actúan.
+
+El resultado (vidas, muertes, ganador e instante del final) es el mismo que
+atacando uno a uno. Lo único que cambia es que, durante el tick, las vidas
+del personaje aún no descuentan los golpes pendientes.
+
+Si alguien escucha ATAQUE, VIDAS o MUERTE en el bus (instantaneas.Diario,
+repeticion.Grabador) o el juego está en modo concurrente (activar_cerrojos),
+los ataques se siguen dando uno a uno, para que los eventos salgan en el
+mismo orden.
+"""
+from eventos import TipoEvento, bus
+from main import Bicho
+
+
+class Combate:
+    """
+    Combate por lotes de un juego: daño pendiente al personaje y recuentos.
+    """
+    def __init__(self, juego):
+        self.juego = juego
+        self._pendiente = 0  # daño pendiente al personaje
+        self.ataques = 0
+        self.muertes = 0
+        self.resoluciones = 0
+
+    def diferible(self):
+        """
+        True si los ataques pueden ir por lotes (nadie mira uno a uno).
+        """
+        return (self.juego.cerrojos is None
+                and not bus.habilitado(TipoEvento.ATAQUE)
+                and not bus.habilitado(TipoEvento.VIDAS)
+                and not bus.habilitado(TipoEvento.MUERTE))
+
+    # -- Ataques --
+    def atacar_personaje(self, bicho):
+        """
+        'bicho' ataca al personaje, que está en su habitación.
+        """
+        person = self.juego.person
+        self.ataques += 1
+        if person.vidas - self._pendiente - bicho.poder <= 0:
+            self.resolver()
+            person.es_atacado_por(bicho)  # golpe mortal, en su sitio
+            return
+        self._pendiente += bicho.poder
+
+    def atacar_habitacion(self, personaje, hab):
+        """
+        'personaje' ataca a todos los bichos de 'hab'.
+        """
+        juego = self.juego
+        poder = personaje.poder
+        self.ataques += 1
+        muertos = []
+        for b in hab.ocupantes:
+            if b.juego is juego and isinstance(b, Bicho):
+                b.vidas -= poder
+                if b.vidas <= 0:
+                    muertos.append(b)
+        if muertos:
+            self.muertes += len(muertos)
+            juego.terminar_bichos_en_lote(muertos)
+
+    def resolver(self):
+        """
+        Resta al personaje el daño pendiente.
+        """
+        if self._pendiente:
+            self.juego.person.vidas -= self._pendiente
+            self._pendiente = 0
+            self.resoluciones += 1
+
+    def enganchar(self, plan):
+        """
+        Resuelve al final de cada tick del Planificador, después de su
+        al_tick anterior (si lo tenía).
+        """
+        anterior = plan.al_tick
+
+        def al_tick(ahora):
+            if anterior is not None:
+                anterior(ahora)
+            self.resolver()
+        plan.al_tick = al_tick
+
+
+def activar_combate(juego, plan=None):
+    """
+    Activa el combate por lotes en 'juego' y, con 'plan', lo resuelve al
+    final de cada tick. Sin Planificador hay que llamar a resolver().
+    """
+    if juego.combate is None:
+        juego.combate = Combate(juego)
+        if plan is not None:
+            juego.combate.enganchar(plan)
+    return juego.combate
+
+
+def desactivar_combate(juego):
+    """
+    Resuelve lo pendiente y vuelve a los ataques uno a uno.
+    """
+    if juego.combate is not None:
+        juego.combate.resolver()
+        juego.combate = None
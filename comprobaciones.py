@@ -0,0 +1,270 @@
+"""
+Comprobaciones de equivalencia entre caminos rápidos y sus versiones uno a uno.
+
+Uso:
+    python comprobaciones.py            # todas
+    python comprobaciones.py construccion
+
+Cada comprobación construye o juega lo mismo por los dos caminos y compara
+el resultado; si algo difiere lanza AssertionError y el programa termina con
+código 1.
+
+- construccion: el mismo JSON con Director.procesar_datos (lotes), con un
+  builder que redefine los métodos de fabricación (uno a uno) y con
+  Director.procesar_en_flujo, con y sin paredes compartidas.
+- combate:      partidas con semilla (bichos persiguiendo al personaje) con y
+  sin activar_combate; ganador, instante del final, muertes por habitación
+  y vidas finales tienen que coincidir.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+from caminos import activar_persecucion, desactivar_persecucion
+from combate import activar_combate, desactivar_combate
+from eventos import SumideroNulo, bus
+from lotes import POLITICAS
+from main import PARED_COMPARTIDA, Director, Habitacion, LaberintoBuilder
+from planificador import Planificador
+from reloj import RelojSimulado
+
+
+# =========================================
+# ==============  DATOS  ==================
+# =========================================
+def json_de_prueba(ancho=6, alto=5):
+    """
+    Rejilla ancho x alto con armarios anidados, bombas, puertas a
+    habitaciones que no existen y bichos, en el formato que lee Director.
+    """
+    total = ancho * alto
+    laberinto = []
+    for n in range(1, total + 1):
+        espec = {"tipo": "habitacion", "num": n}
+        if n % 4 == 0:
+            espec["hijos"] = [{"tipo": "armario", "num": 1000 + n,
+                               "hijos": [{"tipo": "bomba"},
+                                         {"tipo": "armario", "num": 2000 + n}]}]
+        elif n % 7 == 0:
+            espec["hijos"] = [{"tipo": "bomba"}]
+        laberinto.append(espec)
+    laberinto.append({"tipo": "armario", "num": 5000})
+    puertas = []
+    for fila in range(alto):
+        for col in range(ancho):
+            num = fila * ancho + col + 1
+            if col + 1 < ancho:
+                puertas.append([num, "Este", num + 1, "Oeste"])
+            if fila + 1 < alto:
+                puertas.append([num, "sur", num + ancho, "norte"])
+    puertas.append([1, "Norte", 9999, "Sur"])
+    bichos = [{"modo": "Agresivo" if i % 3 else "Perezoso", "posicion": i % (total + 3) + 1}
+              for i in range(total)]
+    return {"laberinto": laberinto, "puertas": puertas, "bichos": bichos}
+
+
+def firma_juego(juego):
+    """
+    Estructura comparable de un juego: habitaciones en preorden con sus
+    lados e hijos, puertas registradas y bichos.
+    """
+    laberinto = juego.laberinto
+
+    def lado(e):
+        if e is None:
+            return None
+        if e.es_puerta():
+            return ("puerta", e.lado1.num, e.lado2.num, e.abierta)
+        return (type(e).__name__, e is PARED_COMPARTIDA)
+
+    habitaciones = [
+        (type(h).__name__, h.num, tuple(lado(e) for e in (h.norte, h.sur, h.este, h.oeste)),
+         tuple(x.num if x.es_habitacion() else type(x).__name__ for x in h.hijos),
+         laberinto.obtener_habitacion(h.num) is h)
+        for h in laberinto.elementos(tipo=Habitacion)
+    ]
+    primer_nivel = [h.num for h in laberinto.habitaciones]
+    puertas = [(p.lado1.num, p.lado2.num) for p in laberinto.puertas]
+    bichos = [(type(b.modo).__name__, b.vidas, b.poder,
+               b.posicion.num if b.posicion is not None else None)
+              for b in juego.bichos]
+    return habitaciones, primer_nivel, puertas, bichos, juego.num_bichos_vivos()
+
+
+# =========================================
+# ===========  CONSTRUCCIÓN  ==============
+# =========================================
+class _BuilderUnoAUno(LaberintoBuilder):
+    # Redefine los métodos de fabricación (sin cambiarlos) y cuenta las llamadas.
+    def __init__(self, compacto=False):
+        super().__init__(compacto=compacto)
+        self.llamadas = 0
+
+    def fabricar_habitacion(self, num):
+        self.llamadas += 1
+        return super().fabricar_habitacion(num)
+
+    def fabricar_armario(self, num, contenedor):
+        self.llamadas += 1
+        return super().fabricar_armario(num, contenedor)
+
+    def fabricar_bomba_en(self, contenedor):
+        self.llamadas += 1
+        return super().fabricar_bomba_en(contenedor)
+
+    def fabricar_puerta_l1(self, num1, or1, num2, or2):
+        self.llamadas += 1
+        return super().fabricar_puerta_l1(num1, or1, num2, or2)
+
+    def fabricar_bicho_modo(self, modo_str, num_hab):
+        self.llamadas += 1
+        return super().fabricar_bicho_modo(modo_str, num_hab)
+
+
+class _DirectorUnoAUno(Director):
+    def ini_builder(self):
+        self.builder = _BuilderUnoAUno(compacto=self.compacto)
+
+
+def comprobar_construccion():
+    """
+    Lotes, uno a uno y en flujo dan el mismo juego.
+    """
+    datos = json_de_prueba()
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "prueba.json")
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        for compacto in (False, True):
+            lotes = Director(compacto=compacto)
+            lotes.procesar_datos(datos)
+            esperada = firma_juego(lotes.obtener_juego())
+
+            uno_a_uno = _DirectorUnoAUno(compacto=compacto)
+            uno_a_uno.procesar_datos(datos)
+            assert uno_a_uno.builder.llamadas > 0, "no se llamó a los métodos redefinidos"
+            assert firma_juego(uno_a_uno.obtener_juego()) == esperada, \
+                f"uno a uno difiere de lotes (compacto={compacto})"
+
+            flujo = Director(compacto=compacto)
+            flujo.procesar_en_flujo(ruta, tam_bloque=512)
+            assert firma_juego(flujo.obtener_juego()) == esperada, \
+                f"en flujo difiere de lotes (compacto={compacto})"
+
+
+# =========================================
+# =============  COMBATE  =================
+# =========================================
+def jugar_con_semilla(datos, semilla, politica, por_lotes, vidas=None, poder=None,
+                      duracion=120.0):
+    """
+    Juega 'datos' con reloj simulado y bichos persiguiendo al personaje
+    (con 'vidas' y 'poder' si se dan). Devuelve (resultado comparable,
+    resoluciones del combate por lotes).
+    """
+    rng = random.Random(semilla)
+    actuar = POLITICAS[politica]
+    director = Director(compacto=True)
+    director.procesar_datos(datos)
+    juego = director.obtener_juego()
+    juego.reloj = RelojSimulado()
+    juego.agregar_personaje("Jugador")
+    if vidas is not None:
+        juego.person.vidas = vidas
+    if poder is not None:
+        juego.person.poder = poder
+    juego.abrir_puertas()
+    activar_persecucion(juego)
+    plan = Planificador(reloj=juego.reloj)
+    proximo = [1.0]
+
+    def al_tick(ahora):
+        if not juego.terminado and ahora >= proximo[0]:
+            proximo[0] = ahora + 1.0
+            actuar(juego, rng)
+        if juego.terminado:
+            plan.detener()
+
+    plan.al_tick = al_tick
+    plan.agregar_juego(juego)
+    combate = activar_combate(juego, plan) if por_lotes else None
+    try:
+        plan.ejecutar(duracion=duracion)
+    finally:
+        desactivar_combate(juego)
+        desactivar_persecucion(juego)
+    resultado = (juego.ganador, juego.instante_fin, dict(juego.muertes_por_habitacion),
+                 juego.person.vidas, [b.vidas for b in juego.bichos])
+    return resultado, combate.resoluciones if combate is not None else 0
+
+
+def comprobar_combate(semillas=range(12)):
+    """
+    El combate por lotes da el mismo resultado que el combate uno a uno.
+    """
+    ganadores = set()
+    resoluciones = 0
+    for ancho, alto, bichos in ((3, 3, 30), (6, 6, 60), (10, 10, 40)):
+        for semilla in semillas:
+            rng = random.Random(semilla)
+            datos = {
+                "laberinto": [{"tipo": "habitacion", "num": n} for n in range(1, ancho * alto + 1)],
+                "puertas": [p for p in _puertas_rejilla(ancho, alto) if rng.random() < 0.8],
+                "bichos": [{"modo": rng.choice(("Agresivo", "Perezoso")),
+                            "posicion": rng.randint(1, ancho * alto)} for _ in range(bichos)],
+            }
+            # Con las 5 vidas de serie el primer golpe agresivo ya es mortal.
+            vidas = rng.choice((20, 80, 300))
+            for politica in ("quieto", "cazador"):
+                uno, _ = jugar_con_semilla(datos, semilla, politica, False, vidas, poder=5)
+                lote, resueltas = jugar_con_semilla(datos, semilla, politica, True, vidas, poder=5)
+                assert uno == lote, \
+                    f"{ancho}x{alto} semilla {semilla} {politica}: {uno[:4]} != {lote[:4]}"
+                ganadores.add(uno[0])
+                resoluciones += resueltas
+    assert resoluciones > 0, "el daño al personaje nunca se aplazó"
+    assert {"bichos", "personaje"} <= ganadores, f"solo ganan {ganadores}"
+
+
+def _puertas_rejilla(ancho, alto):
+    for fila in range(alto):
+        for col in range(ancho):
+            num = fila * ancho + col + 1
+            if col + 1 < ancho:
+                yield [num, "Este", num + 1, "Oeste"]
+            if fila + 1 < alto:
+                yield [num, "Sur", num + ancho, "Norte"]
+
+
+COMPROBACIONES = {
+    "construccion": comprobar_construccion,
+    "combate": comprobar_combate,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comprobaciones de equivalencia.")
+    parser.add_argument("nombres", nargs="*",
+                        help=f"comprobaciones a ejecutar ({', '.join(COMPROBACIONES)}; por defecto, todas)")
+    args = parser.parse_args(argv)
+    desconocidas = [n for n in args.nombres if n not in COMPROBACIONES]
+    if desconocidas:
+        parser.error(f"comprobación desconocida: {', '.join(desconocidas)}")
+    bus.configurar(sumideros=[SumideroNulo()])
+    fallos = 0
+    for nombre in args.nombres or list(COMPROBACIONES):
+        try:
+            COMPROBACIONES[nombre]()
+        except AssertionError as e:
+            fallos += 1
+            print(f"{nombre}: FALLO {e}")
+        else:
+            print(f"{nombre}: ok")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Prueba de estrés del modo concurrente (Juego.activar_cerrojos).
+
+Varios hilos mueven y hacen atacar a los bichos de un laberinto pequeño, sin
+esperas, para forzar choques. Cada hilo lleva su propio grupo de bichos (como
+el hilo de cada bicho en Juego.lanzar_bichos). Otro hilo mueve al personaje
+y le hace atacar. Al terminar se comprueba que no se ha perdido ninguna
+actualización:
+
+- ocupantes: cada ente vivo está exactamente en la habitación de su
+  'posicion' y en ninguna otra; ningún muerto sigue en una habitación.
+- vidas: lo que han perdido el personaje y los bichos es exactamente la suma
+  del poder de los ataques que recibieron (contados por hilo con el evento
+  ATAQUE).
+- contadores: bichos vivos, vivos por modo y muertes por habitación
+  coinciden con el estado de los bichos.
+
+El rendimiento (movimientos + ataques por segundo) se mide para cada número
+de hilos. Con el GIL no escala; en un CPython sin GIL (free-threaded) los
+hilos que trabajan en habitaciones distintas avanzan a la vez.
+
+Con el GIL, una resta de vidas casi nunca se parte entre dos hilos, así que
+sin cerrojos la prueba también suele salir limpia. Con ceder=True cada
+ataque lee las vidas, cede el GIL (time.sleep(0)) y después escribe: sin
+cerrojos se pierden golpes. Al final, main() hace siempre esa verificación,
+con y sin cerrojos, y termina con código 1 si sin cerrojos no encuentra
+errores o con cerrojos encuentra alguno.
+
+Uso:
+    python concurrencia.py [--hilos 1 2 4 8] [--lado 6] [--bichos 200]
+                           [--pasos 2000] [--sin-cerrojos] [--ceder]
+"""
+import argparse
+import contextlib
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from eventos import SumideroNulo, TipoEvento, bus
+from main import ORIENTACIONES, Director, Ente
+
+SEMILLA = 2024
+
+
+def _generar(lado, bichos):
+    # Rejilla lado x lado con todas las puertas (abiertas al construir el juego).
+    laberinto = [{"tipo": "habitacion", "num": n} for n in range(1, lado * lado + 1)]
+    puertas = []
+    for fila in range(lado):
+        for col in range(lado):
+            num = fila * lado + col + 1
+            if col + 1 < lado:
+                puertas.append([num, "Este", num + 1, "Oeste"])
+            if fila + 1 < lado:
+                puertas.append([num, "Sur", num + lado, "Norte"])
+    lista = [{"modo": "Agresivo" if i % 2 else "Perezoso", "posicion": i % (lado * lado) + 1}
+             for i in range(bichos)]
+    return {"laberinto": laberinto, "puertas": puertas, "bichos": lista}
+
+
+@contextlib.contextmanager
+def cediendo_en_ataques():
+    """
+    Durante el bloque, Ente.es_atacado_por cede el GIL entre leer las vidas
+    y escribirlas, para que un golpe concurrente sin cerrojo se pierda.
+    """
+    original = Ente.es_atacado_por
+
+    def es_atacado_por(self, atacante):
+        bus.emitir(TipoEvento.ATAQUE, "{victima} es atacado por {atacante}",
+                   victima=self, atacante=atacante)
+        vidas = self.vidas
+        time.sleep(0)
+        self.vidas = vidas - atacante.poder
+        bus.emitir(TipoEvento.VIDAS, "Vidas de {ente}: {vidas}",
+                   ente=self, vidas=self.vidas)
+        if self.vidas <= 0:
+            self.he_muerto()
+
+    Ente.es_atacado_por = es_atacado_por
+    try:
+        yield
+    finally:
+        Ente.es_atacado_por = original
+
+
+def prueba(hilos, lado=6, bichos=200, pasos=2000, cerrojos=True, vidas_bicho=500,
+           ceder=False):
+    """
+    Ejecuta la prueba con 'hilos' hilos de bichos (más el del personaje).
+    Cada hilo hace 'pasos' rondas sobre sus bichos: caminar y atacar. Con
+    'ceder', dentro de cediendo_en_ataques().
+    Devuelve un dict con operaciones por segundo y los errores encontrados.
+    """
+    if ceder:
+        with cediendo_en_ataques():
+            return prueba(hilos, lado, bichos, pasos, cerrojos, vidas_bicho)
+    director = Director(compacto=True)
+    director.procesar_datos(_generar(lado, bichos))
+    juego = director.obtener_juego()
+    juego.abrir_puertas()
+    for b in juego.bichos:
+        b.vidas = vidas_bicho
+    juego.agregar_personaje("Estres")
+    personaje = juego.person
+    personaje.vidas = 10 ** 9  # que la partida no acabe
+    personaje.poder = 1
+    if cerrojos:
+        juego.activar_cerrojos()
+    vidas_inicio = {b: b.vidas for b in juego.bichos}
+
+    # Daño recibido por cada ente según los eventos ATAQUE, contado en cada
+    # hilo por separado para no añadir otra sección compartida.
+    local = threading.local()
+    contadores = []
+    alta = threading.Lock()
+
+    def contar_ataque(evento):
+        dano = getattr(local, "dano", None)
+        if dano is None:
+            dano = local.dano = Counter()
+            with alta:
+                contadores.append(dano)
+        dano[evento.datos["victima"]] += evento.datos["atacante"].poder
+
+    bus.suscribir(TipoEvento.ATAQUE, contar_ataque)
+    orientaciones = list(ORIENTACIONES.values())
+    grupos = [juego.bichos[i::hilos] for i in range(hilos)]
+    operaciones = [0] * (hilos + 1)
+    salida = threading.Barrier(hilos + 2)
+    terminado = threading.Event()
+
+    def mover_bichos(indice, grupo):
+        rng = random.Random(SEMILLA + indice)
+        hechas = 0
+        salida.wait()
+        for _ in range(pasos):
+            for b in grupo:
+                if b.esta_vivo():
+                    rng.choice(orientaciones).caminar(b)
+                    b.atacar()
+                    hechas += 2
+        operaciones[indice] = hechas
+
+    def mover_personaje():
+        rng = random.Random(SEMILLA - 1)
+        hechas = 0
+        salida.wait()
+        while not terminado.is_set():
+            rng.choice(orientaciones).caminar(personaje)
+            personaje.atacar()
+            hechas += 2
+        operaciones[hilos] = hechas
+
+    trabajadores = [threading.Thread(target=mover_bichos, args=(i, g)) for i, g in enumerate(grupos)]
+    del_personaje = threading.Thread(target=mover_personaje)
+    for t in trabajadores + [del_personaje]:
+        t.start()
+    salida.wait()
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.join()
+    terminado.set()
+    del_personaje.join()
+    segundos = time.perf_counter() - inicio
+    bus.desuscribir(TipoEvento.ATAQUE, contar_ataque)
+
+    dano = Counter()
+    for c in contadores:
+        dano.update(c)
+    errores = comprobar(juego, vidas_inicio, dano)
+    return {
+        "hilos": hilos,
+        "cerrojos": cerrojos,
+        "segundos": segundos,
+        "operaciones": sum(operaciones),
+        "ops_por_segundo": sum(operaciones) / segundos if segundos else 0.0,
+        "muertos": sum(1 for b in juego.bichos if not b.esta_vivo()),
+        "errores": errores,
+    }
+
+
+def verificar(hilos=4, pasos=300, salida=print):
+    """
+    La prueba (cediendo en los ataques) tiene que encontrar errores sin
+    cerrojos y ninguno con ellos. Devuelve True si es así.
+    """
+    sin = prueba(hilos, pasos=pasos, cerrojos=False, ceder=True)
+    con = prueba(hilos, pasos=pasos, cerrojos=True, ceder=True)
+    salida(f"verificación ({hilos} hilos, cediendo): {len(sin['errores'])} errores sin "
+           f"cerrojos, {len(con['errores'])} con cerrojos")
+    for error in con["errores"][:5]:
+        salida("    " + error)
+    return bool(sin["errores"]) and not con["errores"]
+
+
+def comprobar(juego, vidas_inicio, dano):
+    """
+    Lista de inconsistencias del estado final (vacía si todo cuadra).
+    """
+    errores = []
+    personaje = juego.person
+    entes = list(juego.bichos) + [personaje]
+    vistos = Counter()
+    for hab in juego.laberinto.habitaciones:
+        for ente in hab.ocupantes:
+            vistos[ente] += 1
+            if ente.posicion is not hab:
+                errores.append(f"{ente} está en Hab{hab.num} pero su posición es {ente.posicion}")
+            if not ente.esta_vivo():
+                errores.append(f"{ente} está muerto y sigue en Hab{hab.num}")
+    for ente in entes:
+        if ente.esta_vivo() and vistos[ente] != 1:
+            errores.append(f"{ente} aparece {vistos[ente]} veces en las habitaciones")
+
+    perdidas = 10 ** 9 - personaje.vidas
+    if perdidas != dano[personaje]:
+        errores.append(f"Personaje: perdió {perdidas} vidas pero recibió {dano[personaje]} de daño")
+    for b, inicio in vidas_inicio.items():
+        # Al morir, terminar_bicho deja las vidas en 0 aunque el golpe las bajara más.
+        restantes = inicio - dano[b]
+        if b.vidas != restantes if b.esta_vivo() else restantes > 0:
+            errores.append(f"{b}: {inicio} - {dano[b]} de daño != {b.vidas}")
+
+    vivos = [b for b in juego.bichos if b.esta_vivo()]
+    if juego.num_bichos_vivos() != len(vivos):
+        errores.append(f"num_bichos_vivos() = {juego.num_bichos_vivos()} y hay {len(vivos)} vivos")
+    por_modo = Counter(b.nombre_modo() for b in vivos)
+    for modo in ("Agresivo", "Perezoso"):
+        if juego.vivos_por_modo[modo] != por_modo[modo]:
+            errores.append(f"vivos_por_modo[{modo}] = {juego.vivos_por_modo[modo]}, "
+                           f"contados {por_modo[modo]}")
+    muertes = sum(juego.muertes_por_habitacion.values())
+    if muertes != len(juego.bichos) - len(vivos):
+        errores.append(f"muertes_por_habitacion suma {muertes} y hay "
+                       f"{len(juego.bichos) - len(vivos)} muertos")
+    return errores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de estrés con cerrojos por habitación.")
+    parser.add_argument("--hilos", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--lado", type=int, default=6, help="la rejilla es lado x lado")
+    parser.add_argument("--bichos", type=int, default=200)
+    parser.add_argument("--pasos", type=int, default=2000, help="rondas por hilo")
+    parser.add_argument("--sin-cerrojos", action="store_true",
+                        help="sin activar_cerrojos (para ver actualizaciones perdidas)")
+    parser.add_argument("--cambio", type=float, default=None,
+                        help="sys.setswitchinterval (más pequeño = más cambios de hilo)")
+    parser.add_argument("--ceder", action="store_true",
+                        help="ceder el GIL en mitad de cada ataque (ver cediendo_en_ataques)")
+    args = parser.parse_args(argv)
+
+    bus.configurar(sumideros=[SumideroNulo()])
+    if args.cambio is not None:
+        sys.setswitchinterval(args.cambio)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'activo' if gil else 'desactivado'}")
+    fallos = 0
+    for hilos in args.hilos:
+        r = prueba(hilos, args.lado, args.bichos, args.pasos, not args.sin_cerrojos,
+                   ceder=args.ceder)
+        if not args.sin_cerrojos:  # sin cerrojos los errores son lo esperado
+            fallos += len(r["errores"])
+        print(f"{hilos:3d} hilos: {r['ops_por_segundo']:12,.0f} ops/s  "
+              f"({r['operaciones']} ops en {r['segundos']:.2f} s, {r['muertos']} muertos, "
+              f"{len(r['errores'])} errores)")
+        for error in r["errores"][:5]:
+            print("    " + error)
+    if not verificar():
+        print("FALLO: la prueba no distingue con y sin cerrojos")
+        fallos += 1
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+Registro estructurado de eventos del juego.
+
+Las clases de main.py no hacen print: emiten eventos tipados en el bus
+global 'bus'. Cada TipoEvento tiene una severidad. El bus solo construye el
+evento y formatea el mensaje si algún sumidero lo va a recibir. Si no, emitir()
+vuelve en cuanto consulta un diccionario.
+
+Sumideros disponibles:
+- SumideroConsola: imprime el mensaje tal cual (el comportamiento de siempre).
+- SumideroNulo: descarta todo.
+- SumideroMemoria: búfer circular con los últimos N eventos.
+- SumideroArchivo: texto plano con escritura en bloques.
+- SumideroJSONL: una línea JSON por evento, también en bloques.
+
+Ejemplo:
+    from eventos import bus, Nivel, SumideroJSONL
+    bus.configurar(nivel=Nivel.INFO, sumideros=[SumideroJSONL("partida.jsonl")])
+    ...
+    bus.cerrar()
+"""
+import collections
+import enum
+import json
+import threading
+import time
+
+
+class Nivel(enum.IntEnum):
+    DEBUG = 10
+    INFO = 20
+    AVISO = 30
+    ERROR = 40
+
+
+class TipoEvento(enum.Enum):
+    """
+    Tipos de evento y su severidad.
+    """
+    DORMIR = ("dormir", Nivel.DEBUG)
+    MOVIMIENTO = ("movimiento", Nivel.INFO)
+    CHOQUE = ("choque", Nivel.INFO)
+    PUERTA = ("puerta", Nivel.INFO)
+    ATAQUE = ("ataque", Nivel.INFO)
+    VIDAS = ("vidas", Nivel.INFO)
+    MUERTE = ("muerte", Nivel.INFO)
+    FIN_JUEGO = ("fin_juego", Nivel.AVISO)
+    INCIDENCIA = ("incidencia", Nivel.AVISO)
+
+    def __init__(self, nombre, nivel):
+        self.nombre = nombre
+        self.nivel = nivel
+
+
+class Evento:
+    """
+    Un evento emitido. 'mensaje' se formatea a partir de 'formato' y 'datos'.
+    """
+    __slots__ = ("tipo", "instante", "formato", "datos", "_mensaje")
+
+    def __init__(self, tipo, formato, datos):
+        self.tipo = tipo
+        self.instante = time.time()
+        self.formato = formato
+        self.datos = datos
+        self._mensaje = None
+
+    @property
+    def nivel(self):
+        return self.tipo.nivel
+
+    @property
+    def mensaje(self):
+        if self._mensaje is None:
+            self._mensaje = self.formato.format(**self.datos)
+        return self._mensaje
+
+    def como_dict(self):
+        return {
+            "instante": self.instante,
+            "tipo": self.tipo.nombre,
+            "nivel": self.tipo.nivel.name,
+            "mensaje": self.mensaje,
+            "datos": {k: _valor_simple(v) for k, v in self.datos.items()},
+        }
+
+    def __str__(self):
+        return self.mensaje
+
+
+def _valor_simple(valor):
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    return str(valor)
+
+
+# =========================================
+# ==============  SUMIDEROS  ==============
+# =========================================
+class Sumidero:
+    """
+    Destino de los eventos. 'nulo' indica que no hace falta generarlos.
+    """
+    nulo = False
+
+    def emitir(self, evento):
+        raise NotImplementedError("Subclase debe implementarlo")
+
+    def vaciar(self):
+        pass
+
+    def cerrar(self):
+        self.vaciar()
+
+
+class SumideroNulo(Sumidero):
+    nulo = True
+
+    def emitir(self, evento):
+        pass
+
+
+class SumideroConsola(Sumidero):
+    """
+    Imprime cada mensaje en una línea; el cerrojo evita que los hilos de los
+    bichos mezclen líneas.
+    """
+    def __init__(self):
+        self._cerrojo = threading.Lock()
+
+    def emitir(self, evento):
+        with self._cerrojo:
+            print(evento.mensaje)
+
+
+class SumideroMemoria(Sumidero):
+    """
+    Guarda los últimos 'capacidad' eventos.
+    """
+    def __init__(self, capacidad=10_000):
+        self.eventos = collections.deque(maxlen=capacidad)
+
+    def emitir(self, evento):
+        self.eventos.append(evento)
+
+    def mensajes(self):
+        return [e.mensaje for e in self.eventos]
+
+
+class SumideroArchivo(Sumidero):
+    """
+    Escribe una línea por evento, acumulando hasta 'tam_bloque' caracteres
+    antes de escribir en disco.
+    """
+    def __init__(self, ruta, tam_bloque=64 * 1024):
+        self._archivo = open(ruta, "a", encoding="utf-8")
+        self._tam_bloque = tam_bloque
+        self._pendiente = []
+        self._tam_pendiente = 0
+        self._cerrojo = threading.Lock()
+
+    def formatear(self, evento):
+        nivel = evento.tipo.nivel.name
+        return f"{evento.instante:.6f} {nivel} {evento.tipo.nombre} {evento.mensaje}\n"
+
+    def emitir(self, evento):
+        linea = self.formatear(evento)
+        with self._cerrojo:
+            self._pendiente.append(linea)
+            self._tam_pendiente += len(linea)
+            if self._tam_pendiente >= self._tam_bloque:
+                self._escribir()
+
+    def _escribir(self):
+        self._archivo.write("".join(self._pendiente))
+        self._pendiente.clear()
+        self._tam_pendiente = 0
+
+    def vaciar(self):
+        with self._cerrojo:
+            if self._pendiente:
+                self._escribir()
+            self._archivo.flush()
+
+    def cerrar(self):
+        self.vaciar()
+        self._archivo.close()
+
+
+class SumideroJSONL(SumideroArchivo):
+    def formatear(self, evento):
+        return json.dumps(evento.como_dict(), ensure_ascii=False) + "\n"
+
+
+# =========================================
+# ================  BUS  ==================
+# =========================================
+class BusEventos:
+    """
+    Reparte los eventos entre los sumideros (filtrados por nivel) y los
+    suscriptores de cada tipo (que los reciben siempre, sea cual sea el nivel).
+    """
+    def __init__(self, nivel=Nivel.DEBUG, sumideros=None):
+        self.nivel = nivel
+        self.sumideros = list(sumideros) if sumideros is not None else []
+        self._suscriptores = {tipo: [] for tipo in TipoEvento}
+        self._activos = {}
+        self._a_sumideros = {}
+        self._recalcular()
+
+    # -- Configuración --
+    def configurar(self, nivel=None, sumideros=None):
+        if nivel is not None:
+            self.nivel = nivel
+        if sumideros is not None:
+            self.sumideros = list(sumideros)
+        self._recalcular()
+
+    def agregar_sumidero(self, sumidero):
+        self.sumideros.append(sumidero)
+        self._recalcular()
+
+    def quitar_sumidero(self, sumidero):
+        self.sumideros.remove(sumidero)
+        self._recalcular()
+
+    def suscribir(self, tipos, funcion):
+        """
+        Llama a funcion(evento) con cada evento de 'tipos'.
+        """
+        if isinstance(tipos, TipoEvento):
+            tipos = (tipos,)
+        for tipo in tipos:
+            self._suscriptores[tipo].append(funcion)
+        self._recalcular()
+
+    def desuscribir(self, tipos, funcion):
+        if isinstance(tipos, TipoEvento):
+            tipos = (tipos,)
+        for tipo in tipos:
+            if funcion in self._suscriptores[tipo]:
+                self._suscriptores[tipo].remove(funcion)
+        self._recalcular()
+
+    def _recalcular(self):
+        hay_sumideros = any(not s.nulo for s in self.sumideros)
+        for tipo in TipoEvento:
+            a_sumideros = hay_sumideros and tipo.nivel >= self.nivel
+            self._a_sumideros[tipo] = a_sumideros
+            self._activos[tipo] = a_sumideros or bool(self._suscriptores[tipo])
+
+    def habilitado(self, tipo):
+        return self._activos[tipo]
+
+    # -- Emisión --
+    def emitir(self, tipo, formato, **datos):
+        if not self._activos[tipo]:
+            return
+        evento = Evento(tipo, formato, datos)
+        if self._a_sumideros[tipo]:
+            evento.mensaje  # se formatea ya, con el estado actual de los datos
+            for sumidero in self.sumideros:
+                sumidero.emitir(evento)
+        for funcion in self._suscriptores[tipo]:
+            funcion(evento)
+
+    def vaciar(self):
+        for sumidero in self.sumideros:
+            sumidero.vaciar()
+
+    def cerrar(self):
+        for sumidero in self.sumideros:
+            sumidero.cerrar()
+
+
+# Bus global usado por main.py; por defecto imprime lo mismo que antes.
+bus = BusEventos(nivel=Nivel.DEBUG, sumideros=[SumideroConsola()])
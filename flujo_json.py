@@ -0,0 +1,140 @@
+"""
+Lectura incremental de los JSON de laberintos.
+
+'Director.leer_archivo' carga todo el archivo con json.load. Con archivos de
+varios GB, el pico de memoria es varias veces el tamaño del archivo.
+iterar_secciones() lee el archivo por bloques y devuelve de uno en uno los
+elementos de las listas 'laberinto', 'puertas' y 'bichos'. En memoria solo
+queda el bloque actual y el elemento que se está decodificando.
+
+Uso desde línea de órdenes (construye el juego e informa del ritmo):
+    python flujo_json.py laberinto.json
+"""
+import json
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SECCIONES = ("laberinto", "puertas", "bichos")
+_ESPACIOS = " \t\n\r"
+
+
+class _Lector:
+    """
+    Búfer de texto sobre un archivo abierto que se rellena bajo demanda.
+    """
+    def __init__(self, archivo, tam_bloque):
+        self.archivo = archivo
+        self.tam_bloque = tam_bloque
+        self.buf = ""
+        self.pos = 0
+        self.fin = False
+        self._decoder = json.JSONDecoder()
+
+    def _leer_mas(self):
+        if self.fin:
+            return False
+        if self.pos > len(self.buf) // 2:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        bloque = self.archivo.read(self.tam_bloque)
+        if not bloque:
+            self.fin = True
+            return False
+        self.buf += bloque
+        return True
+
+    def caracter(self):
+        """
+        Salta espacios y devuelve el siguiente carácter sin consumirlo ('' al final).
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _ESPACIOS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._leer_mas():
+                return ""
+
+    def esperar(self, esperado):
+        c = self.caracter()
+        if c != esperado:
+            raise ValueError(f"JSON inválido: se esperaba {esperado!r} y llegó {c!r}")
+        self.pos += 1
+
+    def valor(self):
+        """
+        Decodifica el siguiente valor JSON completo.
+        """
+        self.caracter()
+        while True:
+            try:
+                valor, fin = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._leer_mas():
+                    continue
+                raise
+            # Un número pegado al final del búfer puede seguir en el siguiente bloque.
+            if fin == len(self.buf) and self._leer_mas():
+                continue
+            self.pos = fin
+            return valor
+
+
+def iterar_secciones(archivo, secciones=SECCIONES, tam_bloque=1 << 20):
+    """
+    Genera pares (clave, elemento) recorriendo el objeto JSON de 'archivo'.
+    Las listas de 'secciones' se entregan elemento a elemento; el resto de
+    claves se entregan con su valor completo.
+    """
+    lector = _Lector(archivo, tam_bloque)
+    lector.esperar("{")
+    if lector.caracter() == "}":
+        return
+    while True:
+        clave = lector.valor()
+        lector.esperar(":")
+        if clave in secciones and lector.caracter() == "[":
+            lector.esperar("[")
+            if lector.caracter() == "]":
+                lector.pos += 1
+            else:
+                while True:
+                    yield clave, lector.valor()
+                    if lector.caracter() == ",":
+                        lector.pos += 1
+                        continue
+                    lector.esperar("]")
+                    break
+        else:
+            yield clave, lector.valor()
+        if lector.caracter() == ",":
+            lector.pos += 1
+            continue
+        lector.esperar("}")
+        return
+
+
+def rss_pico_kb():
+    """
+    Pico de memoria residente del proceso en KB (None si no se puede medir).
+    """
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS lo da en bytes; Linux en KB.
+    return pico // 1024 if sys.platform == "darwin" else pico
+
+
+if __name__ == "__main__":
+    from eventos import SumideroNulo, bus
+    from main import Director
+
+    bus.configurar(sumideros=[SumideroNulo()])
+    director = Director()
+    director.procesar_en_flujo(sys.argv[1])
+    for clave, valor in director.estadisticas.items():
+        print(f"{clave}: {valor}")
@@ -0,0 +1,483 @@
+"""
+Formato binario de laberintos (.lab) con apertura por mmap.
+
+Rehacer un laberinto grande desde JSON con 'Director.procesar' cuesta decenas
+de segundos en cada arranque. Este módulo guarda un Laberinto o un Juego ya
+construido en un archivo binario compacto. Al abrirlo, el archivo se mapea
+en memoria y las habitaciones se construyen perezosamente, la primera vez
+que alguien las pide.
+
+Estructura (little-endian):
+
+    cabecera   magia b"LAB1", versión y número de registros de cada tabla
+    habitaciones  un registro de 28 bytes por habitación o armario, en el
+                  orden original: num, tipo, hijos y los 4 lados (norte, sur,
+                  este, oeste). Un lado >= 0 es el índice de una puerta; los
+                  negativos codifican paredes y bombas (ver _codigo_lado).
+    indice     pares (num, registro) ordenados por num para buscar en O(log n)
+    hijos      hijos de cada habitación: armarios (por num) y bombas
+    puertas    num de lado1, num de lado2 y si está abierta
+    bichos     modo, posición, vidas y poder
+    personaje  opcional: nombre, posición, vidas y poder
+
+Desde línea de órdenes convierte en ambos sentidos según la extensión:
+    python formato_binario.py laberinto.json laberinto.lab
+    python formato_binario.py laberinto.lab laberinto.json
+"""
+import bisect
+import json
+import mmap
+import struct
+import sys
+
+from main import (PARED_COMPARTIDA, Armario, Bicho, Bomba, Director, Habitacion,
+                  Juego, Laberinto, Pared, ParedBomba, Personaje, Puerta)
+
+MAGIA = b"LAB1"
+VERSION = 1
+
+_CABECERA = struct.Struct("<4sHxxIIIIB3x")  # magia, versión, habs, hijos, puertas, bichos, personaje
+_HABITACION = struct.Struct("<iBxHI4i")    # num, tipo, num_hijos, primer_hijo, lados
+_INDICE = struct.Struct("<ii")             # num, registro
+_HIJO = struct.Struct("<BBxxi")            # tipo, activa, num del armario
+_PUERTA = struct.Struct("<iiB3x")          # num lado1, num lado2, abierta
+_BICHO = struct.Struct("<iiiB3x")          # posición, vidas, poder, modo
+_PERSONAJE = struct.Struct("<iiiH")        # posición, vidas, poder, longitud del nombre
+
+LADOS = ("norte", "sur", "este", "oeste")
+_NOMBRES_LADO = ("Norte", "Sur", "Este", "Oeste")
+
+# tipo de registro de habitación
+_ARMARIO = 1
+_EN_LABERINTO = 2  # está en laberinto.habitaciones (primer nivel)
+
+# tipo de hijo
+_HIJO_ARMARIO = 0
+_HIJO_BOMBA = 1
+
+# bits de un lado negativo: codigo = -1 - bits
+_PARED_BOMBA = 1
+_PARED_BOMBA_ACTIVA = 2
+_CON_BOMBA = 4
+_BOMBA_ACTIVA = 8
+_VACIO = 16
+
+_MODOS = {"Agresivo": 0, "Perezoso": 1, "SinModo": 2}
+_SIN_POSICION = -1
+
+
+# =========================================
+# ===============  ESCRITURA  =============
+# =========================================
+def _codigo_lado(elemento, puertas):
+    if elemento is None:
+        return -1 - _VACIO
+    bits = 0
+    if isinstance(elemento, Bomba):
+        bits |= _CON_BOMBA | (_BOMBA_ACTIVA if elemento.activa else 0)
+        elemento = elemento.em
+        if elemento is None:
+            elemento = Pared()
+    if isinstance(elemento, Puerta):
+        if bits:
+            raise ValueError("El formato binario no admite bombas sobre puertas")
+        if elemento not in puertas:
+            puertas[elemento] = len(puertas)
+        return puertas[elemento]
+    if isinstance(elemento, ParedBomba):
+        bits |= _PARED_BOMBA | (_PARED_BOMBA_ACTIVA if elemento.activa else 0)
+    elif not isinstance(elemento, Pared):
+        raise ValueError(f"El formato binario no admite {elemento!r} como lado")
+    return -1 - bits
+
+
+def escribir(origen, ruta):
+    """
+    Guarda en 'ruta' un Juego (laberinto, bichos y personaje) o un Laberinto.
+    """
+    with open(ruta, "wb") as f:
+        f.write(a_bytes(origen))
+
+
+def a_bytes(origen):
+    """
+    Contenido del archivo .lab de 'origen' (ver escribir).
+    """
+    if isinstance(origen, Juego):
+        juego, laberinto = origen, origen.laberinto
+    else:
+        juego, laberinto = None, origen
+
+    # Habitaciones de primer nivel y, detrás, los armarios anidados.
+    registros = []   # (habitacion, tipo)
+    vistos = set()
+    pendientes = [(h, _EN_LABERINTO) for h in laberinto.habitaciones]
+    i = 0
+    while i < len(pendientes):
+        hab, tipo = pendientes[i]
+        i += 1
+        if id(hab) in vistos:
+            continue
+        vistos.add(id(hab))
+        if isinstance(hab, Armario):
+            tipo |= _ARMARIO
+        registros.append((hab, tipo))
+        for hijo in hab.hijos:
+            if isinstance(hijo, Habitacion):
+                pendientes.append((hijo, 0))
+
+    puertas = {}
+    hijos = []
+    datos_habs = []
+    for hab, tipo in registros:
+        lados = [_codigo_lado(getattr(hab, lado), puertas) for lado in LADOS]
+        primer_hijo = len(hijos)
+        for hijo in hab.hijos:
+            if isinstance(hijo, Habitacion):
+                hijos.append(_HIJO.pack(_HIJO_ARMARIO, 0, hijo.num))
+            elif isinstance(hijo, Bomba):
+                hijos.append(_HIJO.pack(_HIJO_BOMBA, 1 if hijo.activa else 0, 0))
+        datos_habs.append(_HABITACION.pack(hab.num, tipo, len(hijos) - primer_hijo,
+                                           primer_hijo, *lados))
+
+    indice = sorted((hab.num, i) for i, (hab, _) in enumerate(registros))
+
+    datos_puertas = [_PUERTA.pack(p.lado1.num, p.lado2.num, 1 if p.abierta else 0)
+                     for p in puertas]
+
+    bichos = juego.bichos if juego else []
+    datos_bichos = [
+        _BICHO.pack(_num_posicion(b), b.vidas, b.poder, _MODOS.get(b.nombre_modo(), 2))
+        for b in bichos
+    ]
+
+    person = juego.person if juego else None
+    partes = [_CABECERA.pack(MAGIA, VERSION, len(registros), len(hijos),
+                             len(datos_puertas), len(datos_bichos), 1 if person else 0)]
+    partes.extend(datos_habs)
+    partes.extend(_INDICE.pack(num, i) for num, i in indice)
+    partes.extend(hijos)
+    partes.extend(datos_puertas)
+    partes.extend(datos_bichos)
+    if person:
+        nombre = person.nombre.encode("utf-8")
+        partes.append(_PERSONAJE.pack(_num_posicion(person), person.vidas,
+                                      person.poder, len(nombre)))
+        partes.append(nombre)
+    return b"".join(partes)
+
+
+def _num_posicion(ente):
+    pos = ente.posicion
+    return pos.num if pos is not None else _SIN_POSICION
+
+
+# =========================================
+# ===============  LECTURA  ===============
+# =========================================
+class PuertaDiferida(Puerta):
+    """
+    Puerta de un LaberintoMapeado: sus lados se construyen al consultarlos.
+    """
+    __slots__ = ('laberinto', 'num1', 'num2')
+
+    def __init__(self, laberinto, num1, num2, abierta):
+        self.laberinto = laberinto
+        self.num1 = num1
+        self.num2 = num2
+        self.abierta = abierta
+
+    @property
+    def lado1(self):
+        return self.laberinto.obtener_habitacion(self.num1)
+
+    @property
+    def lado2(self):
+        return self.laberinto.obtener_habitacion(self.num2)
+
+
+class LaberintoMapeado(Laberinto):
+    """
+    Laberinto leído de un archivo .lab mapeado en memoria. Cada habitación se
+    construye la primera vez que se pide; 'habitaciones' y recorrer() las
+    construyen todas. Las paredes simples son PARED_COMPARTIDA.
+
+    Con 'buffer' (bytes o un mmap ya abierto) en lugar de 'ruta', lee de ese
+    buffer sin copiarlo: varios laberintos pueden compartir el mismo, y cada
+    uno construye sus propias habitaciones y puertas.
+    """
+    def __init__(self, ruta=None, buffer=None):
+        self._todas = False
+        super().__init__()
+        if buffer is None:
+            self._archivo = open(ruta, "rb")
+            self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._archivo = None
+            self._mapa = buffer
+        self._vistas = []
+        self._nums = None
+        (magia, version, self._num_habs, self._num_hijos, self._num_puertas,
+         self._num_bichos, self._con_personaje) = _CABECERA.unpack_from(self._mapa, 0)
+        if magia != MAGIA or version != VERSION:
+            self.cerrar()
+            raise ValueError(f"{ruta or 'buffer'} no es un laberinto binario v{VERSION}")
+        self._off_habs = _CABECERA.size
+        self._off_indice = self._off_habs + self._num_habs * _HABITACION.size
+        self._off_hijos = self._off_indice + self._num_habs * _INDICE.size
+        self._off_puertas = self._off_hijos + self._num_hijos * _HIJO.size
+        self._off_bichos = self._off_puertas + self._num_puertas * _PUERTA.size
+        self._off_personaje = self._off_bichos + self._num_bichos * _BICHO.size
+        self._puertas = {}
+        # El índice visto como enteros para buscar con bisect (en C). El
+        # archivo es little-endian: en otras máquinas se busca a mano.
+        if sys.byteorder == "little":
+            base = memoryview(self._mapa)
+            tabla = base[self._off_indice:self._off_hijos].cast('i')
+            self._nums = tabla[::2]
+            self._registros = tabla[1::2]
+            self._vistas = [self._registros, self._nums, tabla, base]
+
+    # -- Materialización perezosa --
+    def _buscar_registro(self, num):
+        nums = self._nums
+        if nums is not None:
+            i = bisect.bisect_left(nums, num)
+            if i < len(nums) and nums[i] == num:
+                return self._registros[i]
+            return None
+        bajo, alto = 0, self._num_habs
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            n, registro = _INDICE.unpack_from(self._mapa, self._off_indice + medio * _INDICE.size)
+            if n < num:
+                bajo = medio + 1
+            elif n > num:
+                alto = medio
+            else:
+                return registro
+        return None
+
+    def _puerta(self, indice):
+        puerta = self._puertas.get(indice)
+        if puerta is None:
+            num1, num2, abierta = _PUERTA.unpack_from(
+                self._mapa, self._off_puertas + indice * _PUERTA.size)
+            puerta = self._puertas[indice] = PuertaDiferida(self, num1, num2, abierta == 1)
+        return puerta
+
+    def _lado(self, codigo):
+        if codigo >= 0:
+            return self._puerta(codigo)
+        bits = -1 - codigo
+        if bits & _VACIO:
+            return None
+        if bits & _PARED_BOMBA:
+            elemento = ParedBomba()
+            elemento.activa = bool(bits & _PARED_BOMBA_ACTIVA)
+        else:
+            elemento = PARED_COMPARTIDA
+        if bits & _CON_BOMBA:
+            bomba = Bomba(elemento)
+            bomba.activa = bool(bits & _BOMBA_ACTIVA)
+            elemento = bomba
+        return elemento
+
+    def _construir(self, campos):
+        num, tipo, num_hijos, primer_hijo, norte, sur, este, oeste = campos
+        hab = Armario(num) if tipo & _ARMARIO else Habitacion(num)
+        self._indice[num] = hab
+        lado = self._lado
+        hab.norte = lado(norte)
+        hab.sur = lado(sur)
+        hab.este = lado(este)
+        hab.oeste = lado(oeste)
+        for i in range(primer_hijo, primer_hijo + num_hijos):
+            clase, activa, num_armario = _HIJO.unpack_from(
+                self._mapa, self._off_hijos + i * _HIJO.size)
+            if clase == _HIJO_ARMARIO:
+                hab.agregar_hijo(self.obtener_habitacion(num_armario))
+            else:
+                bomba = Bomba(None)
+                bomba.activa = activa == 1
+                hab.agregar_hijo(bomba)
+        return hab
+
+    def obtener_habitacion(self, num):
+        hab = self._indice.get(num)
+        if hab is None and not self._todas:
+            registro = self._buscar_registro(num)
+            if registro is not None:
+                hab = self._construir(_HABITACION.unpack_from(
+                    self._mapa, self._off_habs + registro * _HABITACION.size))
+        return hab
+
+    def buscador(self):
+        return self.obtener_habitacion
+
+    def cargar_todo(self):
+        """
+        Construye todas las habitaciones en el orden original.
+        """
+        if self._todas:
+            return
+        primer_nivel = []
+        indice = self._indice
+        tabla = memoryview(self._mapa)[self._off_habs:self._off_indice]
+        for campos in _HABITACION.iter_unpack(tabla):
+            hab = indice.get(campos[0])
+            if hab is None:
+                hab = self._construir(campos)
+            if campos[1] & _EN_LABERINTO:
+                primer_nivel.append(hab)
+        tabla.release()
+        self._habitaciones = primer_nivel
+        self._todas = True
+
+    @property
+    def habitaciones(self):
+        self.cargar_todo()
+        return self._habitaciones
+
+    @habitaciones.setter
+    def habitaciones(self, valor):
+        self._habitaciones = valor
+
+    def agregar_habitacion(self, hab):
+        self.cargar_todo()
+        super().agregar_habitacion(hab)
+
+    def puertas_de(self, habitaciones=None):
+        """
+        Todas las puertas salen de la tabla de puertas del archivo, sin
+        construir habitaciones; las de una región, de sus habitaciones.
+        """
+        if habitaciones is None:
+            return [self._puerta(i) for i in range(self._num_puertas)]
+        return super().puertas_de(habitaciones)
+
+    def cerrar(self):
+        """
+        Libera el mapa (un buffer ajeno solo se suelta). Las habitaciones ya
+        construidas siguen siendo válidas.
+        """
+        if self._mapa is not None:
+            for vista in self._vistas:
+                vista.release()
+            self._vistas = []
+            self._nums = None
+            if self._archivo is not None:
+                self._mapa.close()
+                self._archivo.close()
+            self._mapa = None
+
+    # -- Juego --
+    def fabricar_juego(self, juego=None):
+        """
+        Juego con este laberinto, sus bichos y el personaje guardados.
+        Solo se construyen las habitaciones donde hay alguien. Con 'juego'
+        (p. ej. el de un builder) se rellena ese en lugar de crear uno.
+        """
+        if juego is None:
+            juego = Juego()
+        juego.laberinto = self
+        for i in range(self._num_bichos):
+            pos, vidas, poder, modo = _BICHO.unpack_from(
+                self._mapa, self._off_bichos + i * _BICHO.size)
+            b = Bicho()
+            if modo == 0:
+                b.ini_agresivo()
+            elif modo == 1:
+                b.ini_perezoso()
+            b.vidas = vidas
+            b.poder = poder
+            juego.agregar_bicho(b)
+            if pos != _SIN_POSICION:
+                b.posicion = self.obtener_habitacion(pos)
+        if self._con_personaje:
+            pos, vidas, poder, largo = _PERSONAJE.unpack_from(self._mapa, self._off_personaje)
+            inicio = self._off_personaje + _PERSONAJE.size
+            p = Personaje(bytes(self._mapa[inicio:inicio + largo]).decode("utf-8"))
+            p.vidas = vidas
+            p.poder = poder
+            p.juego = juego
+            juego.person = p
+            if pos != _SIN_POSICION:
+                p.posicion = self.obtener_habitacion(pos)
+        return juego
+
+
+def abrir(ruta):
+    """
+    Abre un .lab y devuelve su Juego (con un LaberintoMapeado).
+    """
+    return LaberintoMapeado(ruta).fabricar_juego()
+
+
+# =========================================
+# ==========  CONVERSIÓN A JSON  ==========
+# =========================================
+def a_dict(juego):
+    """
+    Dict con el formato JSON que lee Director. Las paredes bomba, las bombas
+    en los lados y el estado de las puertas no tienen representación en
+    ese formato y se pierden.
+    """
+    laberinto = juego.laberinto
+
+    def habitacion_a_dict(hab):
+        d = {"tipo": "armario" if isinstance(hab, Armario) else "habitacion", "num": hab.num}
+        hijos = []
+        for hijo in hab.hijos:
+            if isinstance(hijo, Habitacion):
+                hijos.append(habitacion_a_dict(hijo))
+            elif isinstance(hijo, Bomba):
+                hijos.append({"tipo": "bomba"})
+        if hijos:
+            d["hijos"] = hijos
+        return d
+
+    puertas = []
+    vistas = set()
+    for hab in laberinto.habitaciones:
+        for lado, nombre in zip(LADOS, _NOMBRES_LADO):
+            p = getattr(hab, lado)
+            if isinstance(p, Puerta) and id(p) not in vistas:
+                vistas.add(id(p))
+                otra = p.lado2 if p.lado1 is hab else p.lado1
+                nombre_otra = next((n for l, n in zip(LADOS, _NOMBRES_LADO)
+                                    if getattr(otra, l) is p), None)
+                if nombre_otra is not None:
+                    puertas.append([hab.num, nombre, otra.num, nombre_otra])
+
+    bichos = [{"modo": b.nombre_modo(), "posicion": b.posicion.num}
+              for b in juego.bichos if b.posicion is not None]
+    return {
+        "laberinto": [habitacion_a_dict(h) for h in laberinto.habitaciones],
+        "puertas": puertas,
+        "bichos": bichos,
+    }
+
+
+def main(argv):
+    if len(argv) != 3:
+        print("Uso: python formato_binario.py ENTRADA SALIDA  (.json <-> .lab)")
+        return 2
+    entrada, salida = argv[1], argv[2]
+    if entrada.endswith(".json"):
+        director = Director()
+        director.procesar_en_flujo(entrada)
+        escribir(director.obtener_juego(), salida)
+    else:
+        juego = abrir(entrada)
+        with open(salida, "w", encoding="utf-8") as f:
+            json.dump(a_dict(juego), f)
+        juego.laberinto.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    from eventos import SumideroNulo, bus
+
+    bus.configurar(sumideros=[SumideroNulo()])
+    sys.exit(main(sys.argv))
@@ -0,0 +1,340 @@
+"""
+Generador procedural de laberintos en rejilla.
+
+Genera laberintos de ancho x alto habitaciones con el algoritmo Sidewinder,
+que trabaja fila a fila: en cada fila une tramos de habitaciones hacia el
+este y abre una sola puerta al norte por tramo. El coste es lineal y solo
+hace falta recordar dos filas, así que cada habitación y cada puerta se
+entregan al destino según se generan.
+
+- perfecto (trenzado=0): un único camino entre cada par de habitaciones.
+- trenzado (0 < trenzado <= 1): esa fracción de callejones sin salida recibe
+  una puerta más, de modo que aparecen ciclos.
+
+Cada habitación puede llevar además un armario ('densidad_armarios'), una
+bomba ('densidad_bombas') y un bicho ('densidad_bichos', agresivo con
+probabilidad 'agresivos'). Con la misma semilla se obtiene el mismo
+laberinto en cualquier destino:
+
+- DestinoCreator: objetos creados por un Creator/CreatorB (Factory Method).
+- DestinoBuilder: llamadas a un LaberintoBuilder, como hace Director.
+- DestinoJSON:    archivo JSON en el formato de Director, escrito por partes.
+
+Ejemplo:
+    juego = generar_juego(CreatorB(), 1000, 1000, semilla=7, trenzado=0.3)
+    generar_json("nivel.json", 1000, 1000, semilla=7, densidad_bichos=0.01)
+
+Uso desde línea de órdenes:
+    python generador.py nivel.json 1000 1000 --semilla 7 --trenzado 0.3
+"""
+import argparse
+import random
+import shutil
+import tempfile
+
+from main import Creator, LaberintoBuilder
+
+
+# =========================================
+# ===============  DESTINOS  ==============
+# =========================================
+class Destino:
+    """
+    Recibe lo que genera Generador, en este orden por cada fila: las
+    habitaciones (con sus bichos) y después las puertas de la fila.
+    Las puertas solo citan habitaciones ya entregadas.
+    """
+    def habitacion(self, num, armario=None, bomba=False):
+        raise NotImplementedError("Subclase debe implementarlo")
+
+    def puerta(self, num1, or1, num2, or2):
+        raise NotImplementedError("Subclase debe implementarlo")
+
+    def bicho(self, modo, num):
+        raise NotImplementedError("Subclase debe implementarlo")
+
+    def terminar(self):
+        return None
+
+
+class DestinoCreator(Destino):
+    """
+    Construye Laberinto, habitaciones, puertas, bombas y bichos con las
+    fábricas de 'creator'. terminar() devuelve el Juego.
+    """
+    def __init__(self, creator):
+        self.creator = creator
+        self.laberinto = creator.fabricar_laberinto()
+        self.juego = creator.fabricar_juego()
+        self.juego.laberinto = self.laberinto
+
+    def habitacion(self, num, armario=None, bomba=False):
+        creator = self.creator
+        hab = creator.fabricar_habitacion(num)
+        self.laberinto.agregar_habitacion(hab)
+        if armario is not None:
+            arm = creator.fabricar_armario(armario)
+            hab.agregar_hijo(arm)
+            self.laberinto.indexar_habitacion(arm, hab)
+        if bomba:
+            hab.agregar_hijo(creator.fabricar_bomba())
+
+    def puerta(self, num1, or1, num2, or2):
+        h1 = self.laberinto.obtener_habitacion(num1)
+        h2 = self.laberinto.obtener_habitacion(num2)
+        puerta = self.creator.fabricar_puerta(h1, h2)
+        h1.conectar(or1, puerta)
+        h2.conectar(or2, puerta)
+
+    def bicho(self, modo, num):
+        if modo == "Agresivo":
+            b = self.creator.fabricar_bicho_agresivo()
+        else:
+            b = self.creator.fabricar_bicho_perezoso()
+        b.posicion = self.laberinto.obtener_habitacion(num)
+        self.juego.agregar_bicho(b)
+
+    def terminar(self):
+        return self.juego
+
+
+class DestinoBuilder(Destino):
+    """
+    Pasa cada pieza a un LaberintoBuilder. terminar() devuelve el Juego.
+    """
+    def __init__(self, builder):
+        self.builder = builder
+        builder.fabricar_laberinto()
+        builder.fabricar_juego()
+
+    def habitacion(self, num, armario=None, bomba=False):
+        hab = self.builder.fabricar_habitacion(num)
+        if armario is not None:
+            self.builder.fabricar_armario(armario, hab)
+        if bomba:
+            self.builder.fabricar_bomba_en(hab)
+
+    def puerta(self, num1, or1, num2, or2):
+        self.builder.fabricar_puerta_l1(num1, or1, num2, or2)
+
+    def bicho(self, modo, num):
+        self.builder.fabricar_bicho_modo(modo, num)
+
+    def terminar(self):
+        return self.builder.obtener_juego()
+
+
+class DestinoJSON(Destino):
+    """
+    Escribe el JSON que lee Director ('laberinto', 'puertas', 'bichos').
+    Cada sección va a su propio archivo temporal y al terminar se concatenan,
+    así que la memoria no crece con el tamaño del laberinto.
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._secciones = {clave: tempfile.TemporaryFile("w+", encoding="utf-8")
+                           for clave in ("laberinto", "puertas", "bichos")}
+        self._primero = dict.fromkeys(self._secciones, True)
+
+    def _escribir(self, clave, texto):
+        archivo = self._secciones[clave]
+        if self._primero[clave]:
+            self._primero[clave] = False
+            archivo.write(texto)
+        else:
+            archivo.write(",\n" + texto)
+
+    def habitacion(self, num, armario=None, bomba=False):
+        hijos = []
+        if armario is not None:
+            hijos.append(f'{{"tipo": "armario", "num": {armario}}}')
+        if bomba:
+            hijos.append('{"tipo": "bomba"}')
+        if hijos:
+            self._escribir("laberinto", f'{{"tipo": "habitacion", "num": {num}, '
+                                        f'"hijos": [{", ".join(hijos)}]}}')
+        else:
+            self._escribir("laberinto", f'{{"tipo": "habitacion", "num": {num}}}')
+
+    def puerta(self, num1, or1, num2, or2):
+        self._escribir("puertas", f'[{num1}, "{or1.capitalize()}", {num2}, "{or2.capitalize()}"]')
+
+    def bicho(self, modo, num):
+        self._escribir("bichos", f'{{"modo": "{modo}", "posicion": {num}}}')
+
+    def terminar(self):
+        with open(self.ruta, "w", encoding="utf-8") as salida:
+            salida.write("{\n")
+            for i, (clave, archivo) in enumerate(self._secciones.items()):
+                salida.write(f'{"," if i else ""}"{clave}": [\n')
+                archivo.seek(0)
+                shutil.copyfileobj(archivo, salida)
+                archivo.close()
+                salida.write("\n]\n")
+            salida.write("}\n")
+        return self.ruta
+
+
+# =========================================
+# ==============  GENERADOR  ==============
+# =========================================
+class Generador:
+    """
+    Sidewinder con trenzado opcional. Las habitaciones se numeran por filas
+    desde 1; los armarios, a continuación (ancho * alto + 1, ...).
+    """
+    def __init__(self, ancho, alto, semilla=None, trenzado=0.0, densidad_bombas=0.0,
+                 densidad_armarios=0.0, densidad_bichos=0.0, agresivos=0.5):
+        if ancho < 1 or alto < 1:
+            raise ValueError("El laberinto necesita al menos una habitación")
+        self.ancho = ancho
+        self.alto = alto
+        self.semilla = semilla
+        self.trenzado = trenzado
+        self.densidad_bombas = densidad_bombas
+        self.densidad_armarios = densidad_armarios
+        self.densidad_bichos = densidad_bichos
+        self.agresivos = agresivos
+
+    def generar(self, destino):
+        """
+        Entrega el laberinto a 'destino' fila a fila y devuelve destino.terminar().
+        """
+        ancho, alto = self.ancho, self.alto
+        rng = random.Random(self.semilla)
+        azar = rng.random
+        siguiente_armario = ancho * alto + 1
+        # Por cada columna de la fila anterior y de la actual: ¿puerta al este?
+        # ¿puerta al norte? Con ellas se sabe el grado de cada habitación de la
+        # fila anterior en cuanto se talla la actual.
+        este_ant = norte_ant = None
+
+        for fila in range(alto):
+            base = fila * ancho
+            # -- Habitaciones y su contenido --
+            for col in range(ancho):
+                num = base + col + 1
+                armario = None
+                if self.densidad_armarios and azar() < self.densidad_armarios:
+                    armario = siguiente_armario
+                    siguiente_armario += 1
+                bomba = bool(self.densidad_bombas) and azar() < self.densidad_bombas
+                destino.habitacion(num, armario, bomba)
+                if self.densidad_bichos and azar() < self.densidad_bichos:
+                    destino.bicho("Agresivo" if azar() < self.agresivos else "Perezoso", num)
+
+            # -- Sidewinder: tramos hacia el este y una puerta al norte por tramo --
+            este = bytearray(ancho)
+            norte = bytearray(ancho)
+            inicio_tramo = 0
+            for col in range(ancho):
+                ultima = col == ancho - 1
+                cerrar = ultima or (fila > 0 and azar() < 0.5)
+                if not cerrar:
+                    este[col] = 1
+                    destino.puerta(base + col + 1, "este", base + col + 2, "oeste")
+                    continue
+                if fila > 0:
+                    elegida = inicio_tramo + int(azar() * (col - inicio_tramo + 1))
+                    norte[elegida] = 1
+                    num = base + elegida + 1
+                    destino.puerta(num - ancho, "sur", num, "norte")
+                inicio_tramo = col + 1
+
+            # -- La fila anterior ya tiene su grado definitivo: trenzarla --
+            if self.trenzado and fila > 0:
+                self._trenzar(destino, rng, fila - 1, este_ant, norte_ant, norte)
+            este_ant, norte_ant = este, norte
+
+        if self.trenzado:
+            self._trenzar(destino, rng, alto - 1, este_ant, norte_ant, None)
+        return destino.terminar()
+
+    def _trenzar(self, destino, rng, fila, este, norte, norte_sig):
+        """
+        Abre una puerta más en una fracción 'trenzado' de los callejones sin
+        salida de 'fila'. 'norte_sig' son las puertas al norte de la fila de
+        debajo (None si es la última).
+        """
+        ancho = self.ancho
+        base = fila * ancho
+        for col in range(ancho):
+            grado = (este[col] + (col > 0 and este[col - 1]) + norte[col]
+                     + (norte_sig is not None and norte_sig[col]))
+            if grado != 1 or rng.random() >= self.trenzado:
+                continue
+            opciones = []
+            if col > 0 and not este[col - 1]:
+                opciones.append("oeste")
+            if col < ancho - 1 and not este[col]:
+                opciones.append("este")
+            if fila > 0 and not norte[col]:
+                opciones.append("norte")
+            if norte_sig is not None and not norte_sig[col]:
+                opciones.append("sur")
+            if not opciones:
+                continue
+            lado = rng.choice(opciones)
+            num = base + col + 1
+            if lado == "oeste":
+                este[col - 1] = 1
+                destino.puerta(num - 1, "este", num, "oeste")
+            elif lado == "este":
+                este[col] = 1
+                destino.puerta(num, "este", num + 1, "oeste")
+            elif lado == "norte":
+                norte[col] = 1
+                destino.puerta(num - ancho, "sur", num, "norte")
+            else:
+                norte_sig[col] = 1
+                destino.puerta(num, "sur", num + ancho, "norte")
+
+
+# =========================================
+# =============  ATAJOS  ==================
+# =========================================
+def generar_juego(creator=None, ancho=10, alto=10, **opciones):
+    """
+    Juego generado con las fábricas de 'creator' (Creator() por defecto).
+    """
+    destino = DestinoCreator(creator if creator is not None else Creator(compacto=True))
+    return Generador(ancho, alto, **opciones).generar(destino)
+
+
+def generar_en_builder(builder=None, ancho=10, alto=10, **opciones):
+    """
+    Juego generado a través de un LaberintoBuilder (uno compacto por defecto).
+    """
+    destino = DestinoBuilder(builder if builder is not None else LaberintoBuilder(compacto=True))
+    return Generador(ancho, alto, **opciones).generar(destino)
+
+
+def generar_json(ruta, ancho, alto, **opciones):
+    """
+    Escribe en 'ruta' el laberinto generado, en el formato de Director.
+    """
+    return Generador(ancho, alto, **opciones).generar(DestinoJSON(ruta))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera laberintos en rejilla (Sidewinder).")
+    parser.add_argument("ruta", help="archivo JSON de salida")
+    parser.add_argument("ancho", type=int)
+    parser.add_argument("alto", type=int)
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--trenzado", type=float, default=0.0,
+                        help="fracción de callejones sin salida que se abren (0 = perfecto)")
+    parser.add_argument("--bombas", type=float, default=0.0, help="densidad de bombas")
+    parser.add_argument("--armarios", type=float, default=0.0, help="densidad de armarios")
+    parser.add_argument("--bichos", type=float, default=0.0, help="densidad de bichos")
+    parser.add_argument("--agresivos", type=float, default=0.5,
+                        help="proporción de bichos agresivos")
+    args = parser.parse_args(argv)
+    generar_json(args.ruta, args.ancho, args.alto, semilla=args.semilla,
+                 trenzado=args.trenzado, densidad_bombas=args.bombas,
+                 densidad_armarios=args.armarios, densidad_bichos=args.bichos,
+                 agresivos=args.agresivos)
+
+
+if __name__ == "__main__":
+    main()
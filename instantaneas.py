@@ -0,0 +1,634 @@
+"""
+Instantáneas del estado de un Juego: capturar, restaurar, bifurcar y deltas.
+
+Reconstruir desde JSON pierde el estado de la partida (vidas, posiciones,
+puertas abiertas, bombas activas...). Una Instantanea lo guarda en columnas
+compactas, con una entrada por elemento en un orden fijo:
+
+    puertas     1 byte por puerta (abierta), en el orden de puertas_de()
+    bombas      1 byte por Bomba o ParedBomba (activa), en orden de recorrido
+    vidas, poder, posiciones   array('i') con una entrada por bicho; la
+                posición es el num de la habitación (-1 si no tiene)
+    modos       1 byte por bicho (Agresivo, Perezoso, sin modo u otro)
+    personaje   (nombre, vidas, poder, posición) o None
+    partida     ganador, instante_fin y muertes por habitación
+
+La estructura (habitaciones y qué puerta une qué) no se guarda. Se restaura
+sobre un juego con el mismo laberinto y los mismos bichos: el mismo juego o
+uno construido con el mismo JSON. El orden de las columnas lo fija un
+Esquema, que se calcula una vez por juego.
+
+Las columnas no se modifican nunca, así que bifurcar no copia nada.
+Delta.aplicar(base) devuelve una instantánea nueva que comparte con 'base'
+todas las columnas que el delta no toca (copia en escritura). Un Diario
+escucha los eventos del bus. En cada punto_de_control() guarda un Delta con
+lo que ha cambiado desde el anterior, así que el coste es el del cambio y no
+el del mapa. Se puede volcar también a un archivo.
+
+En archivo, cada instantánea o delta es un registro (magia y longitud)
+comprimido con zlib; los enteros van en little-endian.
+
+Ejemplo:
+    inicio = capturar(juego)
+    ...                                       # la partida sigue
+    restaurar(juego, inicio)                  # vuelve al estado guardado
+
+    director = Director(compacto=True)
+    director.procesar_datos(datos)
+    rama = director.obtener_juego()
+    restaurar(rama, inicio)                   # otra partida desde ahí
+
+    diario = Diario(juego, "partida.ins")
+    ...
+    diario.punto_de_control()                 # solo lo que ha cambiado
+    restaurar(otro, cargar("partida.ins"))
+"""
+import math
+import struct
+import sys
+import threading
+import weakref
+import zlib
+from array import array
+from collections import Counter
+
+from eventos import TipoEvento, bus
+from main import Agresivo, Bicho, Bomba, ParedBomba, Perezoso, Personaje, Puerta
+
+SIN_POSICION = -1
+
+# Códigos de la columna 'modos' (los mismos que formato_binario).
+_AGRESIVO, _PEREZOSO, _SIN_MODO, _OTRO_MODO = range(4)
+_CODIGOS_MODO = {Agresivo: _AGRESIVO, Perezoso: _PEREZOSO, type(None): _SIN_MODO}
+_CLASES_MODO = {_AGRESIVO: Agresivo, _PEREZOSO: Perezoso}
+
+_GANADORES = (None, "personaje", "bichos")
+
+MAGIA_INSTANTANEA = b"INS1"
+MAGIA_DELTA = b"DLT1"
+
+_REGISTRO = struct.Struct("<4sI")               # magia, longitud comprimida
+_CAB_INSTANTANEA = struct.Struct("<IIId")       # puertas, bombas, bichos, instante
+_CAB_DELTA = struct.Struct("<IIIIIId")          # firma (3), cambios (3), instante
+_COLA = struct.Struct("<BdBiiiHI")              # ganador, fin, personaje (4), muertes
+
+
+# =========================================
+# ===============  ESQUEMA  ===============
+# =========================================
+class Esquema:
+    """
+    Orden fijo de las puertas, bombas y bichos de un juego. Es estructura:
+    solo cambia si se añaden puertas, bombas o bichos (ver olvidar_esquema).
+    """
+    def __init__(self, juego):
+        laberinto = juego.laberinto
+        self.laberinto = laberinto
+        self.puertas = laberinto.puertas_de()
+        self.bombas = list(laberinto.elementos(tipo=(Bomba, ParedBomba)))
+        self.bichos = list(juego.bichos)
+        self._indices = None
+
+    @property
+    def firma(self):
+        return (len(self.puertas), len(self.bombas), len(self.bichos))
+
+    def indices(self):
+        """
+        Diccionarios elemento -> posición en su columna (puertas, bombas y
+        bichos). Se construyen la primera vez; solo los necesita el Diario.
+        """
+        if self._indices is None:
+            self._indices = tuple({e: i for i, e in enumerate(lista)}
+                                  for lista in (self.puertas, self.bombas, self.bichos))
+        return self._indices
+
+
+_ESQUEMAS = weakref.WeakKeyDictionary()
+
+
+def esquema(juego):
+    """
+    Esquema del juego, calculado una vez y rehecho si cambian el laberinto
+    o la lista de bichos.
+    """
+    esq = _ESQUEMAS.get(juego)
+    if esq is None or esq.laberinto is not juego.laberinto or esq.bichos != juego.bichos:
+        esq = _ESQUEMAS[juego] = Esquema(juego)
+    return esq
+
+
+def olvidar_esquema(juego):
+    """
+    Descarta el esquema guardado (tras añadir puertas o bombas al laberinto).
+    """
+    _ESQUEMAS.pop(juego, None)
+
+
+# =========================================
+# ============  INSTANTÁNEAS  =============
+# =========================================
+class Instantanea:
+    """
+    Estado completo de un juego en columnas. No se modifica: las
+    instantáneas derivadas comparten las columnas que no cambian.
+    """
+    __slots__ = ('puertas', 'bombas', 'vidas', 'poder', 'posiciones', 'modos',
+                 'personaje', 'partida', 'instante')
+
+    def __init__(self, puertas, bombas, vidas, poder, posiciones, modos,
+                 personaje, partida, instante):
+        self.puertas = puertas
+        self.bombas = bombas
+        self.vidas = vidas
+        self.poder = poder
+        self.posiciones = posiciones
+        self.modos = modos
+        self.personaje = personaje
+        self.partida = partida
+        self.instante = instante
+
+    @property
+    def firma(self):
+        return (len(self.puertas), len(self.bombas), len(self.vidas))
+
+    def a_bytes(self):
+        partes = [_CAB_INSTANTANEA.pack(*self.firma, self.instante),
+                  self.puertas, self.bombas, _le(self.vidas), _le(self.poder),
+                  _le(self.posiciones), self.modos]
+        _empaquetar_cola(partes, self.personaje, self.partida)
+        return b"".join(partes)
+
+    @classmethod
+    def desde_bytes(cls, datos):
+        cursor = _Cursor(datos)
+        puertas, bombas, bichos, instante = cursor.struct(_CAB_INSTANTANEA)
+        return cls(cursor.bytes(puertas), cursor.bytes(bombas), cursor.enteros(bichos),
+                   cursor.enteros(bichos), cursor.enteros(bichos), cursor.bytes(bichos),
+                   *_desempaquetar_cola(cursor), instante)
+
+    def __str__(self):
+        puertas, bombas, bichos = self.firma
+        return f"Instantanea(puertas={puertas}, bombas={bombas}, bichos={bichos})"
+
+
+class Delta:
+    """
+    Cambios sobre una instantánea: para cada columna, los índices que
+    cambian y sus valores nuevos. El personaje y la partida van enteros.
+    """
+    __slots__ = ('firma', 'puertas', 'bombas', 'bichos', 'vidas', 'poder',
+                 'posiciones', 'modos', 'personaje', 'partida', 'instante')
+
+    def __init__(self, firma, puertas, bombas, bichos, vidas, poder, posiciones,
+                 modos, personaje, partida, instante):
+        self.firma = firma
+        self.puertas = puertas      # (índices, valores)
+        self.bombas = bombas        # (índices, valores)
+        self.bichos = bichos        # índices de las columnas de bichos
+        self.vidas = vidas
+        self.poder = poder
+        self.posiciones = posiciones
+        self.modos = modos
+        self.personaje = personaje
+        self.partida = partida
+        self.instante = instante
+
+    def __len__(self):
+        return len(self.puertas[0]) + len(self.bombas[0]) + len(self.bichos)
+
+    def aplicar(self, base):
+        """
+        Instantánea resultante de aplicar el delta a 'base'. Las columnas
+        sin cambios se comparten con 'base'.
+        """
+        _comprobar_firma(self.firma, base.firma)
+        bichos = self.bichos
+        return Instantanea(
+            _con_cambios(base.puertas, *self.puertas),
+            _con_cambios(base.bombas, *self.bombas),
+            _con_cambios(base.vidas, bichos, self.vidas),
+            _con_cambios(base.poder, bichos, self.poder),
+            _con_cambios(base.posiciones, bichos, self.posiciones),
+            _con_cambios(base.modos, bichos, self.modos),
+            self.personaje, self.partida, self.instante)
+
+    def a_bytes(self):
+        (ip, vp), (ib, vb), ie = self.puertas, self.bombas, self.bichos
+        partes = [_CAB_DELTA.pack(*self.firma, len(ip), len(ib), len(ie), self.instante),
+                  _le(ip), vp, _le(ib), vb, _le(ie), _le(self.vidas), _le(self.poder),
+                  _le(self.posiciones), self.modos]
+        _empaquetar_cola(partes, self.personaje, self.partida)
+        return b"".join(partes)
+
+    @classmethod
+    def desde_bytes(cls, datos):
+        cursor = _Cursor(datos)
+        *firma, np, nb, ne, instante = cursor.struct(_CAB_DELTA)
+        puertas = (cursor.enteros(np), cursor.bytes(np))
+        bombas = (cursor.enteros(nb), cursor.bytes(nb))
+        return cls(tuple(firma), puertas, bombas, cursor.enteros(ne), cursor.enteros(ne),
+                   cursor.enteros(ne), cursor.enteros(ne), cursor.bytes(ne),
+                   *_desempaquetar_cola(cursor), instante)
+
+    def __str__(self):
+        return (f"Delta(puertas={len(self.puertas[0])}, bombas={len(self.bombas[0])}, "
+                f"bichos={len(self.bichos)})")
+
+
+def _con_cambios(columna, indices, valores):
+    # Copia en escritura: sin cambios se devuelve la misma columna.
+    if not indices:
+        return columna
+    copia = bytearray(columna) if isinstance(columna, bytes) else array(columna.typecode, columna)
+    for i, v in zip(indices, valores):
+        copia[i] = v
+    return bytes(copia) if isinstance(columna, bytes) else copia
+
+
+def _comprobar_firma(esperada, encontrada):
+    if tuple(esperada) != tuple(encontrada):
+        raise ValueError(f"La instantánea no corresponde a este juego: "
+                         f"(puertas, bombas, bichos) {tuple(esperada)} != {tuple(encontrada)}")
+
+
+# =========================================
+# ===============  CAPTURA  ===============
+# =========================================
+def _num(hab):
+    return SIN_POSICION if hab is None else hab.num
+
+
+def _personaje(juego):
+    p = juego.person
+    if p is None:
+        return None
+    return (p.nombre, p.vidas, p.poder, _num(p.posicion))
+
+
+def _partida(juego):
+    return (juego.ganador, juego.instante_fin, dict(juego.muertes_por_habitacion))
+
+
+def capturar(juego):
+    """
+    Instantánea del estado actual de 'juego'.
+    """
+    esq = esquema(juego)
+    bichos = esq.bichos
+    abiertas = getattr(juego.laberinto, 'abiertas', None)
+    if isinstance(abiertas, bytearray):
+        puertas = bytes(abiertas)  # LaberintoRejilla: la columna ya existe
+    else:
+        puertas = bytes([p.abierta for p in esq.puertas])
+    codigos = _CODIGOS_MODO
+    return Instantanea(
+        puertas,
+        bytes([b.activa for b in esq.bombas]),
+        array('i', [b.vidas for b in bichos]),
+        array('i', [b.poder for b in bichos]),
+        array('i', [SIN_POSICION if b.posicion is None else b.posicion.num for b in bichos]),
+        bytes([codigos.get(type(b.modo), _OTRO_MODO) for b in bichos]),
+        _personaje(juego), _partida(juego), juego.reloj.ahora())
+
+
+def _leer_delta(juego, esq, puertas, bombas, bichos):
+    # Delta con el valor actual de los elementos en esas posiciones.
+    todas_p, todas_b, todos = esq.puertas, esq.bombas, esq.bichos
+    seleccion = [todos[i] for i in bichos]
+    codigos = _CODIGOS_MODO
+    return Delta(
+        esq.firma,
+        (array('i', puertas), bytes([todas_p[i].abierta for i in puertas])),
+        (array('i', bombas), bytes([todas_b[i].activa for i in bombas])),
+        array('i', bichos),
+        array('i', [b.vidas for b in seleccion]),
+        array('i', [b.poder for b in seleccion]),
+        array('i', [_num(b.posicion) for b in seleccion]),
+        bytes([codigos.get(type(b.modo), _OTRO_MODO) for b in seleccion]),
+        _personaje(juego), _partida(juego), juego.reloj.ahora())
+
+
+def diferencia(anterior, nueva):
+    """
+    Delta que lleva de la instantánea 'anterior' a 'nueva'. Compara todas
+    las columnas; para puntos de control frecuentes, usar un Diario.
+    """
+    _comprobar_firma(anterior.firma, nueva.firma)
+
+    def cambios(a, b):
+        return array('i', [i for i, (x, y) in enumerate(zip(a, b)) if x != y])
+
+    ip = cambios(anterior.puertas, nueva.puertas)
+    ib = cambios(anterior.bombas, nueva.bombas)
+    ie = cambios(zip(anterior.vidas, anterior.poder, anterior.posiciones, anterior.modos),
+                 zip(nueva.vidas, nueva.poder, nueva.posiciones, nueva.modos))
+    return Delta(
+        nueva.firma,
+        (ip, bytes([nueva.puertas[i] for i in ip])),
+        (ib, bytes([nueva.bombas[i] for i in ib])),
+        ie,
+        array('i', [nueva.vidas[i] for i in ie]),
+        array('i', [nueva.poder[i] for i in ie]),
+        array('i', [nueva.posiciones[i] for i in ie]),
+        bytes([nueva.modos[i] for i in ie]),
+        nueva.personaje, nueva.partida, nueva.instante)
+
+
+# =========================================
+# =============  RESTAURACIÓN  ============
+# =========================================
+def restaurar(juego, estado):
+    """
+    Pone 'juego' en el estado de una Instantanea, o le aplica un Delta (que
+    solo toca lo que cambia). Un Delta se aplica sobre el estado del que se
+    calculó. No emite eventos. El reloj del juego no se toca; para seguir
+    con un reloj simulado desde el mismo instante, usar
+    RelojSimulado(inicio=estado.instante). Los Planificadores ya creados no
+    se enteran de los bichos que reviven.
+    """
+    esq = esquema(juego)
+    _comprobar_firma(estado.firma, esq.firma)
+    buscar = juego.laberinto.buscador()
+    if isinstance(estado, Delta):
+        _restaurar_delta(juego, esq, estado, buscar)
+    else:
+        _restaurar_instantanea(juego, esq, estado, buscar)
+    _poner_personaje(juego, estado.personaje, buscar)
+    ganador, instante_fin, muertes = estado.partida
+    juego.ganador = ganador
+    juego.instante_fin = instante_fin
+    juego.muertes_por_habitacion = Counter(muertes)
+    if juego.campo is not None:
+        juego.campo.invalidar()
+    return juego
+
+
+def _restaurar_instantanea(juego, esq, inst, buscar):
+    abiertas = getattr(juego.laberinto, 'abiertas', None)
+    if isinstance(abiertas, bytearray):
+        abiertas[:] = inst.puertas
+    else:
+        for puerta, valor in zip(esq.puertas, inst.puertas):
+            puerta.abierta = valor == 1
+    for bomba, valor in zip(esq.bombas, inst.bombas):
+        bomba.activa = valor == 1
+    for b, vidas, poder, pos, modo in zip(esq.bichos, inst.vidas, inst.poder,
+                                          inst.posiciones, inst.modos):
+        _poner_bicho(b, vidas, poder, pos, modo, buscar)
+    juego.recontar_vivos()
+
+
+def _restaurar_delta(juego, esq, delta, buscar):
+    puertas, bombas, bichos = esq.puertas, esq.bombas, esq.bichos
+    for i, valor in zip(*delta.puertas):
+        puertas[i].abierta = valor == 1
+    for i, valor in zip(*delta.bombas):
+        bombas[i].activa = valor == 1
+    for i, vidas, poder, pos, modo in zip(delta.bichos, delta.vidas, delta.poder,
+                                          delta.posiciones, delta.modos):
+        b = bichos[i]
+        _poner_bicho(b, vidas, poder, pos, modo, buscar)
+        juego.actualizar_vivo(b)
+
+
+def _poner_bicho(b, vidas, poder, pos, modo, buscar):
+    b.vidas = vidas
+    b.poder = poder
+    if modo != _OTRO_MODO and _CODIGOS_MODO.get(type(b.modo)) != modo:
+        clase = _CLASES_MODO.get(modo)
+        b.modo = clase() if clase is not None else None
+    b.colocar(None if pos == SIN_POSICION else buscar(pos))
+
+
+def _poner_personaje(juego, datos, buscar):
+    p = juego.person
+    if datos is None:
+        if p is not None:
+            p.desalojar()
+            juego.person = None
+        return
+    nombre, vidas, poder, pos = datos
+    if p is None:
+        p = Personaje(nombre)
+        p.juego = juego
+        juego.person = p
+    p.nombre = nombre
+    p.vidas = vidas
+    p.poder = poder
+    p.colocar(None if pos == SIN_POSICION else buscar(pos))
+
+
+# =========================================
+# ================  DIARIO  ===============
+# =========================================
+class Diario:
+    """
+    Puntos de control incrementales de un juego. Parte de una instantánea
+    completa ('base') y escucha en el bus los eventos de puertas, movimiento,
+    vidas y muertes para saber qué ha cambiado. Lo que cambie sin emitir
+    eventos (modos, bombas, atributos puestos a mano) hay que marcarlo.
+    Si se da 'ruta', la base y cada delta se añaden al archivo.
+    """
+    def __init__(self, juego, ruta=None):
+        self.juego = juego
+        self.base = capturar(juego)
+        self.deltas = []
+        self._cerrojo = threading.Lock()
+        self._puertas = {}
+        self._bombas = {}
+        self._bichos = {}
+        self._archivo = None
+        if ruta is not None:
+            self._archivo = open(ruta, "wb")
+            _escribir_registro(self._archivo, self.base)
+        bus.suscribir(TipoEvento.PUERTA, self._puerta_cambiada)
+        bus.suscribir((TipoEvento.MOVIMIENTO, TipoEvento.VIDAS), self._ente_cambiado)
+        bus.suscribir(TipoEvento.MUERTE, self._bicho_muerto)
+
+    # -- Marcas --
+    def _puerta_cambiada(self, evento):
+        with self._cerrojo:
+            self._puertas[evento.datos["puerta"]] = None
+
+    def _ente_cambiado(self, evento):
+        ente = evento.datos.get("ente")
+        if isinstance(ente, Bicho):
+            with self._cerrojo:
+                self._bichos[ente] = None
+
+    def _bicho_muerto(self, evento):
+        with self._cerrojo:
+            self._bichos[evento.datos["bicho"]] = None
+
+    def marcar(self, *elementos):
+        """
+        Apunta cambios que no pasan por el bus: bichos (modo, poder...),
+        puertas y bombas. El personaje se guarda siempre.
+        """
+        with self._cerrojo:
+            for e in elementos:
+                if isinstance(e, Bicho):
+                    self._bichos[e] = None
+                elif isinstance(e, Puerta):
+                    self._puertas[e] = None
+                elif isinstance(e, (Bomba, ParedBomba)):
+                    self._bombas[e] = None
+
+    # -- Puntos de control --
+    def punto_de_control(self):
+        """
+        Guarda y devuelve un Delta con lo cambiado desde el punto anterior.
+        """
+        with self._cerrojo:
+            puertas, self._puertas = self._puertas, {}
+            bombas, self._bombas = self._bombas, {}
+            bichos, self._bichos = self._bichos, {}
+        esq = esquema(self.juego)
+        _comprobar_firma(self.base.firma, esq.firma)
+        ip, ib, ie = esq.indices()
+        delta = _leer_delta(self.juego, esq,
+                            sorted(ip[p] for p in puertas if p in ip),
+                            sorted(ib[b] for b in bombas if b in ib),
+                            sorted(ie[b] for b in bichos if b in ie))
+        self.deltas.append(delta)
+        if self._archivo is not None:
+            _escribir_registro(self._archivo, delta)
+        return delta
+
+    def instantanea(self, hasta=None):
+        """
+        Instantánea en el punto de control 'hasta' (por defecto, el último).
+        """
+        inst = self.base
+        for delta in self.deltas[:hasta]:
+            inst = delta.aplicar(inst)
+        return inst
+
+    def compactar(self):
+        """
+        Funde los deltas en una nueva base (y reescribe el archivo, si hay).
+        """
+        self.base = self.instantanea()
+        self.deltas = []
+        if self._archivo is not None:
+            self._archivo.seek(0)
+            self._archivo.truncate()
+            _escribir_registro(self._archivo, self.base)
+
+    def cerrar(self):
+        bus.desuscribir(TipoEvento.PUERTA, self._puerta_cambiada)
+        bus.desuscribir((TipoEvento.MOVIMIENTO, TipoEvento.VIDAS), self._ente_cambiado)
+        bus.desuscribir(TipoEvento.MUERTE, self._bicho_muerto)
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+
+# =========================================
+# ===============  ARCHIVOS  ==============
+# =========================================
+def _le(columna):
+    # Enteros de un array('i') en little-endian.
+    if sys.byteorder == "big":
+        columna = array(columna.typecode, columna)
+        columna.byteswap()
+    return columna.tobytes()
+
+
+class _Cursor:
+    def __init__(self, datos):
+        self.datos = datos
+        self.pos = 0
+
+    def bytes(self, n):
+        inicio = self.pos
+        self.pos += n
+        return bytes(self.datos[inicio:self.pos])
+
+    def enteros(self, n):
+        columna = array('i')
+        columna.frombytes(self.bytes(4 * n))
+        if sys.byteorder == "big":
+            columna.byteswap()
+        return columna
+
+    def struct(self, formato):
+        valores = formato.unpack_from(self.datos, self.pos)
+        self.pos += formato.size
+        return valores
+
+
+def _empaquetar_cola(partes, personaje, partida):
+    ganador, instante_fin, muertes = partida
+    if personaje is None:
+        nombre, vidas, poder, pos = "", 0, 0, SIN_POSICION
+    else:
+        nombre, vidas, poder, pos = personaje
+    nombre = nombre.encode("utf-8")
+    partes.append(_COLA.pack(_GANADORES.index(ganador),
+                             math.nan if instante_fin is None else instante_fin,
+                             personaje is not None, vidas, poder, pos,
+                             len(nombre), len(muertes)))
+    partes.append(nombre)
+    partes.append(_le(array('i', [x for par in muertes.items() for x in par])))
+
+
+def _desempaquetar_cola(cursor):
+    ganador, fin, con_personaje, vidas, poder, pos, largo, n = cursor.struct(_COLA)
+    nombre = cursor.bytes(largo).decode("utf-8")
+    muertes = cursor.enteros(2 * n)
+    personaje = (nombre, vidas, poder, pos) if con_personaje else None
+    partida = (_GANADORES[ganador], None if math.isnan(fin) else fin,
+               dict(zip(muertes[0::2], muertes[1::2])))
+    return personaje, partida
+
+
+def _escribir_registro(archivo, estado):
+    magia = MAGIA_DELTA if isinstance(estado, Delta) else MAGIA_INSTANTANEA
+    datos = zlib.compress(estado.a_bytes(), 1)
+    archivo.write(_REGISTRO.pack(magia, len(datos)))
+    archivo.write(datos)
+    archivo.flush()
+
+
+def guardar(instantanea, ruta):
+    with open(ruta, "wb") as f:
+        _escribir_registro(f, instantanea)
+
+
+def leer_registros(ruta):
+    """
+    Lista con la instantánea y los deltas guardados en 'ruta', en orden.
+    """
+    registros = []
+    with open(ruta, "rb") as f:
+        while True:
+            cabecera = f.read(_REGISTRO.size)
+            if len(cabecera) < _REGISTRO.size:
+                break
+            magia, largo = _REGISTRO.unpack(cabecera)
+            datos = f.read(largo)
+            if len(datos) < largo:
+                break  # registro a medio escribir: se ignora
+            if magia == MAGIA_INSTANTANEA:
+                registros.append(Instantanea.desde_bytes(zlib.decompress(datos)))
+            elif magia == MAGIA_DELTA:
+                registros.append(Delta.desde_bytes(zlib.decompress(datos)))
+            else:
+                raise ValueError(f"{ruta}: registro desconocido {magia!r}")
+    return registros
+
+
+def cargar(ruta, hasta=None):
+    """
+    Instantánea guardada en 'ruta' con guardar() o por un Diario, tras
+    aplicar sus deltas (todos, o los 'hasta' primeros).
+    """
+    registros = leer_registros(ruta)
+    if not registros or not isinstance(registros[0], Instantanea):
+        raise ValueError(f"{ruta}: no empieza por una instantánea")
+    inst = registros[0]
+    for delta in registros[1:][:hasta]:
+        inst = delta.aplicar(inst)
+    return inst
@@ -0,0 +1,266 @@
+"""
+Simulación de partidas por lotes (Monte Carlo) en varios procesos.
+
+Para evaluar un diseño de laberinto se juegan miles de partidas sin consola
+y con reloj simulado, cada una con su semilla. El JSON se lee una sola vez en
+el proceso principal. Cada proceso del pool recibe el diccionario ya leído en
+su inicializador, así que no viaja con cada partida. Después, cada proceso
+construye sus partidas con Director.procesar_datos y las juega con el
+Planificador.
+
+Las partidas son independientes y solo devuelven un resumen pequeño, por
+eso el rendimiento escala casi linealmente con el número de núcleos.
+
+Políticas del personaje (actúa cada 'periodo_personaje' segundos simulados):
+- quieto:    se queda en su habitación y ataca.
+- aleatorio: ataca si hay bichos; si no, cruza una puerta abierta al azar.
+- cazador:   ataca si hay bichos; si no, va hacia el bicho vivo más cercano.
+
+Movimiento de los bichos (sin Juego.campo no se mueven):
+- persecucion: van hacia el personaje (caminos.activar_persecucion).
+- paseo:       cruzan una puerta abierta al azar (caminos.PaseoAleatorio),
+               con un generador propio sacado de la semilla.
+- quietos:     se quedan en su habitación y solo atacan a quien llega.
+
+Uso:
+    python lotes.py laberinto.json --semillas 0:1000 --politica cazador --movimiento paseo
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import time
+
+from caminos import (PaseoAleatorio, activar_persecucion, buscar_camino, desactivar_persecucion,
+                     distancias, vecinas)
+from eventos import SumideroNulo, bus
+from main import ORIENTACIONES, Bicho, Director
+from planificador import Planificador
+from reloj import RelojSimulado
+
+
+# =========================================
+# ==========  POLÍTICAS PERSONAJE  ========
+# =========================================
+def _hay_bichos(personaje):
+    return any(isinstance(e, Bicho) for e in personaje.posicion.ocupantes)
+
+
+def politica_quieto(juego, rng):
+    juego.person.atacar()
+
+
+def politica_aleatorio(juego, rng):
+    person = juego.person
+    if _hay_bichos(person):
+        person.atacar()
+        return
+    lados = [lado for lado, _ in vecinas(person.posicion)]
+    if lados:
+        person.caminar_hacia(ORIENTACIONES[rng.choice(lados)])
+
+
+def politica_cazador(juego, rng):
+    person = juego.person
+    if _hay_bichos(person):
+        person.atacar()
+        return
+    # Camino más corto hasta la habitación con bichos más cercana.
+    dist = distancias(person.posicion)
+    cercanas = [(dist[b.posicion], b.posicion.num) for b in juego.bichos
+                if b.esta_vivo() and b.posicion in dist]
+    if not cercanas:
+        return politica_aleatorio(juego, rng)
+    camino = buscar_camino(person.posicion, juego.obtener_habitacion(min(cercanas)[1]))
+    for lado, otra in vecinas(person.posicion):
+        if otra == camino[1]:
+            person.caminar_hacia(ORIENTACIONES[lado])
+            return
+
+
+POLITICAS = {
+    "quieto": politica_quieto,
+    "aleatorio": politica_aleatorio,
+    "cazador": politica_cazador,
+}
+
+MOVIMIENTOS = ("persecucion", "paseo", "quietos")
+
+
+# =========================================
+# ============  UNA PARTIDA  ==============
+# =========================================
+def jugar_partida(datos, semilla, politica="aleatorio", duracion=600.0,
+                  periodo_personaje=1.0, abrir_puertas=True, movimiento="persecucion"):
+    """
+    Construye y juega una partida del laberinto 'datos' con la semilla dada.
+    'movimiento' es uno de MOVIMIENTOS. Devuelve un dict con semilla,
+    ganador (None si se agotó 'duracion'), segundos simulados y muertes por
+    habitación.
+    """
+    # Todo el azar sale de la semilla: el personaje con 'rng' y el paseo de
+    # los bichos con otro generador, para que no se interfieran.
+    rng = random.Random(semilla)
+    actuar = POLITICAS[politica]
+
+    director = Director(compacto=True)
+    director.procesar_datos(datos)
+    juego = director.obtener_juego()
+    juego.reloj = RelojSimulado()
+    juego.agregar_personaje("Jugador")
+    if abrir_puertas:
+        juego.abrir_puertas()
+    if movimiento == "persecucion":
+        activar_persecucion(juego)
+    elif movimiento == "paseo":
+        juego.campo = PaseoAleatorio(random.Random(f"bichos-{semilla}"))
+
+    plan = Planificador(reloj=juego.reloj)
+    proximo = [periodo_personaje]
+
+    def al_tick(ahora):
+        if not juego.terminado and ahora >= proximo[0]:
+            proximo[0] = ahora + periodo_personaje
+            actuar(juego, rng)
+        if juego.terminado:
+            plan.detener()
+
+    plan.al_tick = al_tick
+    plan.agregar_juego(juego)
+    try:
+        if not juego.bichos:
+            juego.estan_todos_los_bichos_muertos()
+        else:
+            plan.ejecutar(duracion=duracion)
+    finally:
+        # El campo de distancias está suscrito al bus global.
+        desactivar_persecucion(juego)
+
+    return {
+        "semilla": semilla,
+        "ganador": juego.ganador,
+        "segundos": juego.instante_fin if juego.terminado else duracion,
+        "muertes": dict(juego.muertes_por_habitacion),
+    }
+
+
+# =========================================
+# ===========  POOL DE PROCESOS  ==========
+# =========================================
+_DATOS = None
+_OPCIONES = None
+
+
+def _iniciar_trabajador(datos, opciones):
+    # Una vez por proceso: el laberinto ya leído y las opciones comunes.
+    global _DATOS, _OPCIONES
+    _DATOS = datos
+    _OPCIONES = opciones
+    bus.configurar(sumideros=[SumideroNulo()])
+
+
+def _jugar(semilla):
+    return jugar_partida(_DATOS, semilla, **_OPCIONES)
+
+
+def resumir(resultados, segundos_reales=None):
+    """
+    Agrega los resultados de jugar_partida en las estadísticas del lote.
+    """
+    partidas = len(resultados)
+    ganadores = collections.Counter(r["ganador"] for r in resultados)
+    terminadas = [r["segundos"] for r in resultados if r["ganador"] is not None]
+    muertes = collections.Counter()
+    for r in resultados:
+        muertes.update(r["muertes"])
+    resumen = {
+        "partidas": partidas,
+        "victorias": ganadores["personaje"],
+        "derrotas": ganadores["bichos"],
+        "sin_terminar": ganadores[None],
+        "tasa_victoria": ganadores["personaje"] / partidas if partidas else 0.0,
+        "tiempo_medio_fin": sum(terminadas) / len(terminadas) if terminadas else None,
+        "muertes_por_habitacion": dict(sorted(muertes.items())),
+    }
+    if segundos_reales is not None:
+        resumen["segundos_reales"] = segundos_reales
+        resumen["partidas_por_segundo"] = partidas / segundos_reales if segundos_reales else 0.0
+    return resumen
+
+
+def simular_lote(laberinto, semillas, politica="aleatorio", procesos=None,
+                 duracion=600.0, periodo_personaje=1.0, abrir_puertas=True,
+                 movimiento="persecucion"):
+    """
+    Juega una partida por cada semilla de 'semillas' repartidas en 'procesos'
+    procesos (por defecto, uno por núcleo; con 1 se juega en este proceso).
+    'laberinto' es la ruta de un JSON o el diccionario ya leído.
+    Devuelve el resumen de resumir().
+    """
+    if politica not in POLITICAS:
+        raise ValueError(f"Política desconocida: {politica!r}")
+    if movimiento not in MOVIMIENTOS:
+        raise ValueError(f"Movimiento desconocido: {movimiento!r}")
+    if isinstance(laberinto, dict):
+        datos = laberinto
+    else:
+        with open(laberinto, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+    semillas = list(semillas)
+    opciones = {"politica": politica, "duracion": duracion,
+                "periodo_personaje": periodo_personaje, "abrir_puertas": abrir_puertas,
+                "movimiento": movimiento}
+    procesos = procesos or os.cpu_count() or 1
+
+    inicio = time.perf_counter()
+    if procesos == 1:
+        sumideros = bus.sumideros
+        _iniciar_trabajador(datos, opciones)
+        try:
+            resultados = [_jugar(s) for s in semillas]
+        finally:
+            bus.configurar(sumideros=sumideros)
+    else:
+        # Bloques grandes para que el reparto no domine con partidas cortas.
+        bloque = max(1, len(semillas) // (procesos * 8))
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=procesos, initializer=_iniciar_trabajador,
+                initargs=(datos, opciones)) as pool:
+            resultados = list(pool.map(_jugar, semillas, chunksize=bloque))
+    return resumir(resultados, time.perf_counter() - inicio)
+
+
+def _rango(texto):
+    # "0:1000" -> range(0, 1000); "50" -> range(50)
+    if ":" in texto:
+        desde, hasta = texto.split(":", 1)
+        return range(int(desde), int(hasta))
+    return range(int(texto))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partidas por lotes con reloj simulado.")
+    parser.add_argument("laberinto", help="archivo JSON del laberinto")
+    parser.add_argument("--semillas", type=_rango, default=range(100),
+                        help="rango de semillas 'desde:hasta' (por defecto 0:100)")
+    parser.add_argument("--politica", choices=sorted(POLITICAS), default="aleatorio")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--duracion", type=float, default=600.0,
+                        help="segundos simulados máximos por partida")
+    parser.add_argument("--periodo-personaje", type=float, default=1.0)
+    parser.add_argument("--cerradas", action="store_true",
+                        help="no abrir las puertas al empezar")
+    parser.add_argument("--movimiento", choices=MOVIMIENTOS, default="persecucion",
+                        help="cómo se mueven los bichos")
+    args = parser.parse_args(argv)
+
+    resumen = simular_lote(args.laberinto, args.semillas, args.politica, args.procesos,
+                           args.duracion, args.periodo_personaje, not args.cerradas,
+                           args.movimiento)
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
+import contextlib
+import gc
+import itertools
 import json
-import time
 import threading
+import time
 import random
+import tempfile
+from collections import Counter
+
+from eventos import TipoEvento, bus
+from flujo_json import iterar_secciones, rss_pico_kb
+from reloj import RELOJ_REAL, RelojReal
 
 # =========================================
 # ===============  ENTES  =================
@@ -11,12 +20,52 @@ class Ente:
     Equivale a la clase 'Ente' en Smalltalk.
     Bicho y Personaje heredan de aquí.
     """
+    __slots__ = ('vidas', 'poder', '_posicion', 'juego')
+
     def __init__(self):
         self.vidas = 5
         self.poder = 1
-        self.posicion = None
+        self._posicion = None
         self.juego = None  # referencia al Juego
 
+    @property
+    def posicion(self):
+        return self._posicion
+
+    @posicion.setter
+    def posicion(self, hab):
+        # Mantiene el índice de ocupantes de cada habitación.
+        anterior = self._posicion
+        if anterior is hab:
+            return
+        if anterior is not None:
+            desalojar = getattr(anterior, 'desalojar', None)
+            if desalojar is not None:
+                desalojar(self)
+        self._posicion = hab
+        if hab is not None and self.esta_vivo():
+            alojar = getattr(hab, 'alojar', None)
+            if alojar is not None:
+                alojar(self)
+
+    def desalojar(self):
+        """
+        Saca al ente del índice de ocupantes de su habitación (al morir).
+        Conserva 'posicion' para saber dónde cayó.
+        """
+        desalojar = getattr(self._posicion, 'desalojar', None)
+        if desalojar is not None:
+            desalojar(self)
+
+    def colocar(self, hab):
+        """
+        Pone al ente en 'hab' sin entrar (sin eventos), al final de sus
+        ocupantes. Lo usan las instantáneas al restaurar posiciones.
+        """
+        self.desalojar()
+        self._posicion = None
+        self.posicion = hab
+
     def esta_vivo(self):
         return self.vidas > 0
 
@@ -25,9 +74,11 @@ class Ente:
         Smalltalk: esAtacadoPor:
         Resta vidas y, si llega a 0, llama a he_muerto().
         """
-        print(f"{self} es atacado por {atacante}")
+        bus.emitir(TipoEvento.ATAQUE, "{victima} es atacado por {atacante}",
+                   victima=self, atacante=atacante)
         self.vidas -= atacante.poder
-        print(f"Vidas de {self}: {self.vidas}")
+        bus.emitir(TipoEvento.VIDAS, "Vidas de {ente}: {vidas}",
+                   ente=self, vidas=self.vidas)
         if self.vidas <= 0:
             self.he_muerto()
 
@@ -46,6 +97,8 @@ class Bicho(Ente):
     """
     Equivale a Bicho en Smalltalk. Tiene un 'modo' (Agresivo/Perezoso).
     """
+    __slots__ = ('modo',)
+
     def __init__(self):
         super().__init__()
         self.modo = None  # Agresivo o Perezoso
@@ -55,7 +108,8 @@ class Bicho(Ente):
         if self.juego:
             self.juego.terminar_bicho(self)
         else:
-            print("Bicho muere sin 'juego' asignado.")
+            bus.emitir(TipoEvento.INCIDENCIA, "Bicho muere sin 'juego' asignado.",
+                       ente=self)
 
     def actua(self):
         """
@@ -67,10 +121,23 @@ class Bicho(Ente):
     def ini_agresivo(self):
         self.modo = Agresivo()
         self.poder = 10
+        if self.juego:
+            self.juego.cambio_de_modo(self)
 
     def ini_perezoso(self):
         self.modo = Perezoso()
         self.poder = 1
+        if self.juego:
+            self.juego.cambio_de_modo(self)
+
+    def nombre_modo(self):
+        if self.modo:
+            if self.modo.es_agresivo():
+                return "Agresivo"
+            if self.modo.es_perezoso():
+                return "Perezoso"
+            return "Desconocido"
+        return "SinModo"
 
     def atacar(self):
         """
@@ -82,28 +149,26 @@ class Bicho(Ente):
     def obtener_orientacion(self):
         """
         Equivale a 'posicion obtenerOrientacion' en Smalltalk.
+        Si el juego tiene un campo de distancias (ver caminos.py), el bicho
+        va hacia su objetivo.
         """
+        campo = self.juego.campo if self.juego else None
+        if campo is not None:
+            return campo.orientacion_hacia_objetivo(self.posicion)
         if self.posicion and hasattr(self.posicion, 'obtener_orientacion'):
             return self.posicion.obtener_orientacion()
         return None
 
     def __str__(self):
-        if self.modo:
-            if self.modo.es_agresivo():
-                modo_str = "Agresivo"
-            elif self.modo.es_perezoso():
-                modo_str = "Perezoso"
-            else:
-                modo_str = "Desconocido"
-        else:
-            modo_str = "SinModo"
-        return f"Bicho({modo_str}, vidas={self.vidas})"
+        return f"Bicho({self.nombre_modo()}, vidas={self.vidas})"
 
 
 class Personaje(Ente):
     """
     Equivale a la clase Personaje en Smalltalk.
     """
+    __slots__ = ('nombre',)
+
     def __init__(self, nombre):
         super().__init__()
         self.nombre = nombre
@@ -115,12 +180,19 @@ class Personaje(Ente):
         if self.juego:
             self.juego.buscar_bichos(self)
 
+    def caminar_hacia(self, orientacion):
+        """
+        Smalltalk: orientacion caminar: self
+        """
+        orientacion.caminar(self)
+
     def he_muerto(self):
         # Smalltalk: juego muerePersonaje
         if self.juego:
             self.juego.muere_personaje()
         else:
-            print("Personaje muere sin 'juego' asignado.")
+            bus.emitir(TipoEvento.INCIDENCIA, "Personaje muere sin 'juego' asignado.",
+                       ente=self)
 
     def __str__(self):
         return f"Personaje({self.nombre}, vidas={self.vidas})"
@@ -134,8 +206,21 @@ class Modo:
     Interfaz para Agresivo / Perezoso.
     En Smalltalk: la template: actua => dormir, caminar, atacar
     """
+    __slots__ = ('reloj',)
+    periodo = 0  # segundos que duerme antes de cada actuación
+
+    def __init__(self, reloj=None):
+        self.reloj = reloj  # si es None se usa el reloj del juego del bicho
+
     def actua(self, bicho):
         self.dormir(bicho)
+        self.despertar(bicho)
+
+    def despertar(self, bicho):
+        """
+        Lo que hace el bicho tras dormir: caminar y atacar.
+        El Planificador lo llama directamente en vez de bloquear en dormir().
+        """
         self.caminar(bicho)
         self.atacar(bicho)
 
@@ -148,6 +233,13 @@ class Modo:
     def dormir(self, bicho):
         raise NotImplementedError("Subclase debe implementarlo")
 
+    def obtener_reloj(self, bicho):
+        if self.reloj is not None:
+            return self.reloj
+        if bicho.juego is not None:
+            return bicho.juego.reloj
+        return RELOJ_REAL
+
     def es_agresivo(self):
         return False
 
@@ -156,6 +248,9 @@ class Modo:
 
 
 class Agresivo(Modo):
+    __slots__ = ()
+    periodo = 1
+
     def es_agresivo(self):
         return True
 
@@ -165,11 +260,15 @@ class Agresivo(Modo):
             orientacion.caminar(bicho)
 
     def dormir(self, bicho):
-        print(f"{bicho} duerme (Agresivo) 1 segundo")
-        time.sleep(1)
+        bus.emitir(TipoEvento.DORMIR, "{bicho} duerme (Agresivo) 1 segundo",
+                   bicho=bicho, segundos=self.periodo)
+        self.obtener_reloj(bicho).dormir(self.periodo)
 
 
 class Perezoso(Modo):
+    __slots__ = ()
+    periodo = 3
+
     def es_perezoso(self):
         return True
 
@@ -179,8 +278,9 @@ class Perezoso(Modo):
             orientacion.caminar(bicho)
 
     def dormir(self, bicho):
-        print(f"{bicho} duerme (Perezoso) 3 segundos")
-        time.sleep(3)
+        bus.emitir(TipoEvento.DORMIR, "{bicho} duerme (Perezoso) 3 segundos",
+                   bicho=bicho, segundos=self.periodo)
+        self.obtener_reloj(bicho).dormir(self.periodo)
 
 
 # =========================================
@@ -189,7 +289,11 @@ class Perezoso(Modo):
 class ElementoMapa:
     """
     Equivale a 'ElementoMapa' en Smalltalk (puede ser Pared, Puerta, etc.)
+    Los elementos usan __slots__: un laberinto grande tiene millones de ellos
+    y así no llevan un __dict__ cada uno.
     """
+    __slots__ = ()
+
     def es_habitacion(self):
         return False
 
@@ -199,18 +303,74 @@ class ElementoMapa:
     def es_pared(self):
         return False
 
+    def es_bomba(self):
+        return False
+
     def entrar(self, alguien):
         raise NotImplementedError("Subclase debe implementarlo")
 
-    def recorrer(self, funcion):
-        # Por defecto, solo se aplica la función a uno mismo.
-        funcion(self)
+    def partes(self):
+        """
+        Elementos que cuelgan directamente de este (lados, hijos, decorado).
+        """
+        return ()
+
+    def raices_recorrido(self):
+        # Por dónde empieza un recorrido: uno mismo (Laberinto: sus habitaciones).
+        return (self,)
+
+    def elementos(self, tipo=None, filtro=None):
+        """
+        Generador con cada elemento alcanzable una sola vez, en preorden.
+        'tipo' (clase o tupla de clases) y 'filtro' (predicado) eligen cuáles
+        se entregan, pero el recorrido sigue pasando por todos.
+        """
+        return recorrer_elementos(self.raices_recorrido(), tipo, filtro)
+
+    def recorrer(self, funcion, tipo=None, filtro=None):
+        """
+        Llama a funcion(e) con cada elemento de elementos(tipo, filtro). Si
+        la función devuelve DETENER, el recorrido acaba y se devuelve ese
+        elemento; si no, devuelve None.
+        """
+        for elemento in self.elementos(tipo, filtro):
+            if funcion(elemento) is DETENER:
+                return elemento
+        return None
+
+
+# Valor que una función de recorrer() devuelve para acabar el recorrido.
+DETENER = object()
+
+
+def recorrer_elementos(raices, tipo=None, filtro=None):
+    """
+    Recorrido en profundidad con pila explícita (sin recursión, así que no
+    importa la profundidad del mapa). Cada elemento se visita una vez: una
+    puerta compartida o la PARED_COMPARTIDA no se repiten.
+    """
+    visitados = set()
+    for raiz in raices:  # las raíces se piden de una en una (pueden ser vistas)
+        pila = [raiz]
+        while pila:
+            elemento = pila.pop()
+            if elemento in visitados:
+                continue
+            visitados.add(elemento)
+            if ((tipo is None or isinstance(elemento, tipo))
+                    and (filtro is None or filtro(elemento))):
+                yield elemento
+            partes = elemento.partes()
+            if partes:
+                pila.extend(reversed(partes))
 
 
 # =========================================
 # ===========  DECORADORES  ===============
 # =========================================
 class Decorador(ElementoMapa):
+    __slots__ = ('em',)
+
     def __init__(self, em):
         super().__init__()
         self.em = em
@@ -218,56 +378,78 @@ class Decorador(ElementoMapa):
     def entrar(self, alguien):
         self.em.entrar(alguien)
 
+    def partes(self):
+        return () if self.em is None else (self.em,)
+
 
 class Bomba(Decorador):
     """
     Equivale a la clase Bomba en Smalltalk (un decorador).
     """
+    __slots__ = ('activa',)
+
     def __init__(self, em):
         super().__init__(em)
         self.activa = False
 
     def entrar(self, alguien):
         if self.activa:
-            print(f"{alguien} Te has chocado con una bomba (activa).")
+            bus.emitir(TipoEvento.CHOQUE, "{ente} Te has chocado con una bomba (activa).",
+                       ente=alguien, elemento=self)
             # Podríamos restar vidas, etc.
         else:
             self.em.entrar(alguien)
 
-    def esBomba(self):
+    def es_bomba(self):
         return True
 
+    esBomba = es_bomba  # nombre de Smalltalk
+
     def __str__(self):
         return f"Bomba(activa={self.activa})"
 
 
 class Pared(ElementoMapa):
+    __slots__ = ()
+
     def es_pared(self):
         return True
 
     def entrar(self, alguien):
-        print(f"{alguien} ha chocado con una pared")
+        bus.emitir(TipoEvento.CHOQUE, "{ente} ha chocado con una pared",
+                   ente=alguien, elemento=self)
+
+
+# Flyweight: una Pared no tiene estado, así que todas pueden ser la misma.
+PARED_COMPARTIDA = Pared()
 
 
 class ParedBomba(Pared):
     """
     Subclase de Pared que tiene 'activa'.
+    Tiene estado propio, así que nunca se comparte como PARED_COMPARTIDA.
     """
+    __slots__ = ('activa',)
+
     def __init__(self):
         super().__init__()
         self.activa = False
 
     def entrar(self, alguien):
         if self.activa:
-            print(f"{alguien} ha chocado con una ParedBomba (activa)")
+            bus.emitir(TipoEvento.CHOQUE, "{ente} ha chocado con una ParedBomba (activa)",
+                       ente=alguien, elemento=self)
         else:
-            print(f"{alguien} ha chocado con una ParedBomba (inactiva)")
+            bus.emitir(TipoEvento.CHOQUE, "{ente} ha chocado con una ParedBomba (inactiva)",
+                       ente=alguien, elemento=self)
 
 
 class Puerta(ElementoMapa):
     """
     Equivale a Puerta en Smalltalk, con .abierta, .lado1, .lado2
     """
+    __slots__ = ('abierta', 'lado1', 'lado2')
+
     def __init__(self, lado1, lado2):
         super().__init__()
         self.abierta = False
@@ -280,25 +462,37 @@ class Puerta(ElementoMapa):
     def abrir(self):
         self.abierta = True
         if hasattr(self.lado1, 'num') and hasattr(self.lado2, 'num'):
-            print(f"Puerta {self.lado1.num}-{self.lado2.num} ABIERTA")
+            bus.emitir(TipoEvento.PUERTA, "Puerta {num1}-{num2} ABIERTA", puerta=self,
+                       num1=self.lado1.num, num2=self.lado2.num, abierta=True)
         else:
-            print("Puerta ABIERTA (no num)")
+            bus.emitir(TipoEvento.PUERTA, "Puerta ABIERTA (no num)", puerta=self, abierta=True)
 
     def cerrar(self):
         self.abierta = False
         if hasattr(self.lado1, 'num') and hasattr(self.lado2, 'num'):
-            print(f"Puerta {self.lado1.num}-{self.lado2.num} CERRADA")
+            bus.emitir(TipoEvento.PUERTA, "Puerta {num1}-{num2} CERRADA", puerta=self,
+                       num1=self.lado1.num, num2=self.lado2.num, abierta=False)
         else:
-            print("Puerta CERRADA (no num)")
+            bus.emitir(TipoEvento.PUERTA, "Puerta CERRADA (no num)", puerta=self, abierta=False)
 
     def entrar(self, alguien):
         if self.abierta:
-            if alguien and alguien.posicion == self.lado1:
-                self.lado2.entrar(alguien)
+            juego = getattr(alguien, 'juego', None)
+            if juego is None or juego.cerrojos is None:
+                self._cruzar(alguien)
             else:
-                self.lado1.entrar(alguien)
+                # Modo concurrente: origen y destino bloqueados a la vez.
+                with juego.cerrojos.bloquear(self.lado1, self.lado2):
+                    self._cruzar(alguien)
         else:
-            print("La puerta está cerrada")
+            bus.emitir(TipoEvento.CHOQUE, "La puerta está cerrada",
+                       ente=alguien, elemento=self)
+
+    def _cruzar(self, alguien):
+        if alguien and alguien.posicion == self.lado1:
+            self.lado2.entrar(alguien)
+        else:
+            self.lado1.entrar(alguien)
 
 
 # =========================================
@@ -308,31 +502,64 @@ class Habitacion(ElementoMapa):
     """
     Equivale a Habitacion en Smalltalk.
     """
+    __slots__ = ('num', 'norte', 'sur', 'este', 'oeste', 'ocupantes', 'hijos', 'laberinto')
+
     def __init__(self, num):
         super().__init__()
         self.num = num
+        # Laberinto que la contiene (lo pone Laberinto.agregar_habitacion);
+        # conectar() registra ahí las puertas nuevas.
+        self.laberinto = None
         self.norte = None
         self.sur = None
         self.este = None
         self.oeste = None
+        # Entes vivos que están en la habitación. Es un dict usado como
+        # conjunto ordenado para que los ataques sigan el orden de llegada.
+        self.ocupantes = {}
+        # Smalltalk: Contenedor>>hijos (armarios, bombas...). Tupla vacía
+        # compartida hasta que se agrega el primero.
+        self.hijos = ()
 
     def es_habitacion(self):
         return True
 
+    def alojar(self, ente):
+        """
+        Añade 'ente' al final de los ocupantes (lo usa Ente.posicion).
+        """
+        self.ocupantes[ente] = None
+
+    def desalojar(self, ente):
+        """
+        Quita 'ente' de los ocupantes, si está.
+        """
+        self.ocupantes.pop(ente, None)
+
     def entrar(self, alguien):
-        print(f"{alguien} está en Hab{self.num}")
+        bus.emitir(TipoEvento.MOVIMIENTO, "{ente} está en Hab{num}",
+                   ente=alguien, habitacion=self, num=self.num)
         if alguien:
             alguien.posicion = self
 
     def conectar(self, direccion, elemento):
         # Por ejemplo: direccion="norte", elemento=Puerta u otra
         setattr(self, direccion, elemento)
-
-    def recorrer(self, funcion):
-        funcion(self)
-        for lado in (self.norte, self.sur, self.este, self.oeste):
-            if lado is not None:
-                lado.recorrer(funcion)
+        if self.laberinto is not None and elemento is not None and elemento.es_puerta():
+            self.laberinto.registrar_puerta(elemento)
+
+    def agregar_hijo(self, elemento):
+        # Smalltalk: agregarHijo:
+        if not self.hijos:
+            self.hijos = []
+        self.hijos.append(elemento)
+
+    def partes(self):
+        lados = [lado for lado in (self.norte, self.sur, self.este, self.oeste)
+                 if lado is not None]
+        if self.hijos:
+            lados.extend(self.hijos)
+        return lados
 
     def __str__(self):
         return f"Hab{self.num}"
@@ -342,11 +569,14 @@ class Armario(Habitacion):
     """
     Equivale a 'Armario' en Smalltalk (subclase de Contenedor).
     """
+    __slots__ = ()
+
     def __init__(self, num):
         super().__init__(num)
 
     def entrar(self, alguien):
-        print(f"{alguien} se esconde en el armario Hab{self.num}")
+        bus.emitir(TipoEvento.MOVIMIENTO, "{ente} se esconde en el armario Hab{num}",
+                   ente=alguien, habitacion=self, num=self.num)
         if alguien:
             alguien.posicion = self
 
@@ -358,25 +588,170 @@ class Laberinto(ElementoMapa):
     def __init__(self):
         super().__init__()
         self.habitaciones = []
+        # Índice num -> Habitacion para que obtener_habitacion sea O(1).
+        # Si hay números repetidos gana la primera, como en la búsqueda lineal;
+        # las demás esperan en _repetidas (num -> lista en orden de llegada)
+        # para ocupar su lugar si se quita o renumera, sin recorrer el mapa.
+        self._indice = {}
+        self._repetidas = {}
+        # Contenedor de cada habitación anidada (armario) indexada con
+        # indexar_habitacion, para poder sacarla de sus hijos.
+        self._contenedores = {}
+        # Registro de puertas únicas (dict usado como conjunto ordenado), para
+        # abrir/cerrar sin recorrer todo el mapa ni pasar dos veces por cada una.
+        self.puertas = {}
 
     def agregar_habitacion(self, hab):
         self.habitaciones.append(hab)
+        self._indexar(hab)
+        self._adoptar(hab)
+
+    def _indexar(self, hab):
+        if self._indice.setdefault(hab.num, hab) is not hab:
+            self._repetidas.setdefault(hab.num, []).append(hab)
+
+    def _desindexar(self, hab):
+        # Quita 'hab' del índice; si otra compartía su número, pasa a ser la indexada.
+        num = hab.num
+        repetidas = self._repetidas.get(num)
+        if self._indice.get(num) is hab:
+            if repetidas:
+                self._indice[num] = repetidas.pop(0)
+            else:
+                del self._indice[num]
+        elif repetidas and hab in repetidas:
+            repetidas.remove(hab)
+        if repetidas is not None and not repetidas:
+            del self._repetidas[num]
+
+    def _adoptar(self, hab):
+        # Enlaza la habitación con el laberinto y registra las puertas que ya tenga.
+        hab.laberinto = self
+        for lado in (hab.norte, hab.sur, hab.este, hab.oeste):
+            if lado is not None and lado.es_puerta():
+                self.puertas[lado] = None
 
     def obtener_habitacion(self, num):
-        for h in self.habitaciones:
-            if h.num == num:
+        return self._indice.get(num)
+
+    def agregar_habitaciones(self, habs, nuevas=False):
+        """
+        Agrega varias habitaciones de una vez. nuevas=True indica que están
+        recién fabricadas y aún no tienen puertas que registrar.
+        """
+        self.habitaciones.extend(habs)
+        indice = self._indice
+        repetidas = self._repetidas
+        for hab in habs:
+            if indice.setdefault(hab.num, hab) is not hab:
+                repetidas.setdefault(hab.num, []).append(hab)
+            if nuevas:
+                hab.laberinto = self
+            else:
+                self._adoptar(hab)
+
+    def buscador(self):
+        """
+        Función num -> habitación (o None) para búsquedas dentro de un bucle.
+        """
+        return self._indice.get
+
+    def indexar_habitacion(self, hab, contenedor=None):
+        """
+        Indexa una habitación anidada (p. ej. un Armario dentro de otra
+        habitación) sin añadirla a la lista de primer nivel. Con 'contenedor'
+        eliminar_habitacion la saca de sus hijos sin buscarlo.
+        """
+        self._indexar(hab)
+        if contenedor is not None:
+            self._contenedores[hab] = contenedor
+        self._adoptar(hab)
+
+    def eliminar_habitacion(self, num):
+        """
+        Quita la habitación 'num' del laberinto (con lo que tenga anidado) y
+        la devuelve, o None si no existe. Si es de primer nivel cuesta
+        O(habitaciones de primer nivel) por la lista; si es anidada y se
+        indexó sin contenedor, hay que buscarlo recorriendo el mapa.
+        """
+        hab = self._indice.get(num)
+        if hab is None:
+            return None
+        # Primero se saca de donde esté y después se toca el índice.
+        contenedor = self._contenedores.pop(hab, None)
+        if contenedor is None:
+            try:
+                self.habitaciones.remove(hab)
+            except ValueError:
+                contenedor = self._buscar_contenedor(hab)
+        if contenedor is not None:
+            contenedor.hijos.remove(hab)
+        for h in recorrer_elementos((hab,), Habitacion):
+            self._desindexar(h)
+            self._contenedores.pop(h, None)
+            for lado in (h.norte, h.sur, h.este, h.oeste):
+                self.puertas.pop(lado, None)
+            h.laberinto = None
+        return hab
+
+    def _buscar_contenedor(self, hab):
+        for h in self.elementos(tipo=Habitacion):
+            if hab in h.hijos:
                 return h
         return None
 
+    def renumerar_habitacion(self, num, nuevo_num):
+        """
+        Cambia el número de una habitación manteniendo el índice coherente.
+        """
+        hab = self._indice.get(num)
+        if hab is None or nuevo_num == num:
+            return hab
+        if self._indice.get(nuevo_num, hab) is not hab:
+            raise ValueError(f"Ya existe la habitación {nuevo_num}")
+        self._desindexar(hab)
+        hab.num = nuevo_num
+        self._indexar(hab)
+        return hab
+
     def entrar(self, alguien):
         # Equivalente a la lógica de: obtenerHabitacion(1).entrar(alguien)
         hab1 = self.obtener_habitacion(1)
         if hab1:
             hab1.entrar(alguien)
 
-    def recorrer(self, funcion):
-        for h in self.habitaciones:
-            h.recorrer(funcion)
+    def raices_recorrido(self):
+        return self.habitaciones
+
+    # -- Puertas --
+    def registrar_puerta(self, puerta):
+        self.puertas[puerta] = None
+
+    def puertas_de(self, habitaciones=None):
+        """
+        Lista de puertas distintas de 'habitaciones' (objetos o números), o
+        todas las registradas si es None. Cuesta O(puertas devueltas).
+        """
+        if habitaciones is None:
+            return list(self.puertas)
+        vistas = {}
+        for hab in habitaciones:
+            if not isinstance(hab, Habitacion):
+                hab = self.obtener_habitacion(hab)
+                if hab is None:
+                    continue
+            for lado in (hab.norte, hab.sur, hab.este, hab.oeste):
+                if lado is not None and lado.es_puerta():
+                    vistas[lado] = None
+        return list(vistas)
+
+    def abrir_puertas(self, habitaciones=None):
+        for puerta in self.puertas_de(habitaciones):
+            puerta.abrir()
+
+    def cerrar_puertas(self, habitaciones=None):
+        for puerta in self.puertas_de(habitaciones):
+            puerta.cerrar()
 
     def __str__(self):
         return "Laberinto"
@@ -463,6 +838,15 @@ class Sur(Orientacion):
             contenedor.sur.recorrer(funcion)
 
 
+# Una instancia de cada orientación, por nombre de lado.
+ORIENTACIONES = {"norte": Norte(), "sur": Sur(), "este": Este(), "oeste": Oeste()}
+
+# Nombre de orientación tal como viene en el JSON ("Sur", "sur", "SUR"...) ->
+# atributo del lado en Habitacion. Evita un lower() por puerta.
+LADOS_POR_NOMBRE = {variante: lado for lado in ORIENTACIONES
+                    for variante in (lado, lado.capitalize(), lado.upper())}
+
+
 # =========================================
 # ==============  FACTORY  ================
 # =========================================
@@ -470,6 +854,10 @@ class Creator:
     """
     Equivale a la clase 'Creator' en Smalltalk (factory normal).
     """
+    def __init__(self, compacto=False):
+        # compacto=True: todas las Pared sin estado son PARED_COMPARTIDA.
+        self.compacto = compacto
+
     def fabricar_habitacion(self, num):
         hab = Habitacion(num)
         # Añadimos paredes por defecto:
@@ -479,6 +867,14 @@ class Creator:
         hab.oeste = self.fabricar_pared()
         return hab
 
+    def fabricar_armario(self, num):
+        arm = Armario(num)
+        arm.norte = self.fabricar_pared()
+        arm.sur   = self.fabricar_pared()
+        arm.este  = self.fabricar_pared()
+        arm.oeste = self.fabricar_pared()
+        return arm
+
     def fabricar_juego(self):
         return Juego()
 
@@ -486,10 +882,19 @@ class Creator:
         return Laberinto()
 
     def fabricar_pared(self):
+        if self.compacto:
+            return PARED_COMPARTIDA
         return Pared()
 
     def fabricar_puerta(self, lado1, lado2):
-        return Puerta(lado1, lado2)
+        puerta = Puerta(lado1, lado2)
+        # Si las habitaciones ya están en un laberinto, la puerta queda registrada.
+        for lado in (lado1, lado2):
+            laberinto = getattr(lado, 'laberinto', None)
+            if laberinto is not None:
+                laberinto.registrar_puerta(puerta)
+                break
+        return puerta
 
     def fabricar_bomba(self):
         # En Smalltalk se hacía 'Bomba new', que es un decorador.
@@ -518,6 +923,82 @@ class CreatorB(Creator):
         return ParedBomba()
 
 
+# =========================================
+# ============   CERROJOS   ===============
+# =========================================
+# Contexto que no hace nada (se puede reutilizar), para el modo sin cerrojos.
+_SIN_CERROJO = contextlib.nullcontext()
+
+
+class CerrojosHabitacion:
+    """
+    Un RLock por habitación, creado la primera vez que se pide. Varias
+    habitaciones se bloquean siempre en el mismo orden (num y, si se repite,
+    el cerrojo), así que dos hilos nunca se esperan el uno al otro en círculo.
+    Lo que necesite otras habitaciones mientras un hilo ya tiene alguna
+    bloqueada se aplaza con al_soltar() hasta que las suelte todas.
+    """
+    def __init__(self):
+        self._cerrojos = {}
+        self._alta = threading.Lock()
+        # Por hilo: cuántos bloquear() anidados tiene y qué hacer al soltar.
+        self._local = threading.local()
+
+    def de(self, hab):
+        cerrojo = self._cerrojos.get(hab)
+        if cerrojo is None:
+            with self._alta:
+                cerrojo = self._cerrojos.get(hab)
+                if cerrojo is None:
+                    cerrojo = self._cerrojos[hab] = threading.RLock()
+        return cerrojo
+
+    def __len__(self):
+        return len(self._cerrojos)
+
+    def retenidos(self):
+        """
+        True si este hilo tiene alguna habitación bloqueada.
+        """
+        return getattr(self._local, "profundidad", 0) > 0
+
+    def al_soltar(self, accion):
+        """
+        Llama a accion() cuando este hilo suelte su última habitación (ya,
+        si no tiene ninguna).
+        """
+        if self.retenidos():
+            self._local.pendientes.append(accion)
+        else:
+            accion()
+
+    @contextlib.contextmanager
+    def bloquear(self, *habitaciones):
+        distintos = {}
+        for hab in habitaciones:
+            if hab is not None:
+                cerrojo = self.de(hab)
+                distintos[id(cerrojo)] = (hab.num, id(cerrojo), cerrojo)
+        orden = [c for _, _, c in sorted(distintos.values())]
+        local = self._local
+        if not getattr(local, "profundidad", 0):
+            local.profundidad = 0
+            local.pendientes = []
+        for cerrojo in orden:
+            cerrojo.acquire()
+        local.profundidad += 1
+        try:
+            yield
+        finally:
+            for cerrojo in reversed(orden):
+                cerrojo.release()
+            local.profundidad -= 1
+            if not local.profundidad and local.pendientes:
+                pendientes, local.pendientes = local.pendientes, []
+                for accion in pendientes:
+                    accion()
+
+
 # =========================================
 # ==============   JUEGO  =================
 # =========================================
@@ -526,11 +1007,36 @@ class Juego:
     Equivale a la clase 'Juego' en Smalltalk.
     Contiene un Laberinto, lista de bichos, hilos, personaje, etc.
     """
-    def __init__(self):
+    pausa_bicho = 0.2  # segundos entre dos actuaciones seguidas de un bicho
+
+    def __init__(self, reloj=None):
         self.laberinto = Laberinto()
         self.bichos = []
         self.hilos = {}
         self.person = None
+        # Bichos vivos -> nombre de su modo, y cuántos hay de cada modo.
+        # Así el fin de partida y las estadísticas no recorren self.bichos.
+        self._vivos = {}
+        self.vivos_por_modo = Counter()
+        # Campo de distancias compartido por los bichos que persiguen al
+        # personaje (caminos.activar_persecucion); None = no persiguen.
+        self.campo = None
+        # Resultado de la partida: None mientras se juega, luego "personaje"
+        # o "bichos", con el instante (del reloj) en que terminó.
+        self.ganador = None
+        self.instante_fin = None
+        # Muertes en combate por número de habitación (no cuenta la limpieza
+        # de bichos al terminar la partida).
+        self.muertes_por_habitacion = Counter()
+        # RelojReal por defecto; con un RelojSimulado la partida avanza al instante.
+        self.reloj = reloj if reloj is not None else RelojReal()
+        # Modo concurrente (activar_cerrojos): un cerrojo por habitación y
+        # otro para los contadores del juego. Sin activar no cuestan nada.
+        self.cerrojos = None
+        self._cerrojo = _SIN_CERROJO
+        # Combate por lotes (combate.activar_combate): los ataques se
+        # resuelven juntos al final de cada tick; None = uno a uno.
+        self.combate = None
 
     # -- Personaje --
     def agregar_personaje(self, nombre):
@@ -540,45 +1046,180 @@ class Juego:
         self.laberinto.entrar(p)
 
     def muere_personaje(self):
-        print("Fin del juego: ganan los bichos")
+        if self.person:
+            self._contar_muerte(self.person)
+        self._terminar("bichos")
+        bus.emitir(TipoEvento.FIN_JUEGO, "Fin del juego: ganan los bichos",
+                   juego=self, ganador="bichos")
+        if self.person:
+            # Muere en su habitación (ya bloqueada si viene de buscar_personaje).
+            with self.bloquear(self.person.posicion):
+                self.person.desalojar()
         self.terminar_bichos()
 
     def buscar_bichos(self, personaje):
-        # Smalltalk: bichos do: ...
-        for b in self.bichos:
-            if b.posicion == personaje.posicion:
-                b.es_atacado_por(personaje)
+        # Smalltalk: bichos do: ... (solo los que están en su habitación)
+        hab = personaje.posicion
+        if hab is None:
+            return
+        if self.combate is not None and self.combate.diferible():
+            self.combate.atacar_habitacion(personaje, hab)
+            return
+        with self.bloquear(hab):
+            if personaje.posicion != hab:
+                return  # se ha movido mientras esperaba el cerrojo
+            for b in list(hab.ocupantes):
+                if b is not personaje and b.juego is self and isinstance(b, Bicho):
+                    b.es_atacado_por(personaje)
 
     def buscar_personaje(self, bicho):
-        if self.person and bicho.posicion == self.person.posicion:
-            self.person.es_atacado_por(bicho)
+        hab = bicho.posicion
+        if self.person is None or hab is None:
+            return
+        if self.combate is not None and self.combate.diferible():
+            if self.person in hab.ocupantes:
+                self.combate.atacar_personaje(bicho)
+            return
+        with self.bloquear(hab):
+            if bicho.posicion == hab and self.person in hab.ocupantes:
+                self.person.es_atacado_por(bicho)
 
     def estan_todos_los_bichos_muertos(self):
-        for b in self.bichos:
-            if b.esta_vivo():
-                return  # alguno sigue vivo
+        if self._vivos:
+            return  # alguno sigue vivo
         # ninguno vivo:
         if self.person and self.person.esta_vivo():
             self.gana_personaje()
 
     def gana_personaje(self):
-        print("Fin juego: gana el personaje")
+        self._terminar("personaje")
+        bus.emitir(TipoEvento.FIN_JUEGO, "Fin juego: gana el personaje",
+                   juego=self, ganador="personaje")
+
+    # -- Fin de partida --
+    @property
+    def terminado(self):
+        return self.ganador is not None
+
+    def _terminar(self, ganador):
+        with self._cerrojo:
+            if self.ganador is None:
+                self.ganador = ganador
+                self.instante_fin = self.reloj.ahora()
+
+    def _contar_muerte(self, ente):
+        hab = ente.posicion
+        if hab is not None:
+            with self._cerrojo:
+                self.muertes_por_habitacion[hab.num] += 1
 
     # -- Bichos --
     def agregar_bicho(self, bicho):
-        self.bichos.append(bicho)
-        bicho.juego = self
+        with self._cerrojo:
+            self.bichos.append(bicho)
+            bicho.juego = self
+            if bicho.esta_vivo():
+                self._contar_vivo(bicho)
 
     def eliminar_bicho(self, bicho):
-        try:
-            self.bichos.remove(bicho)
-        except ValueError:
-            print("No existe ese bicho")
+        with self._cerrojo:
+            try:
+                self.bichos.remove(bicho)
+            except ValueError:
+                bus.emitir(TipoEvento.INCIDENCIA, "No existe ese bicho", bicho=bicho)
+            else:
+                self._descontar_vivo(bicho)
 
     def terminar_bicho(self, bicho):
-        bicho.vidas = 0
-        print(f"{bicho} muere")
-        self.estan_todos_los_bichos_muertos()
+        # En modo concurrente, el cerrojo de su habitación (sus ocupantes)
+        # antes que el del juego. Si se ha movido mientras esperaba, se
+        # vuelve a intentar con la nueva.
+        while True:
+            hab = bicho.posicion
+            with self.bloquear(hab):
+                if bicho.posicion is not hab:
+                    continue
+                with self._cerrojo:
+                    if self.ganador is None:
+                        self._contar_muerte(bicho)
+                    # vidas = 0 antes de desalojar: si otro hilo lo está moviendo,
+                    # el movimiento ya no lo añade a la habitación de destino.
+                    bicho.vidas = 0
+                    bicho.desalojar()
+                    self._descontar_vivo(bicho)
+                    bus.emitir(TipoEvento.MUERTE, "{bicho} muere", bicho=bicho)
+                    self.estan_todos_los_bichos_muertos()
+                return
+
+    def terminar_bichos_en_lote(self, bichos):
+        """
+        Como terminar_bicho con cada uno de 'bichos', pero comprobando el fin
+        de la partida una sola vez al final (ver combate.py).
+        """
+        with self._cerrojo:
+            emitir = bus.habilitado(TipoEvento.MUERTE)
+            for bicho in bichos:
+                if self.ganador is None:
+                    self._contar_muerte(bicho)
+                bicho.vidas = 0
+                bicho.desalojar()
+                self._descontar_vivo(bicho)
+                if emitir:
+                    bus.emitir(TipoEvento.MUERTE, "{bicho} muere", bicho=bicho)
+            self.estan_todos_los_bichos_muertos()
+
+    # -- Población --
+    def _contar_vivo(self, bicho):
+        modo = bicho.nombre_modo()
+        self._vivos[bicho] = modo
+        self.vivos_por_modo[modo] += 1
+
+    def _descontar_vivo(self, bicho):
+        modo = self._vivos.pop(bicho, None)
+        if modo is not None:
+            self.vivos_por_modo[modo] -= 1
+
+    def cambio_de_modo(self, bicho):
+        """
+        Avisado por Bicho.ini_agresivo / ini_perezoso para mover al bicho
+        de contador si ya estaba contado como vivo.
+        """
+        with self._cerrojo:
+            if bicho in self._vivos:
+                self._descontar_vivo(bicho)
+                self._contar_vivo(bicho)
+
+    def actualizar_vivo(self, bicho):
+        """
+        Vuelve a contar a 'bicho' según sus vidas y su modo actuales (tras
+        cambiarlos a mano, p. ej. al restaurar una instantánea).
+        """
+        self._descontar_vivo(bicho)
+        if bicho.esta_vivo():
+            self._contar_vivo(bicho)
+
+    def recontar_vivos(self):
+        self._vivos.clear()
+        self.vivos_por_modo.clear()
+        for b in self.bichos:
+            if b.esta_vivo():
+                self._contar_vivo(b)
+
+    def num_bichos_vivos(self):
+        return len(self._vivos)
+
+    def estadisticas_poblacion(self):
+        """
+        Población actual sin recorrer la lista de bichos.
+        """
+        vivos = len(self._vivos)
+        return {
+            "total": len(self.bichos),
+            "vivos": vivos,
+            "muertos": len(self.bichos) - vivos,
+            "agresivos": self.vivos_por_modo["Agresivo"],
+            "perezosos": self.vivos_por_modo["Perezoso"],
+        }
 
     # -- Movimiento Personaje --
     def mover_personaje_hacia(self, orientacion):
@@ -586,33 +1227,64 @@ class Juego:
             self.person.caminar_hacia(orientacion)
 
     # -- Apertura / Cierre de puertas --
-    def abrir_puertas(self):
-        def abrir_si_puerta(e):
-            if e.es_puerta():
-                e.abrir()
-        self.laberinto.recorrer(abrir_si_puerta)
-
-    def cerrar_puertas(self):
-        def cerrar_si_puerta(e):
-            if e.es_puerta():
-                e.cerrar()
-        self.laberinto.recorrer(cerrar_si_puerta)
+    def abrir_puertas(self, habitaciones=None):
+        """
+        Abre todas las puertas, o solo las de 'habitaciones' (objetos o
+        números), usando el registro de puertas del laberinto.
+        """
+        self.laberinto.abrir_puertas(habitaciones)
+
+    def cerrar_puertas(self, habitaciones=None):
+        self.laberinto.cerrar_puertas(habitaciones)
+
+    # -- Concurrencia --
+    def activar_cerrojos(self):
+        """
+        Modo concurrente para mover bichos en varios hilos (lanzar_bichos):
+        cada habitación tiene su cerrojo, los movimientos por Puerta.entrar
+        bloquean las dos habitaciones en orden de num y los combates la de la
+        víctima. Los contadores del juego van con un cerrojo propio que se
+        toma siempre el último, así que no hay interbloqueos.
+        """
+        if self.cerrojos is None:
+            self.cerrojos = CerrojosHabitacion()
+            self._cerrojo = threading.RLock()
+        return self.cerrojos
+
+    def desactivar_cerrojos(self):
+        self.cerrojos = None
+        self._cerrojo = _SIN_CERROJO
+
+    def bloquear(self, *habitaciones):
+        """
+        Contexto que bloquea 'habitaciones' en modo concurrente (o nada).
+        """
+        if self.cerrojos is None:
+            return _SIN_CERROJO
+        return self.cerrojos.bloquear(*habitaciones)
 
     # -- Hilos para bichos --
     def lanzar_bicho(self, bicho):
         def hilo_bicho():
             while bicho.esta_vivo():
                 bicho.actua()
-                time.sleep(0.2)
-        t = threading.Thread(target=hilo_bicho)
+                self.reloj.dormir(self.pausa_bicho)
+        t = threading.Thread(target=self.reloj.envolver(hilo_bicho))
         t.start()
         self.hilos[bicho] = t
 
     def lanzar_bichos(self):
-        for b in self.bichos:
-            self.lanzar_bicho(b)
+        with self.reloj.retener():
+            for b in self.bichos:
+                self.lanzar_bicho(b)
 
     def terminar_bichos(self):
+        if self.cerrojos is not None and self.cerrojos.retenidos():
+            # Bloquear otras habitaciones con una ya cogida (p. ej. al morir
+            # el personaje en buscar_personaje) rompería el orden: se hace
+            # al soltarla.
+            self.cerrojos.al_soltar(self.terminar_bichos)
+            return
         for b in list(self.bichos):
             self.terminar_bicho(b)
 
@@ -731,9 +1403,11 @@ class LaberintoBuilder:
     - construye juego
     - fabrica habitacion, armario, bomba, etc.
     """
-    def __init__(self):
+    def __init__(self, compacto=False):
         self.juego = None
         self.laberinto = None
+        # compacto=True: todas las Pared sin estado son PARED_COMPARTIDA.
+        self.compacto = compacto
 
     def fabricar_juego(self):
         self.juego = Juego()
@@ -747,10 +1421,10 @@ class LaberintoBuilder:
         h = Habitacion(num)
         # En Smalltalk se añadían orientaciones y paredes.
         # Aquí puedes emular el mismo comportamiento:
-        h.norte = Pared()
-        h.sur = Pared()
-        h.este = Pared()
-        h.oeste = Pared()
+        h.norte = self.fabricar_pared()
+        h.sur = self.fabricar_pared()
+        h.este = self.fabricar_pared()
+        h.oeste = self.fabricar_pared()
         # Se la agregamos al laberinto
         if self.laberinto:
             self.laberinto.agregar_habitacion(h)
@@ -760,30 +1434,26 @@ class LaberintoBuilder:
         # En Smalltalk: Armario new, etc.
         arm = Armario(num)
         # Conectarle paredes/orientaciones si quieres
-        arm.norte = Pared()
-        arm.sur   = Pared()
-        arm.este  = Pared()
-        arm.oeste = Pared()
+        arm.norte = self.fabricar_pared()
+        arm.sur   = self.fabricar_pared()
+        arm.este  = self.fabricar_pared()
+        arm.oeste = self.fabricar_pared()
         # En Smalltalk se hacía contenedor.agregarHijo(arm).
-        # Aquí, si contenedor es una Habitación,
-        # podemos ponerlo en un costado o "hijos" (no formal en Python).
-        # Por simplicidad, omitimos.
-        # ...
+        # Si no hay contenedor (armario en la raíz del JSON) va al laberinto.
         if isinstance(contenedor, Habitacion):
-            # Podríamos "adjuntar" de algún modo. O nada.
-            pass
+            contenedor.agregar_hijo(arm)
+            if self.laberinto:
+                self.laberinto.indexar_habitacion(arm, contenedor)
+        elif self.laberinto:
+            self.laberinto.agregar_habitacion(arm)
         return arm
 
     def fabricar_bomba_en(self, contenedor):
         # Equivale a 'Bomba new' y contenedor agregarHijo.
-        # En Python no tenemos 'agregarHijo' salvo que contenedor sea un Laberinto/Habitación
-        # Se puede simular con un decorador, etc.
-        # Simplificamos: no implementamos 'hijos' en habitacion.
         bomb = Bomba(None)
-        # No hay un "agregarHijo" en Habitacion por defecto. 
-        # Lo omitimos o definimos la lógica que quieras.
-        # ...
-        pass
+        if isinstance(contenedor, Habitacion):
+            contenedor.agregar_hijo(bomb)
+        return bomb
 
     def fabricar_bicho_agresivo(self):
         b = Bicho()
@@ -814,6 +1484,8 @@ class LaberintoBuilder:
             self.juego.agregar_bicho(b)
 
     def fabricar_pared(self):
+        if self.compacto:
+            return PARED_COMPARTIDA
         return Pared()
 
     def fabricar_puerta_l1(self, num1, or1, num2, or2):
@@ -831,34 +1503,284 @@ class LaberintoBuilder:
 
         if not h1 or not h2:
             return
-        # Convert or1 -> clase orientacion?
-        # En Smalltalk se usaba perform:('fabricar'+or1)
-        # Aquí lo simplificamos: creamos la puerta y la asignamos.
+        # En Smalltalk se usaba perform:('fabricar'+or1); aquí, la tabla
+        # LADOS_POR_NOMBRE da el lado sin pasar a minúsculas cada vez.
         pt = Puerta(h1, h2)
-
-        # Asignamos en la habitacion h1/h2
-        if or1.lower() == "norte":
-            h1.norte = pt
-        elif or1.lower() == "sur":
-            h1.sur = pt
-        elif or1.lower() == "este":
-            h1.este = pt
-        elif or1.lower() == "oeste":
-            h1.oeste = pt
-
-        if or2.lower() == "norte":
-            h2.norte = pt
-        elif or2.lower() == "sur":
-            h2.sur = pt
-        elif or2.lower() == "este":
-            h2.este = pt
-        elif or2.lower() == "oeste":
-            h2.oeste = pt
+        self.laberinto.registrar_puerta(pt)
+        lado1 = LADOS_POR_NOMBRE.get(or1) or LADOS_POR_NOMBRE.get(or1.lower())
+        if lado1 is not None:
+            setattr(h1, lado1, pt)
+        lado2 = LADOS_POR_NOMBRE.get(or2) or LADOS_POR_NOMBRE.get(or2.lower())
+        if lado2 is not None:
+            setattr(h2, lado2, pt)
+
+    # -- Construcción por lotes --
+    def _redefine(self, *nombres):
+        # True si la subclase redefine alguno de los métodos de fabricación
+        # 'nombres': entonces los lotes los llaman uno a uno.
+        clase = type(self)
+        return any(getattr(clase, n) is not getattr(LaberintoBuilder, n) for n in nombres)
+
+    def fabricar_habitaciones(self, especificaciones, estricto=True):
+        """
+        Fabrica de una vez las habitaciones de 'especificaciones': números o
+        dicts del JSON ({"tipo": "habitacion"/"armario"/"bomba", "num": n,
+        "hijos": [...]}), con el mismo resultado que llamar a
+        fabricar_habitacion/fabricar_armario/fabricar_bomba_en una a una.
+        Si una subclase redefine alguno de esos métodos, se los llama a ellos.
+        Con estricto=True se valida todo antes de construir nada y cualquier
+        error (tipo desconocido, sin 'num', número repetido) lanza ValueError;
+        con estricto=False lo inválido se ignora, como hacía Director.
+        Devuelve las habitaciones de primer nivel fabricadas.
+        """
+        especificaciones = list(especificaciones)
+        if estricto:
+            self._validar_habitaciones(especificaciones)
+        if self._redefine("fabricar_habitacion", "fabricar_armario", "fabricar_bomba_en"):
+            return self._fabricar_habitaciones_una_a_una(especificaciones)
+        laberinto = self.laberinto
+        # Las paredes sin estado se comparten (compacto); si no, una por lado.
+        # Si una subclase redefine fabricar_pared, se la llama para cada lado.
+        if type(self).fabricar_pared is LaberintoBuilder.fabricar_pared:
+            fabricar_pared = Pared
+            compartida = PARED_COMPARTIDA if self.compacto else None
+        else:
+            fabricar_pared = self.fabricar_pared
+            compartida = None
+        primer_nivel = []
+        agregar = primer_nivel.append
+
+        def fabricar(tipo, num, contenedor):
+            # Como fabricar_habitacion/fabricar_armario, sin registrar en el
+            # laberinto de una en una.
+            hab = Habitacion(num) if tipo == "habitacion" else Armario(num)
+            if compartida is not None:
+                hab.norte = hab.sur = hab.este = hab.oeste = compartida
+            else:
+                hab.norte = fabricar_pared()
+                hab.sur = fabricar_pared()
+                hab.este = fabricar_pared()
+                hab.oeste = fabricar_pared()
+            if tipo == "armario" and contenedor is not None:
+                contenedor.agregar_hijo(hab)
+                laberinto.indexar_habitacion(hab, contenedor)
+            else:
+                agregar(hab)
+            return hab
+
+        with _sin_recolector():
+            for espec in especificaciones:
+                if isinstance(espec, int):
+                    espec = {"tipo": "habitacion", "num": espec}
+                tipo = espec.get("tipo", "")
+                hab = None
+                if tipo == "habitacion" or tipo == "armario":
+                    num = espec.get("num")
+                    if num is None:
+                        continue
+                    hab = fabricar(tipo, num, None)
+                hijos = espec.get("hijos")
+                if not hijos:
+                    continue
+                # Anidados (armarios, bombas): pila explícita en preorden.
+                pila = [(h, hab) for h in reversed(hijos)]
+                while pila:
+                    espec, contenedor = pila.pop()
+                    tipo = espec.get("tipo", "")
+                    hab = None
+                    if tipo == "habitacion" or tipo == "armario":
+                        num = espec.get("num")
+                        if num is None:
+                            continue
+                        hab = fabricar(tipo, num, contenedor)
+                    elif tipo == "bomba" and contenedor is not None:
+                        contenedor.agregar_hijo(Bomba(None))
+                    hijos = espec.get("hijos")
+                    if hijos:
+                        pila.extend((h, hab) for h in reversed(hijos))
+            laberinto.agregar_habitaciones(primer_nivel, nuevas=True)
+        return primer_nivel
+
+    def _fabricar_habitaciones_una_a_una(self, especificaciones):
+        # Mismo recorrido en preorden que fabricar_habitaciones, pero con los
+        # métodos de fabricación (redefinidos) de la subclase.
+        primer_nivel = []
+        with _sin_recolector():
+            pila = [(espec, None) for espec in reversed(especificaciones)]
+            while pila:
+                espec, contenedor = pila.pop()
+                if isinstance(espec, int):
+                    espec = {"tipo": "habitacion", "num": espec}
+                tipo = espec.get("tipo", "")
+                num = espec.get("num")
+                hab = None
+                if tipo == "habitacion" and num is not None:
+                    hab = self.fabricar_habitacion(num)
+                    primer_nivel.append(hab)
+                elif tipo == "armario" and num is not None:
+                    hab = self.fabricar_armario(num, contenedor)
+                    if contenedor is None:
+                        primer_nivel.append(hab)
+                elif tipo == "bomba" and contenedor is not None:
+                    self.fabricar_bomba_en(contenedor)
+                hijos = espec.get("hijos")
+                if hijos:
+                    pila.extend((h, hab) for h in reversed(hijos))
+        return primer_nivel
+
+    def _validar_habitaciones(self, especificaciones):
+        obtener = self.laberinto.buscador()
+        vistos = set()
+        errores = []
+        pila = list(especificaciones)
+        while pila:
+            espec = pila.pop()
+            if isinstance(espec, int):
+                espec = {"tipo": "habitacion", "num": espec}
+            elif not isinstance(espec, dict):
+                errores.append(f"especificación inválida {espec!r}")
+                continue
+            tipo = espec.get("tipo", "")
+            if tipo == "habitacion" or tipo == "armario":
+                num = espec.get("num")
+                if num is None:
+                    errores.append(f"{tipo} sin 'num'")
+                elif num in vistos or obtener(num) is not None:
+                    errores.append(f"habitación {num} repetida")
+                vistos.add(num)
+            elif tipo != "bomba":
+                errores.append(f"tipo desconocido {tipo!r}")
+            pila.extend(espec.get("hijos", ()))
+        if errores:
+            raise ValueError("Habitaciones inválidas: " + "; ".join(errores[:10]))
+
+    def fabricar_puertas(self, puertas, estricto=True):
+        """
+        Fabrica las puertas de 'puertas', tuplas (num1, or1, num2, or2) como
+        las de fabricar_puerta_l1, resolviendo las orientaciones con
+        LADOS_POR_NOMBRE. Con estricto=True se valida todo antes de poner
+        ninguna y un número u orientación desconocidos lanzan ValueError; con
+        estricto=False se hace lo mismo que fabricar_puerta_l1 (se omiten las
+        puertas a habitaciones inexistentes y los lados desconocidos).
+        Devuelve la lista de puertas fabricadas.
+        """
+        puertas = list(puertas)
+        if estricto:
+            self._validar_puertas(puertas)
+        registro = self.laberinto.puertas
+        if self._redefine("fabricar_puerta_l1"):
+            # Con la de la subclase; las fabricadas son las que registre.
+            antes = len(registro)
+            with _sin_recolector():
+                for num1, or1, num2, or2 in puertas:
+                    self.fabricar_puerta_l1(num1, or1, num2, or2)
+            return list(itertools.islice(registro, antes, None))
+        obtener = self.laberinto.buscador()
+        lados = LADOS_POR_NOMBRE
+        fabricadas = []
+        agregar = fabricadas.append
+        with _sin_recolector():
+            for num1, or1, num2, or2 in puertas:
+                h1 = obtener(num1)
+                h2 = obtener(num2)
+                if h1 is None or h2 is None:
+                    continue
+                pt = Puerta(h1, h2)
+                lado = lados.get(or1) or lados.get(or1.lower())
+                if lado is not None:
+                    setattr(h1, lado, pt)
+                lado = lados.get(or2) or lados.get(or2.lower())
+                if lado is not None:
+                    setattr(h2, lado, pt)
+                registro[pt] = None
+                agregar(pt)
+        return fabricadas
+
+    def _validar_puertas(self, puertas):
+        obtener = self.laberinto.buscador()
+        lados = LADOS_POR_NOMBRE
+        errores = []
+        for p in puertas:
+            try:
+                num1, or1, num2, or2 = p
+            except (TypeError, ValueError):
+                errores.append(f"puerta mal formada {p!r}")
+                continue
+            if obtener(num1) is None or obtener(num2) is None:
+                errores.append(f"puerta {p!r}: habitación inexistente")
+            if str(or1).lower() not in lados or str(or2).lower() not in lados:
+                errores.append(f"puerta {p!r}: orientación desconocida")
+        if errores:
+            raise ValueError("Puertas inválidas: " + "; ".join(errores[:10]))
+
+    def fabricar_bichos(self, bichos, estricto=True):
+        """
+        Fabrica los bichos de 'bichos': dicts del JSON ({"modo": ...,
+        "posicion": n}) o tuplas (modo, num). Con estricto=True un modo que no
+        sea Agresivo/Perezoso o una posición inexistente lanzan ValueError (sin
+        fabricar ninguno); con estricto=False se comportan como
+        fabricar_bicho_modo (Perezoso por defecto, sin posición si no existe).
+        Si una subclase redefine fabricar_bicho_modo, se la llama para cada
+        uno. Devuelve la lista de bichos.
+        """
+        especificaciones = [(b.get("modo", "Perezoso"), b.get("posicion", 1))
+                            if isinstance(b, dict) else tuple(b) for b in bichos]
+        obtener = self.laberinto.buscador() if self.laberinto else (lambda num: None)
+        if estricto:
+            errores = []
+            for modo, num in especificaciones:
+                if modo.lower() not in ("agresivo", "perezoso"):
+                    errores.append(f"modo desconocido {modo!r}")
+                if obtener(num) is None:
+                    errores.append(f"bicho en habitación inexistente {num!r}")
+            if errores:
+                raise ValueError("Bichos inválidos: " + "; ".join(errores[:10]))
+
+        if self._redefine("fabricar_bicho_modo"):
+            antes = len(self.juego.bichos) if self.juego else 0
+            with _sin_recolector():
+                for modo, num in especificaciones:
+                    self.fabricar_bicho_modo(modo, num)
+            return self.juego.bichos[antes:] if self.juego else []
+
+        # Las llegadas solo se anuncian si alguien escucha los MOVIMIENTO.
+        anunciar = bus.habilitado(TipoEvento.MOVIMIENTO)
+        fabricados = []
+        with _sin_recolector():
+            for modo, num in especificaciones:
+                if modo.lower() == "agresivo":
+                    b = self.fabricar_bicho_agresivo()
+                else:
+                    b = self.fabricar_bicho_perezoso()
+                hab = obtener(num)
+                if hab is not None:
+                    if anunciar:
+                        hab.entrar(b)
+                    else:
+                        b.posicion = hab
+                if self.juego:
+                    self.juego.agregar_bicho(b)
+                fabricados.append(b)
+        return fabricados
 
     def obtener_juego(self):
         return self.juego
 
 
+@contextlib.contextmanager
+def _sin_recolector():
+    # Al crear cientos de miles de objetos seguidos, el recolector cíclico
+    # se dispara una y otra vez y recorre todo lo ya creado; se pausa
+    # durante la construcción por lotes.
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if activo:
+            gc.enable()
+
+
 # =========================================
 # =============   DIRECTOR   ==============
 # =========================================
@@ -869,40 +1791,35 @@ class Director:
     - crear builder
     - fabricar laberinto, juego, bichos
     """
-    def __init__(self):
+    def __init__(self, compacto=False, cache=None):
         self.builder = None
         self.dict_data = {}
+        self.compacto = compacto
+        self.estadisticas = {}
+        # Caché de mundos ya construidos (cache_laberintos.CacheLaberintos):
+        # procesar() la consulta antes de leer el JSON.
+        self.cache = cache
 
     def leer_archivo(self, archivo_json):
         with open(archivo_json, 'r', encoding='utf-8') as f:
             self.dict_data = json.load(f)
 
     def ini_builder(self):
-        self.builder = LaberintoBuilder()
+        self.builder = LaberintoBuilder(compacto=self.compacto)
 
     def fabricar_laberinto(self):
         self.builder.fabricar_laberinto()
-        # Recorrer "laberinto" del JSON
-        laberinto_list = self.dict_data.get("laberinto", [])
-        for elem in laberinto_list:
-            self.fabricar_laberinto_recursivo(elem, "root")
-
-        # Recorrer "puertas"
-        puertas_list = self.dict_data.get("puertas", [])
-        for p in puertas_list:
-            # Ej: [1, "Sur", 2, "Norte"]
-            num1, or1, num2, or2 = p
-            self.builder.fabricar_puerta_l1(num1, or1, num2, or2)
+        # "laberinto" y "puertas" del JSON, por lotes (ver LaberintoBuilder).
+        # Sin estricto: se ignora lo inválido, como al fabricar de uno en uno.
+        self.builder.fabricar_habitaciones(self.dict_data.get("laberinto", []), estricto=False)
+        # Ej: [1, "Sur", 2, "Norte"]
+        self.builder.fabricar_puertas(self.dict_data.get("puertas", []), estricto=False)
 
     def fabricar_juego(self):
         self.builder.fabricar_juego()
 
     def fabricar_bichos(self):
-        bichos_list = self.dict_data.get("bichos", [])
-        for b in bichos_list:
-            modo = b.get("modo", "Perezoso")
-            pos = b.get("posicion", 1)
-            self.builder.fabricar_bicho_modo(modo, pos)
+        self.builder.fabricar_bichos(self.dict_data.get("bichos", []), estricto=False)
 
     def fabricar_laberinto_recursivo(self, unDic, padre):
         """
@@ -930,12 +1847,110 @@ class Director:
     def procesar(self, archivo_json):
         """
         Smalltalk: leerArchivo:; iniBuilder; fabricarLaberinto; fabricarJuego; fabricarBichos
+        Con cache, si el JSON no ha cambiado se abre el mundo ya construido.
         """
+        if self.cache is not None:
+            self.cache.procesar(self, archivo_json)
+            return
         self.leer_archivo(archivo_json)
+        self.procesar_datos(self.dict_data)
+
+    def procesar_datos(self, dict_data):
+        """
+        Como procesar(), pero a partir del diccionario ya leído (p. ej. para
+        construir muchas partidas del mismo laberinto sin releer el archivo).
+        """
+        self.dict_data = dict_data
+        with _sin_recolector():
+            self.ini_builder()
+            self.fabricar_laberinto()
+            self.fabricar_juego()
+            self.fabricar_bichos()
+
+    def procesar_en_flujo(self, archivo_json, tam_bloque=1 << 20, tam_lote=4096):
+        """
+        Como procesar(), pero leyendo el JSON por bloques, sin cargar el
+        archivo entero. Las habitaciones, puertas y bichos se construyen
+        según llegan, en lotes de 'tam_lote' y con los mismos métodos por
+        lotes que fabricar_laberinto.
+        Las puertas y bichos que citan habitaciones aún no leídas se aplazan
+        a un archivo temporal y se fabrican al final. Así la memoria no crece
+        con ellos aunque "puertas" vaya antes que "laberinto". Si la
+        habitación no llega a aparecer, la puerta se descarta (como en
+        fabricar_puerta_l1) y el bicho queda sin posición.
+        Deja el resumen en self.estadisticas.
+        """
+        inicio = time.perf_counter()
+        self.dict_data = {}
         self.ini_builder()
-        self.fabricar_laberinto()
+        builder = self.builder
+        builder.fabricar_laberinto()
         self.fabricar_juego()
-        self.fabricar_bichos()
+        obtener = builder.laberinto.buscador()
+        fabricar = {
+            "laberinto": lambda lote: builder.fabricar_habitaciones(lote, estricto=False),
+            "puertas": lambda lote: builder.fabricar_puertas(lote, estricto=False),
+            "bichos": lambda lote: builder.fabricar_bichos(lote, estricto=False),
+        }
+        cuenta = dict.fromkeys(fabricar, 0)
+        aplazados = None  # archivo temporal; se abre con el primero
+        num_aplazados = 0
+
+        def aplazar(clave, elem):
+            # Se llama con las habitaciones anteriores ya construidas.
+            nonlocal aplazados, num_aplazados
+            if clave == "puertas":
+                listo = obtener(elem[0]) is not None and obtener(elem[2]) is not None
+            elif clave == "bichos":
+                listo = obtener(elem.get("posicion", 1)) is not None
+            else:
+                return False
+            if listo:
+                return False
+            if aplazados is None:
+                aplazados = tempfile.TemporaryFile("w+", encoding="utf-8")
+            aplazados.write(json.dumps([clave, elem]) + "\n")
+            num_aplazados += 1
+            return True
+
+        def construir(pares, aplazar=None):
+            # Agrupa los elementos seguidos de una misma sección en lotes.
+            lote = []
+            seccion = None
+            for clave, elem in pares:
+                if clave not in fabricar:
+                    continue
+                if clave != seccion or len(lote) >= tam_lote:
+                    if lote:
+                        fabricar[seccion](lote)
+                        lote = []
+                    seccion = clave
+                if aplazar is not None:
+                    cuenta[clave] += 1
+                    if aplazar(clave, elem):
+                        continue
+                lote.append(elem)
+            if lote:
+                fabricar[seccion](lote)
+
+        with open(archivo_json, 'r', encoding='utf-8') as f:
+            construir(iterar_secciones(f, tam_bloque=tam_bloque), aplazar)
+        if aplazados is not None:
+            with aplazados:
+                aplazados.seek(0)
+                construir(json.loads(linea) for linea in aplazados)
+
+        segundos = time.perf_counter() - inicio
+        num_habitaciones = cuenta["laberinto"]
+        self.estadisticas = {
+            "habitaciones": num_habitaciones,
+            "puertas": cuenta["puertas"],
+            "bichos": cuenta["bichos"],
+            "aplazados": num_aplazados,
+            "segundos": segundos,
+            "habitaciones_por_segundo": num_habitaciones / segundos if segundos else 0.0,
+            "rss_pico_kb": rss_pico_kb(),
+        }
 
     def obtener_juego(self):
         return self.builder.obtener_juego()
@@ -0,0 +1,376 @@
+"""
+Métricas de los puntos calientes del juego: cuántas veces se llama cada uno
+y cuánto tarda, exportables en el formato de texto de Prometheus.
+
+Los puntos medidos son Bicho.actua, Modo.despertar y Modo.caminar (y las
+versiones de Agresivo y Perezoso), Ente.es_atacado_por, Puerta.entrar, las
+etapas de Director.procesar y Planificador.paso (la duración de cada tick).
+
+medidor.activar() sustituye esos métodos en sus clases por una versión que
+cuenta la llamada y, una de cada 1/muestreo llamadas, mide su duración en un
+histograma. medidor.desactivar() deja los métodos originales, así que sin
+activar no cuesta nada. El muestreo se puede cambiar en marcha
+(medidor.muestreo = 0.01).
+
+Las duraciones incluyen las de los puntos llamados dentro (Bicho.actua
+incluye su Modo.caminar y este su Puerta.entrar). Con varios hilos los
+contadores no llevan cerrojo y pueden perder alguna suma.
+
+Uso:
+    medidor.activar(muestreo=0.1)
+    ...
+    medidor.exportar("metricas.prom")   # para el textfile collector
+    medidor.servir(9108)                # http://127.0.0.1:9108/metrics
+
+    python metricas.py [laberinto.json] --duracion 60 --salida metricas.prom
+"""
+import argparse
+import bisect
+import functools
+import http.server
+import json
+import os
+import threading
+import time
+
+from main import Bicho, Director, Ente, Modo, Puerta
+from planificador import Planificador
+
+# (clase, método): se envuelve también en las subclases que lo redefinen.
+PUNTOS = (
+    (Bicho, "actua"),
+    (Modo, "despertar"),
+    (Modo, "caminar"),
+    (Ente, "es_atacado_por"),
+    (Puerta, "entrar"),
+    (Planificador, "paso"),
+    (Director, "procesar"),
+    (Director, "procesar_datos"),
+    (Director, "procesar_en_flujo"),
+    (Director, "ini_builder"),
+    (Director, "fabricar_laberinto"),
+    (Director, "fabricar_juego"),
+    (Director, "fabricar_bichos"),
+)
+
+# Límites superiores (segundos) de las cubetas del histograma.
+CUBETAS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+           1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+PREFIJO = "laberinto"
+
+
+# =========================================
+# ===============  SERIES  ================
+# =========================================
+class Serie:
+    """
+    Contador de llamadas e histograma de duraciones de un punto.
+    """
+    __slots__ = ('punto', 'llamadas', 'medidas', 'suma', 'cubetas')
+
+    def __init__(self, punto):
+        self.punto = punto
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.llamadas = 0
+        self.medidas = 0
+        self.suma = 0.0
+        self.cubetas = [0] * (len(CUBETAS) + 1)  # la última es +Inf
+
+    def observar(self, segundos):
+        self.medidas += 1
+        self.suma += segundos
+        self.cubetas[bisect.bisect_left(CUBETAS, segundos)] += 1
+
+    def media(self):
+        return self.suma / self.medidas if self.medidas else 0.0
+
+    def cuantil(self, q):
+        """
+        Límite superior de la cubeta donde cae el cuantil 'q' (0..1).
+        """
+        if not self.medidas:
+            return 0.0
+        objetivo = q * self.medidas
+        acumuladas = 0
+        for limite, n in zip(CUBETAS, self.cubetas):
+            acumuladas += n
+            if acumuladas >= objetivo:
+                return limite
+        return float("inf")
+
+    def como_dict(self):
+        return {"llamadas": self.llamadas, "medidas": self.medidas, "suma": self.suma,
+                "media": self.media(), "p50": self.cuantil(0.5), "p99": self.cuantil(0.99)}
+
+
+def _subclases(clase):
+    pendientes = [clase]
+    vistas = []
+    while pendientes:
+        c = pendientes.pop()
+        if c not in vistas:
+            vistas.append(c)
+            pendientes.extend(c.__subclasses__())
+    return vistas
+
+
+# =========================================
+# ===============  MEDIDOR  ===============
+# =========================================
+class Medidor:
+    """
+    Instala y quita los envoltorios de PUNTOS y guarda sus series.
+    """
+    def __init__(self, puntos=PUNTOS):
+        self.puntos = puntos
+        self.series = {}
+        self._originales = []  # (clase, nombre, función original)
+        self._cada = 1
+        self._servidor = None
+
+    # -- Activación --
+    @property
+    def activo(self):
+        return bool(self._originales)
+
+    @property
+    def muestreo(self):
+        return 1.0 / self._cada
+
+    @muestreo.setter
+    def muestreo(self, fraccion):
+        if not 0 < fraccion <= 1:
+            raise ValueError(f"Muestreo fuera de (0, 1]: {fraccion}")
+        self._cada = max(1, round(1 / fraccion))
+
+    def activar(self, muestreo=1.0):
+        """
+        Envuelve los puntos (en las clases cargadas ahora mismo). Si ya
+        estaba activo solo cambia el muestreo.
+        """
+        self.muestreo = muestreo
+        if self.activo:
+            return
+        for base, nombre in self.puntos:
+            for clase in _subclases(base):
+                original = clase.__dict__.get(nombre)
+                if original is None:
+                    continue
+                punto = f"{clase.__name__}.{nombre}"
+                serie = self.series.get(punto)
+                if serie is None:
+                    serie = self.series[punto] = Serie(punto)
+                self._originales.append((clase, nombre, original))
+                setattr(clase, nombre, self._envolver(original, serie))
+
+    def desactivar(self):
+        """
+        Devuelve a cada clase su método original. Las series se conservan.
+        """
+        for clase, nombre, original in reversed(self._originales):
+            setattr(clase, nombre, original)
+        self._originales = []
+
+    def _envolver(self, original, serie):
+        reloj = time.perf_counter
+        medidor = self
+
+        @functools.wraps(original)
+        def envuelta(*args, **kwargs):
+            serie.llamadas += 1
+            if serie.llamadas % medidor._cada:
+                return original(*args, **kwargs)
+            inicio = reloj()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                serie.observar(reloj() - inicio)
+        return envuelta
+
+    def reiniciar(self):
+        for serie in self.series.values():
+            serie.reiniciar()
+
+    # -- Lectura --
+    def instantanea(self):
+        """
+        Dict punto -> resumen (llamadas, medidas, suma, media, p50, p99).
+        """
+        return {punto: serie.como_dict() for punto, serie in sorted(self.series.items())
+                if serie.llamadas}
+
+    def como_prometheus(self):
+        """
+        Las series en el formato de texto de Prometheus (versión 0.0.4).
+        """
+        series = [s for _, s in sorted(self.series.items())]
+        lineas = [
+            f"# HELP {PREFIJO}_muestreo Fraccion de llamadas cuya duracion se mide.",
+            f"# TYPE {PREFIJO}_muestreo gauge",
+            f"{PREFIJO}_muestreo {self.muestreo:.6g}",
+            f"# HELP {PREFIJO}_llamadas_total Llamadas a cada punto instrumentado.",
+            f"# TYPE {PREFIJO}_llamadas_total counter",
+        ]
+        for s in series:
+            lineas.append(f'{PREFIJO}_llamadas_total{{punto="{s.punto}"}} {s.llamadas}')
+        lineas.append(f"# HELP {PREFIJO}_duracion_segundos Duracion de las llamadas muestreadas.")
+        lineas.append(f"# TYPE {PREFIJO}_duracion_segundos histogram")
+        for s in series:
+            acumuladas = 0
+            for limite, n in zip(CUBETAS, s.cubetas):
+                acumuladas += n
+                lineas.append(f'{PREFIJO}_duracion_segundos_bucket{{punto="{s.punto}",'
+                              f'le="{limite:g}"}} {acumuladas}')
+            lineas.append(f'{PREFIJO}_duracion_segundos_bucket{{punto="{s.punto}",le="+Inf"}} '
+                          f'{s.medidas}')
+            lineas.append(f'{PREFIJO}_duracion_segundos_sum{{punto="{s.punto}"}} {s.suma:.9g}')
+            lineas.append(f'{PREFIJO}_duracion_segundos_count{{punto="{s.punto}"}} {s.medidas}')
+        return "\n".join(lineas) + "\n"
+
+    # -- Exportación --
+    def exportar(self, ruta):
+        """
+        Escribe como_prometheus() en 'ruta' de forma atómica (archivo
+        temporal y os.replace), como espera el textfile collector.
+        """
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(self.como_prometheus())
+        os.replace(temporal, ruta)
+
+    def servir(self, puerto=9108, anfitrion="127.0.0.1"):
+        """
+        Sirve las métricas en http://anfitrion:puerto/metrics desde un hilo
+        aparte. Devuelve el servidor (su server_address tiene el puerto real
+        si se pidió el 0).
+        """
+        if self._servidor is not None:
+            return self._servidor
+        medidor = self
+
+        class Manejador(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                cuerpo = medidor.como_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        servidor = http.server.ThreadingHTTPServer((anfitrion, puerto), Manejador)
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+        self._servidor = servidor
+        return servidor
+
+    def parar_servidor(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+
+# Medidor global, como el bus de eventos.
+medidor = Medidor()
+
+
+# =========================================
+# ===========  PARTIDA MEDIDA  ============
+# =========================================
+def medir_partida(datos, duracion=60.0, muestreo=1.0, semilla=0):
+    """
+    Construye y juega (reloj simulado, bichos persiguiendo al personaje) el
+    laberinto 'datos' con el medidor activo. El personaje no muere, para que
+    la partida dure 'duracion'. Devuelve medidor.instantanea().
+    """
+    import random
+
+    from caminos import activar_persecucion, desactivar_persecucion
+    from lotes import politica_aleatorio
+    from reloj import RelojSimulado
+
+    rng = random.Random(semilla)
+    medidor.reiniciar()
+    medidor.activar(muestreo)
+    juego = None
+    try:
+        director = Director(compacto=True)
+        director.procesar_datos(datos)
+        juego = director.obtener_juego()
+        juego.reloj = RelojSimulado()
+        juego.agregar_personaje("Jugador")
+        juego.person.vidas = 10 ** 9
+        juego.abrir_puertas()
+        activar_persecucion(juego)
+        plan = Planificador(reloj=juego.reloj)
+        proximo = [1.0]
+
+        def al_tick(ahora):
+            if not juego.terminado and ahora >= proximo[0]:
+                proximo[0] = ahora + 1.0
+                politica_aleatorio(juego, rng)
+            if juego.terminado:
+                plan.detener()
+
+        plan.al_tick = al_tick
+        plan.agregar_juego(juego)
+        plan.ejecutar(duracion=duracion)
+    finally:
+        # El campo de distancias está suscrito al bus global: si se queda,
+        # mantiene vivo el juego y los eventos PUERTA en las siguientes.
+        if juego is not None:
+            desactivar_persecucion(juego)
+        medidor.desactivar()
+    return medidor.instantanea()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partida con métricas de los puntos calientes.")
+    parser.add_argument("laberinto", nargs="?", help="archivo JSON del laberinto")
+    parser.add_argument("--rejilla", type=int, default=100,
+                        help="sin JSON: rejilla sintética de lado x lado")
+    parser.add_argument("--bichos", type=int, default=2_000)
+    parser.add_argument("--duracion", type=float, default=60.0, help="segundos simulados")
+    parser.add_argument("--muestreo", type=float, default=1.0)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="archivo .prom donde exportar")
+    parser.add_argument("--puerto", type=int, default=None,
+                        help="al terminar, servir las métricas en localhost hasta Ctrl+C")
+    args = parser.parse_args(argv)
+
+    from eventos import SumideroNulo, bus
+    bus.configurar(sumideros=[SumideroNulo()])
+    if args.laberinto:
+        with open(args.laberinto, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    else:
+        from benchmark import generar_json_rejilla
+        datos = generar_json_rejilla(args.rejilla, args.rejilla, args.bichos)
+
+    resumen = medir_partida(datos, args.duracion, args.muestreo, args.semilla)
+    print(f"{'punto':32s} {'llamadas':>10s} {'media µs':>10s} {'p50 µs':>9s} {'p99 µs':>9s}")
+    for punto, r in resumen.items():
+        print(f"{punto:32s} {r['llamadas']:10d} {r['media'] * 1e6:10.2f} "
+              f"{r['p50'] * 1e6:9.1f} {r['p99'] * 1e6:9.1f}")
+    if args.salida:
+        medidor.exportar(args.salida)
+    if args.puerto is not None:
+        servidor = medidor.servir(args.puerto)
+        print(f"Métricas en http://{servidor.server_address[0]}:{servidor.server_address[1]}/metrics")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            medidor.parar_servidor()
+
+
+if __name__ == "__main__":
+    main()
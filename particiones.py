@@ -0,0 +1,495 @@
+"""
+Simulación de un laberinto repartido en particiones, una por proceso.
+
+Un solo Juego usa un solo núcleo. Aquí las habitaciones del JSON se reparten
+en 'n' particiones. Se recorre el grafo de puertas en anchura y el orden
+resultante se corta en tramos iguales, así que cada partición es una zona
+contigua y solo se cortan las puertas de sus bordes. Cada proceso construye
+su partición (con Director) y mueve sus bichos con su propio Planificador y
+reloj simulado.
+
+Las puertas cortadas llevan, del lado de la otra partición, a una Frontera.
+Quien entra en ella sale de esta partición: se anota su estado (modo, vidas,
+poder y habitación de destino) y el coordinador se lo pasa a la partición
+dueña de esa habitación al empezar la ronda siguiente.
+
+El tiempo avanza por rondas ('ronda' segundos simulados). En cada ronda:
+
+1. el coordinador envía a cada partición los entes que le llegan;
+2. todas simulan hasta el final de la ronda a la vez;
+3. cada una devuelve sus bichos vivos, el estado del personaje y los que
+   salen por sus fronteras.
+
+El fin de partida lo decide el coordinador con los datos de todas (como
+Juego.estan_todos_los_bichos_muertos, pero contando también los bichos en
+tránsito). Cada partición solo lo anota: la muerte del personaje o la última
+muerte de un bicho.
+
+Como en una partida normal sin persecución, los bichos no tienen a dónde ir.
+Aquí cruzan una puerta abierta al azar (PaseoAleatorio), con una semilla
+por partición.
+
+Uso:
+    python particiones.py laberinto.json --particiones 4 --duracion 120
+    python particiones.py --rejilla 300 --bichos 50000 --escalado 1 2 4 8
+"""
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import random
+import time
+
+from caminos import PaseoAleatorio
+from eventos import SumideroNulo, bus
+from lotes import POLITICAS
+from main import (LADOS_POR_NOMBRE, Bicho, Director, ElementoMapa, Juego, LaberintoBuilder,
+                  Personaje, Puerta)
+from planificador import Planificador
+from reloj import RelojSimulado
+
+# Políticas del personaje que solo miran su habitación (cazador necesita
+# distancias por todo el mapa).
+POLITICAS_LOCALES = ("quieto", "aleatorio")
+
+
+# =========================================
+# =============  PARTICIONADO  ============
+# =========================================
+def _duenas(habitaciones, padre=None, duenas=None):
+    # num -> num de la habitación de primer nivel que lo contiene.
+    duenas = {} if duenas is None else duenas
+    pendientes = [(h, padre) for h in habitaciones]
+    while pendientes:
+        hab, padre = pendientes.pop()
+        num = hab.get("num")
+        if num is None:
+            continue
+        raiz = num if padre is None else padre
+        duenas[num] = raiz
+        pendientes.extend((h, raiz) for h in hab.get("hijos", ()) if h.get("tipo") != "bomba")
+    return duenas
+
+
+def particionar(datos, n):
+    """
+    Reparte las habitaciones de 'datos' en 'n' particiones contiguas.
+    Devuelve un dict num -> índice de partición (los armarios van con su
+    habitación).
+    """
+    duenas = _duenas(datos.get("laberinto", []))
+    vecinos = collections.defaultdict(list)
+    for n1, _, n2, _ in datos.get("puertas", []):
+        a, b = duenas.get(n1), duenas.get(n2)
+        if a is not None and b is not None and a != b:
+            vecinos[a].append(b)
+            vecinos[b].append(a)
+
+    orden = []
+    vistas = set()
+    for h in datos.get("laberinto", []):
+        inicio = h.get("num")
+        if inicio is None or inicio in vistas:
+            continue
+        vistas.add(inicio)
+        cola = collections.deque([inicio])
+        while cola:
+            num = cola.popleft()
+            orden.append(num)
+            for otra in vecinos[num]:
+                if otra not in vistas:
+                    vistas.add(otra)
+                    cola.append(otra)
+
+    tramo = max(1, math.ceil(len(orden) / n))
+    raices = {num: i // tramo for i, num in enumerate(orden)}
+    return {num: raices[raiz] for num, raiz in duenas.items()}
+
+
+def datos_de_particion(datos, asignacion, indice):
+    """
+    (datos, fronteras) de la partición 'indice': el JSON con sus habitaciones,
+    sus puertas internas y sus bichos, y la lista de puertas cortadas como
+    (num propia, lado, num ajena).
+    """
+    laberinto = [h for h in datos.get("laberinto", []) if asignacion.get(h.get("num")) == indice]
+    puertas = []
+    fronteras = []
+    for puerta in datos.get("puertas", []):
+        n1, o1, n2, o2 = puerta
+        p1, p2 = asignacion.get(n1), asignacion.get(n2)
+        if p1 == indice and p2 == indice:
+            puertas.append(puerta)
+        elif p1 == indice and p2 is not None:
+            fronteras.append((n1, o1, n2))
+        elif p2 == indice and p1 is not None:
+            fronteras.append((n2, o2, n1))
+    bichos = [b for b in datos.get("bichos", []) if asignacion.get(b.get("posicion", 1)) == indice]
+    return {"laberinto": laberinto, "puertas": puertas, "bichos": bichos}, fronteras
+
+
+# =========================================
+# ==============  PARTICIÓN  ==============
+# =========================================
+class Frontera(ElementoMapa):
+    """
+    Lado de una puerta cortada: lleva a la habitación 'num' de otra partición.
+    """
+    __slots__ = ('num', 'particion')
+
+    def __init__(self, num, particion):
+        self.num = num
+        self.particion = particion
+
+    def entrar(self, alguien):
+        if alguien is not None:
+            self.particion.traspasar(alguien, self.num)
+
+    def __str__(self):
+        return f"Frontera(Hab{self.num})"
+
+
+class JuegoParticion(Juego):
+    """
+    Juego de una partición. El fin de partida lo decide el coordinador con
+    los datos de todas, así que aquí solo se anota.
+    """
+    def __init__(self, reloj=None):
+        super().__init__(reloj)
+        self.muerte_personaje = None
+        self.ultima_muerte = None
+
+    def estan_todos_los_bichos_muertos(self):
+        pass
+
+    def muere_personaje(self):
+        if self.person:
+            self._contar_muerte(self.person)
+            self.person.desalojar()
+        self.muerte_personaje = self.reloj.ahora()
+
+    def terminar_bicho(self, bicho):
+        super().terminar_bicho(bicho)
+        self.ultima_muerte = self.reloj.ahora()
+
+
+class _BuilderParticion(LaberintoBuilder):
+    def fabricar_juego(self):
+        self.juego = JuegoParticion()
+        self.juego.laberinto = self.laberinto
+
+
+class _DirectorParticion(Director):
+    def ini_builder(self):
+        self.builder = _BuilderParticion(compacto=self.compacto)
+
+
+class Particion:
+    """
+    Una partición en marcha: su juego, su planificador y los entes que han
+    salido por sus fronteras durante la ronda.
+    """
+    def __init__(self, indice, datos, fronteras, semilla=0, politica="quieto",
+                 periodo_personaje=1.0, abrir_puertas=True, tick=0.05):
+        self.indice = indice
+        self.salientes = []
+        self.traspasos = 0
+        director = _DirectorParticion(compacto=True)
+        director.procesar_datos(datos)
+        juego = self.juego = director.obtener_juego()
+        juego.reloj = RelojSimulado()
+        self.rng = random.Random(semilla * 1_000_003 + indice)
+        juego.campo = PaseoAleatorio(self.rng)
+
+        otras = {}
+        for propia, lado, ajena in fronteras:
+            hab = juego.obtener_habitacion(propia)
+            atributo = LADOS_POR_NOMBRE.get(lado)
+            if hab is None or atributo is None:
+                continue
+            frontera = otras.get(ajena)
+            if frontera is None:
+                frontera = otras[ajena] = Frontera(ajena, self)
+            hab.conectar(atributo, Puerta(hab, frontera))
+        if abrir_puertas:
+            juego.abrir_puertas()
+
+        self.plan = Planificador(tick=tick, reloj=juego.reloj)
+        self.plan.agregar_juego(juego)
+        actuar = POLITICAS[politica]
+        proximo = [periodo_personaje]
+
+        def al_tick(ahora):
+            if juego.person is not None and juego.person.esta_vivo() and ahora >= proximo[0]:
+                proximo[0] = ahora + periodo_personaje
+                actuar(juego, self.rng)
+        self.plan.al_tick = al_tick
+
+    # -- Traspasos --
+    def traspasar(self, ente, num):
+        """
+        Saca a 'ente' de esta partición camino de la habitación 'num'.
+        """
+        juego = self.juego
+        ente.desalojar()
+        if isinstance(ente, Personaje):
+            self.salientes.append(("personaje", ente.nombre, ente.vidas, ente.poder, num))
+            juego.person = None
+        else:
+            self.salientes.append(("bicho", ente.nombre_modo(), ente.vidas, ente.poder, num))
+            juego.eliminar_bicho(ente)
+            ente.modo = None  # el Planificador deja de despertarlo
+        ente.juego = None
+        self.traspasos += 1
+
+    def recibir(self, mensaje):
+        clase, nombre, vidas, poder, num = mensaje
+        juego = self.juego
+        hab = juego.obtener_habitacion(num)
+        if clase == "personaje":
+            ente = Personaje(nombre)
+            ente.juego = juego
+            juego.person = ente
+        else:
+            ente = Bicho()
+            if nombre == "Agresivo":
+                ente.ini_agresivo()
+            elif nombre == "Perezoso":
+                ente.ini_perezoso()
+            juego.agregar_bicho(ente)
+        ente.vidas = vidas
+        ente.poder = poder
+        ente.posicion = hab
+        if clase != "personaje":
+            self.plan.agregar_bicho(ente)
+
+    # -- Rondas --
+    def avanzar(self, hasta, entrantes=()):
+        """
+        Recibe 'entrantes', simula hasta el instante 'hasta' y devuelve el
+        informe de la ronda.
+        """
+        for mensaje in entrantes:
+            self.recibir(mensaje)
+        plan, reloj = self.plan, self.juego.reloj
+        for _ in range(round((hasta - reloj.ahora()) / plan.tick)):
+            plan.paso(reloj.ahora())
+            reloj.avanzar(plan.tick)
+        juego = self.juego
+        salientes, self.salientes = self.salientes, []
+        return {
+            "vivos": juego.num_bichos_vivos(),
+            "personaje": juego.person is not None and juego.person.esta_vivo(),
+            "muerte_personaje": juego.muerte_personaje,
+            "ultima_muerte": juego.ultima_muerte,
+            "salientes": salientes,
+        }
+
+    def resumen(self):
+        return {
+            "muertes": dict(self.juego.muertes_por_habitacion),
+            "actuaciones": self.plan.actuaciones,
+            "traspasos": self.traspasos,
+        }
+
+
+# =========================================
+# ============  COORDINADOR  ==============
+# =========================================
+def _trabajador(conexion, indice, datos, fronteras, opciones):
+    bus.configurar(sumideros=[SumideroNulo()])
+    particion = Particion(indice, datos, fronteras, **opciones)
+    conexion.send(None)  # construida
+    while True:
+        orden = conexion.recv()
+        if orden[0] == "ronda":
+            conexion.send(particion.avanzar(orden[1], orden[2]))
+        else:
+            conexion.send(particion.resumen())
+            conexion.close()
+            return
+
+
+class _Remota:
+    # Partición en otro proceso, con la misma interfaz que Particion.
+    def __init__(self, indice, datos, fronteras, opciones, contexto):
+        self.conexion, otro_extremo = contexto.Pipe()
+        self.proceso = contexto.Process(target=_trabajador,
+                                        args=(otro_extremo, indice, datos, fronteras, opciones))
+        self.proceso.start()
+        otro_extremo.close()
+
+    def esperar(self):
+        return self.conexion.recv()
+
+    def enviar_ronda(self, hasta, entrantes):
+        self.conexion.send(("ronda", hasta, entrantes))
+
+    def enviar_fin(self):
+        self.conexion.send(("fin",))
+
+    def cerrar(self):
+        self.conexion.close()
+        self.proceso.join()
+
+
+class _Local:
+    # Partición en este mismo proceso (procesos=False): misma interfaz.
+    def __init__(self, indice, datos, fronteras, opciones):
+        self.particion = Particion(indice, datos, fronteras, **opciones)
+        self._respuesta = None
+
+    def esperar(self):
+        return self._respuesta
+
+    def enviar_ronda(self, hasta, entrantes):
+        self._respuesta = self.particion.avanzar(hasta, entrantes)
+
+    def enviar_fin(self):
+        self._respuesta = self.particion.resumen()
+
+    def cerrar(self):
+        pass
+
+
+def simular(datos, particiones=None, duracion=60.0, ronda=1.0, semilla=0,
+            politica="quieto", con_personaje=True, abrir_puertas=True,
+            periodo_personaje=1.0, procesos=True):
+    """
+    Simula el laberinto 'datos' (dict del JSON) repartido en 'particiones'
+    procesos (por defecto, uno por núcleo). Con procesos=False las
+    particiones se ejecutan una tras otra en este proceso (mismo resultado).
+    Devuelve un dict con el ganador (None si se agotó 'duracion'), el
+    instante del fin, las muertes por habitación y datos del reparto.
+    """
+    if politica not in POLITICAS_LOCALES:
+        raise ValueError(f"Política no disponible por particiones: {politica!r}")
+    particiones = particiones or multiprocessing.cpu_count()
+    asignacion = particionar(datos, particiones)
+    opciones = {"semilla": semilla, "politica": politica, "abrir_puertas": abrir_puertas,
+                "periodo_personaje": periodo_personaje}
+    piezas = [datos_de_particion(datos, asignacion, k) for k in range(particiones)]
+    cortadas = sum(len(fronteras) for _, fronteras in piezas) // 2
+
+    inicio = time.perf_counter()
+    if procesos:
+        contexto = multiprocessing.get_context()
+        nodos = [_Remota(k, d, f, opciones, contexto) for k, (d, f) in enumerate(piezas)]
+        for nodo in nodos:
+            nodo.esperar()
+    else:
+        nodos = [_Local(k, d, f, opciones) for k, (d, f) in enumerate(piezas)]
+    construccion = time.perf_counter() - inicio
+
+    pendientes = [[] for _ in range(particiones)]
+    if con_personaje and 1 in asignacion:
+        p = Personaje("Jugador")
+        pendientes[asignacion[1]].append(("personaje", p.nombre, p.vidas, p.poder, 1))
+
+    ganador = instante_fin = None
+    ahora = 0.0
+    rondas = 0
+    try:
+        while ahora < duracion and ganador is None:
+            ahora = min(ahora + ronda, duracion)
+            rondas += 1
+            for nodo, entrantes in zip(nodos, pendientes):
+                nodo.enviar_ronda(ahora, entrantes)
+            informes = [nodo.esperar() for nodo in nodos]
+
+            pendientes = [[] for _ in range(particiones)]
+            for informe in informes:
+                for mensaje in informe["salientes"]:
+                    pendientes[asignacion[mensaje[4]]].append(mensaje)
+            en_transito = [m[0] for destino in pendientes for m in destino]
+            muertes_personaje = [i["muerte_personaje"] for i in informes
+                                 if i["muerte_personaje"] is not None]
+            vivos = sum(i["vivos"] for i in informes) + en_transito.count("bicho")
+            hay_personaje = any(i["personaje"] for i in informes) or "personaje" in en_transito
+            if muertes_personaje:
+                ganador, instante_fin = "bichos", min(muertes_personaje)
+            elif vivos == 0 and hay_personaje:
+                ultimas = [i["ultima_muerte"] for i in informes if i["ultima_muerte"] is not None]
+                ganador, instante_fin = "personaje", max(ultimas, default=0.0)
+        for nodo in nodos:
+            nodo.enviar_fin()
+        resumenes = [nodo.esperar() for nodo in nodos]
+    finally:
+        for nodo in nodos:
+            nodo.cerrar()
+
+    muertes = collections.Counter()
+    for r in resumenes:
+        muertes.update(r["muertes"])
+    return {
+        "ganador": ganador,
+        "segundos": instante_fin if ganador is not None else ahora,
+        "muertes": dict(sorted(muertes.items())),
+        "particiones": particiones,
+        "puertas_cortadas": cortadas,
+        "rondas": rondas,
+        "traspasos": sum(r["traspasos"] for r in resumenes),
+        "actuaciones": sum(r["actuaciones"] for r in resumenes),
+        "segundos_construccion": construccion,
+        "segundos_reales": time.perf_counter() - inicio,
+    }
+
+
+def escalado(datos, nucleos, duracion=30.0, ronda=1.0, semilla=0):
+    """
+    Mide la misma simulación (sin personaje, así dura siempre 'duracion')
+    con 1, 2... particiones. Devuelve una fila por número de núcleos, con la
+    aceleración respecto a la primera.
+    """
+    filas = []
+    for n in nucleos:
+        r = simular(datos, n, duracion=duracion, ronda=ronda, semilla=semilla,
+                    con_personaje=False)
+        filas.append({"procesos": n, "segundos": r["segundos_reales"],
+                      "construccion": r["segundos_construccion"],
+                      "actuaciones_por_segundo": r["actuaciones"] / r["segundos_reales"],
+                      "puertas_cortadas": r["puertas_cortadas"], "traspasos": r["traspasos"]})
+    base = filas[0]["segundos"] if filas else 0.0
+    for fila in filas:
+        fila["aceleracion"] = base / fila["segundos"] if fila["segundos"] else 0.0
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulación repartida en procesos.")
+    parser.add_argument("laberinto", nargs="?", help="archivo JSON del laberinto")
+    parser.add_argument("--rejilla", type=int, default=200,
+                        help="sin JSON: rejilla sintética de lado x lado")
+    parser.add_argument("--bichos", type=int, default=20_000,
+                        help="bichos de la rejilla sintética")
+    parser.add_argument("--particiones", type=int, default=None)
+    parser.add_argument("--duracion", type=float, default=60.0)
+    parser.add_argument("--ronda", type=float, default=1.0)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--politica", choices=POLITICAS_LOCALES, default="quieto")
+    parser.add_argument("--escalado", type=int, nargs="+", default=None,
+                        help="números de procesos a comparar (p. ej. 1 2 4 8)")
+    args = parser.parse_args(argv)
+
+    bus.configurar(sumideros=[SumideroNulo()])
+    if args.laberinto:
+        with open(args.laberinto, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    else:
+        from benchmark import generar_json_rejilla
+        datos = generar_json_rejilla(args.rejilla, args.rejilla, args.bichos)
+
+    if args.escalado:
+        for fila in escalado(datos, args.escalado, args.duracion, args.ronda, args.semilla):
+            print(f"{fila['procesos']:3d} procesos: {fila['segundos']:8.2f} s  "
+                  f"x{fila['aceleracion']:.2f}  {fila['actuaciones_por_segundo']:12,.0f} act/s  "
+                  f"({fila['puertas_cortadas']} puertas cortadas, {fila['traspasos']} traspasos)")
+    else:
+        resultado = simular(datos, args.particiones, args.duracion, args.ronda, args.semilla,
+                            args.politica)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Planificador de simulación en un solo hilo.
+
+Sustituye a 'Juego.lanzar_bichos' (un hilo por bicho) por un bucle único que
+guarda en una cola de prioridad el instante en que debe despertar cada bicho.
+Los periodos de sueño de Agresivo (1 s) y Perezoso (3 s) y la pausa de 0.2 s
+entre actuaciones se respetan como retrasos planificados, sin bloquear.
+
+El tiempo lo da un Reloj (ver reloj.py); con un RelojSimulado el bucle
+avanza de tick en tick sin esperar.
+
+Ejemplo:
+    juego = director.obtener_juego()
+    plan = Planificador(reloj=juego.reloj)
+    plan.agregar_juego(juego)
+    plan.ejecutar(duracion=60)
+"""
+import heapq
+import itertools
+
+from main import Juego
+from reloj import RelojReal
+
+
+class Planificador:
+    """
+    Motor de ticks: en cada tick despierta a todos los bichos cuyo instante
+    de despertar ya ha pasado y los vuelve a encolar para su próxima actuación.
+    """
+    def __init__(self, tick=0.05, pausa=Juego.pausa_bicho, reloj=None, al_tick=None):
+        self.reloj = reloj if reloj is not None else RelojReal()
+        self.tick = tick
+        self.pausa = pausa
+        self._cola = []  # heap de (instante, orden, bicho)
+        self._orden = itertools.count()
+        self._detenido = False
+        # Función opcional al_tick(ahora) llamada tras cada tick (p. ej. para
+        # mover al personaje o llamar a detener() al acabar la partida).
+        self.al_tick = al_tick
+        self.ticks = 0
+        self.actuaciones = 0
+
+    def ahora(self):
+        return self.reloj.ahora()
+
+    def __len__(self):
+        return len(self._cola)
+
+    # -- Alta de bichos --
+    def agregar_bicho(self, bicho, retraso=None):
+        """
+        Planifica la primera actuación del bicho. Por defecto, tras su periodo
+        de sueño, igual que si ejecutara modo.actua() en su propio hilo.
+        """
+        if not bicho.modo:
+            return
+        if retraso is None:
+            retraso = bicho.modo.periodo
+        heapq.heappush(self._cola, (self.ahora() + retraso, next(self._orden), bicho))
+
+    def agregar_bichos(self, bichos):
+        for b in bichos:
+            self.agregar_bicho(b)
+
+    def agregar_juego(self, juego):
+        self.agregar_bichos(juego.bichos)
+
+    # -- Bucle principal --
+    def detener(self):
+        self._detenido = True
+
+    def paso(self, ahora):
+        """
+        Despierta a todos los bichos pendientes hasta 'ahora'.
+        Devuelve cuántos han actuado.
+        """
+        cola = self._cola
+        actuados = 0
+        while cola and cola[0][0] <= ahora:
+            instante, _, bicho = heapq.heappop(cola)
+            if not bicho.esta_vivo() or not bicho.modo:
+                continue
+            bicho.modo.despertar(bicho)
+            actuados += 1
+            if bicho.esta_vivo() and bicho.modo:
+                siguiente = instante + self.pausa + bicho.modo.periodo
+                heapq.heappush(cola, (siguiente, next(self._orden), bicho))
+        self.ticks += 1
+        self.actuaciones += actuados
+        if self.al_tick is not None:
+            self.al_tick(ahora)
+        return actuados
+
+    def ejecutar(self, duracion=None, max_ticks=None):
+        """
+        Ejecuta ticks a ritmo constante hasta que no queden bichos vivos,
+        pase 'duracion' segundos, se alcancen 'max_ticks' o se llame a detener().
+        """
+        self._detenido = False
+        inicio = self.ahora()
+        limite = inicio + duracion if duracion is not None else None
+        proximo = inicio
+        ticks = 0
+        while self._cola and not self._detenido:
+            if max_ticks is not None and ticks >= max_ticks:
+                break
+            self.paso(self.ahora())
+            ticks += 1
+            proximo += self.tick
+            if limite is not None and proximo > limite:
+                break
+            espera = proximo - self.ahora()
+            if espera > 0:
+                self.reloj.dormir(espera)
+            else:
+                # Vamos retrasados: no intentamos recuperar ticks perdidos.
+                proximo = self.ahora()
@@ -0,0 +1,405 @@
+"""
+Laberinto en rejilla respaldado por arrays.
+
+Para rejillas de millones de celdas, el grafo de objetos Habitacion, Puerta
+y Pared enlazados por norte/sur/este/oeste ocupa demasiada memoria.
+LaberintoRejilla guarda en buffers contiguos (módulo 'array' y bytearray),
+indexados por id de habitación:
+
+- lados:        4 enteros por habitación (norte, sur, este, oeste). Un valor
+                >= 0 es el índice de una puerta; si es negativo, es una pared.
+- puerta_lado1/puerta_lado2: ids de las habitaciones que une cada puerta.
+- abiertas:     1 byte por puerta.
+
+El resto del juego ve el laberinto a través de vistas ligeras
+(HabitacionVista, PuertaVista, ParedBombaVista). Son subclases de
+Habitacion, Puerta y ParedBomba que leen y escriben en los buffers, así que
+obtener_habitacion, recorrer, Juego.abrir_puertas y Orientacion.caminar
+funcionan igual que con un Laberinto normal. Las vistas se crean al pedirlas
+y dos vistas de la misma habitación son iguales (==) aunque no sean el mismo
+objeto.
+
+Las operaciones masivas (abrir_puertas, cerrar_puertas) rellenan el buffer
+de golpe en lugar de visitar puerta a puerta; con una lista de habitaciones
+solo tocan las puertas de esas habitaciones.
+
+Ejemplo:
+    juego = Juego()
+    juego.laberinto = LaberintoRejilla.completa(1000, 1000)
+    juego.laberinto.abrir_puertas()
+"""
+from array import array
+from types import MappingProxyType
+
+from eventos import TipoEvento, bus
+from main import PARED_COMPARTIDA, ElementoMapa, Habitacion, ParedBomba, Puerta
+
+LADOS = ("norte", "sur", "este", "oeste")
+NORTE, SUR, ESTE, OESTE = range(4)
+
+# Códigos de pared en 'lados' (los valores >= 0 son índices de puerta).
+PARED = -1
+PARED_BOMBA = -2
+PARED_BOMBA_ACTIVA = -3
+
+# Ocupantes de las habitaciones vacías: uno solo, compartido y de solo lectura.
+_SIN_OCUPANTES = MappingProxyType({})
+
+
+# =========================================
+# ===============  VISTAS  ================
+# =========================================
+def _propiedad_lado(lado):
+    def leer(self):
+        return self.laberinto._elemento(4 * self.id + lado)
+
+    def escribir(self, elemento):
+        self.laberinto._poner_elemento(4 * self.id + lado, elemento)
+    return property(leer, escribir)
+
+
+class HabitacionVista(Habitacion):
+    """
+    Habitación 'id' (num = id + 1) de un LaberintoRejilla.
+    """
+    __slots__ = ('id',)  # 'laberinto' ya es un slot de Habitacion
+    hijos = ()  # la rejilla no guarda armarios ni bombas anidados
+
+    def __init__(self, laberinto, id):
+        self.laberinto = laberinto
+        self.id = id
+
+    @property
+    def num(self):
+        return self.id + 1
+
+    @property
+    def ocupantes(self):
+        return self.laberinto._ocupantes.get(self.id, _SIN_OCUPANTES)
+
+    def alojar(self, ente):
+        ocupantes = self.laberinto._ocupantes
+        ocupantes.setdefault(self.id, {})[ente] = None
+
+    def desalojar(self, ente):
+        ocupantes = self.laberinto._ocupantes
+        de_esta = ocupantes.get(self.id)
+        if de_esta is not None:
+            de_esta.pop(ente, None)
+            if not de_esta:
+                del ocupantes[self.id]
+
+    norte = _propiedad_lado(NORTE)
+    sur = _propiedad_lado(SUR)
+    este = _propiedad_lado(ESTE)
+    oeste = _propiedad_lado(OESTE)
+
+    def __eq__(self, otra):
+        return (isinstance(otra, HabitacionVista)
+                and otra.laberinto is self.laberinto and otra.id == self.id)
+
+    def __hash__(self):
+        return hash((id(self.laberinto), self.id))
+
+
+class PuertaVista(Puerta):
+    """
+    Puerta 'indice' de un LaberintoRejilla.
+    """
+    __slots__ = ('laberinto', 'indice')
+
+    def __init__(self, laberinto, indice):
+        self.laberinto = laberinto
+        self.indice = indice
+
+    @property
+    def abierta(self):
+        return self.laberinto.abiertas[self.indice] == 1
+
+    @abierta.setter
+    def abierta(self, valor):
+        self.laberinto.abiertas[self.indice] = 1 if valor else 0
+
+    @property
+    def lado1(self):
+        return HabitacionVista(self.laberinto, self.laberinto.puerta_lado1[self.indice])
+
+    @property
+    def lado2(self):
+        return HabitacionVista(self.laberinto, self.laberinto.puerta_lado2[self.indice])
+
+    def __eq__(self, otra):
+        return (isinstance(otra, PuertaVista)
+                and otra.laberinto is self.laberinto and otra.indice == self.indice)
+
+    def __hash__(self):
+        return hash((id(self.laberinto), -1 - self.indice))
+
+
+class ParedBombaVista(ParedBomba):
+    """
+    ParedBomba guardada en la posición 'pos' del buffer de lados.
+    """
+    __slots__ = ('laberinto', 'pos')
+
+    def __init__(self, laberinto, pos):
+        self.laberinto = laberinto
+        self.pos = pos
+
+    @property
+    def activa(self):
+        return self.laberinto.lados[self.pos] == PARED_BOMBA_ACTIVA
+
+    @activa.setter
+    def activa(self, valor):
+        self.laberinto.lados[self.pos] = PARED_BOMBA_ACTIVA if valor else PARED_BOMBA
+
+
+class _Habitaciones:
+    """
+    Secuencia perezosa de vistas, para quien use laberinto.habitaciones.
+    """
+    __slots__ = ('laberinto',)
+
+    def __init__(self, laberinto):
+        self.laberinto = laberinto
+
+    def __len__(self):
+        return self.laberinto.num_habitaciones
+
+    def __getitem__(self, i):
+        n = self.laberinto.num_habitaciones
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return HabitacionVista(self.laberinto, i)
+
+    def __iter__(self):
+        lab = self.laberinto
+        for i in range(lab.num_habitaciones):
+            yield HabitacionVista(lab, i)
+
+
+# =========================================
+# ===========  LABERINTO REJILLA  =========
+# =========================================
+class LaberintoRejilla(ElementoMapa):
+    """
+    Laberinto de ancho x alto habitaciones numeradas por filas desde 1.
+    Recién creado, todas las habitaciones están rodeadas de paredes.
+    Las habitaciones son las celdas de la rejilla: agregar_habitacion(es),
+    indexar_habitacion, eliminar_habitacion y renumerar_habitacion lanzan
+    TypeError.
+    """
+    def __init__(self, ancho, alto):
+        self.ancho = ancho
+        self.alto = alto
+        self.num_habitaciones = ancho * alto
+        self.lados = array('i', [PARED]) * (4 * self.num_habitaciones)
+        self.puerta_lado1 = array('i')
+        self.puerta_lado2 = array('i')
+        self.abiertas = bytearray()
+        # Solo las habitaciones con algún ente tienen aquí su dict de
+        # ocupantes; las demás leen _SIN_OCUPANTES (HabitacionVista).
+        self._ocupantes = {}
+
+    @classmethod
+    def completa(cls, ancho, alto):
+        """
+        Rejilla con una puerta (cerrada) entre cada par de habitaciones vecinas.
+        Se rellena fila a fila con asignaciones por tramos de los buffers.
+        """
+        lab = cls(ancho, alto)
+        lados = lab.lados
+        # Puertas Este-Oeste: las (ancho - 1) de cada fila, fila tras fila.
+        if ancho > 1:
+            for fila in range(alto):
+                primera = fila * ancho
+                indices = array('i', range(fila * (ancho - 1), (fila + 1) * (ancho - 1)))
+                lados[4 * primera + ESTE:4 * (primera + ancho - 1):4] = indices
+                lados[4 * (primera + 1) + OESTE:4 * (primera + ancho):4] = indices
+                lab.puerta_lado1.extend(range(primera, primera + ancho - 1))
+                lab.puerta_lado2.extend(range(primera + 1, primera + ancho))
+        # Puertas Norte-Sur: las 'ancho' entre cada fila y la siguiente.
+        base = alto * (ancho - 1)
+        for fila in range(alto - 1):
+            primera = fila * ancho
+            indices = array('i', range(base + primera, base + primera + ancho))
+            lados[4 * primera + SUR:4 * (primera + ancho):4] = indices
+            lados[4 * (primera + ancho) + NORTE:4 * (primera + 2 * ancho):4] = indices
+            lab.puerta_lado1.extend(range(primera, primera + ancho))
+            lab.puerta_lado2.extend(range(primera + ancho, primera + 2 * ancho))
+        lab.abiertas = bytearray(len(lab.puerta_lado1))
+        return lab
+
+    # -- Geometría --
+    def coordenadas(self, num):
+        """
+        (fila, columna) de la habitación 'num'.
+        """
+        return divmod(num - 1, self.ancho)
+
+    def vecina(self, num, lado):
+        """
+        Número de la habitación contigua por 'lado' (índice o nombre), o None.
+        """
+        if isinstance(lado, str):
+            lado = LADOS.index(lado.lower())
+        fila, col = self.coordenadas(num)
+        if lado == NORTE:
+            fila -= 1
+        elif lado == SUR:
+            fila += 1
+        elif lado == ESTE:
+            col += 1
+        else:
+            col -= 1
+        if 0 <= fila < self.alto and 0 <= col < self.ancho:
+            return fila * self.ancho + col + 1
+        return None
+
+    # -- Construcción --
+    def fabricar_puerta(self, num, lado, abierta=False):
+        """
+        Pone una puerta entre 'num' y su vecina por 'lado'. Devuelve su índice.
+        """
+        if isinstance(lado, str):
+            lado = LADOS.index(lado.lower())
+        otra = self.vecina(num, lado)
+        if otra is None:
+            raise ValueError(f"Hab{num} no tiene vecina por {LADOS[lado]}")
+        indice = len(self.abiertas)
+        self.puerta_lado1.append(num - 1)
+        self.puerta_lado2.append(otra - 1)
+        self.abiertas.append(1 if abierta else 0)
+        self.lados[4 * (num - 1) + lado] = indice
+        self.lados[4 * (otra - 1) + (lado ^ 1)] = indice  # norte<->sur, este<->oeste
+        return indice
+
+    def poner_pared_bomba(self, num, lado, activa=False):
+        if isinstance(lado, str):
+            lado = LADOS.index(lado.lower())
+        self.lados[4 * (num - 1) + lado] = PARED_BOMBA_ACTIVA if activa else PARED_BOMBA
+
+    def _elemento(self, pos):
+        codigo = self.lados[pos]
+        if codigo >= 0:
+            return PuertaVista(self, codigo)
+        if codigo == PARED:
+            return PARED_COMPARTIDA
+        return ParedBombaVista(self, pos)
+
+    def _poner_elemento(self, pos, elemento):
+        if isinstance(elemento, PuertaVista) and elemento.laberinto is self:
+            self.lados[pos] = elemento.indice
+        elif isinstance(elemento, ParedBomba):
+            self.lados[pos] = PARED_BOMBA_ACTIVA if elemento.activa else PARED_BOMBA
+        elif elemento is None or elemento.es_pared():
+            self.lados[pos] = PARED
+        else:
+            raise TypeError(f"LaberintoRejilla no puede guardar {elemento!r}")
+
+    # -- Interfaz de Laberinto --
+    @property
+    def habitaciones(self):
+        return _Habitaciones(self)
+
+    @property
+    def num_puertas(self):
+        return len(self.abiertas)
+
+    # El número de cada habitación es su posición en la rejilla, así que no
+    # se pueden añadir, anidar, quitar ni renumerar.
+    def _tamano_fijo(self, operacion):
+        return TypeError(f"{self} tiene un tamaño fijo: no admite {operacion}")
+
+    def agregar_habitacion(self, hab):
+        raise self._tamano_fijo("agregar_habitacion")
+
+    def agregar_habitaciones(self, habs, nuevas=False):
+        raise self._tamano_fijo("agregar_habitaciones")
+
+    def indexar_habitacion(self, hab, contenedor=None):
+        raise self._tamano_fijo("indexar_habitacion (habitaciones anidadas)")
+
+    def eliminar_habitacion(self, num):
+        raise self._tamano_fijo("eliminar_habitacion")
+
+    def renumerar_habitacion(self, num, nuevo_num):
+        raise self._tamano_fijo("renumerar_habitacion")
+
+    def obtener_habitacion(self, num):
+        if 1 <= num <= self.num_habitaciones:
+            return HabitacionVista(self, num - 1)
+        return None
+
+    def buscador(self):
+        return self.obtener_habitacion
+
+    def obtener_puerta(self, indice):
+        return PuertaVista(self, indice)
+
+    def entrar(self, alguien):
+        hab1 = self.obtener_habitacion(1)
+        if hab1:
+            hab1.entrar(alguien)
+
+    def raices_recorrido(self):
+        return self.habitaciones
+
+    # -- Operaciones masivas --
+    def registrar_puerta(self, puerta):
+        pass  # las puertas ya están en el buffer
+
+    def puertas_de(self, habitaciones=None):
+        """
+        Vistas de las puertas distintas de 'habitaciones' (vistas o números),
+        o de todas si es None.
+        """
+        if habitaciones is None:
+            indices = range(len(self.abiertas))
+        else:
+            indices = self._indices_de(habitaciones)
+        return [PuertaVista(self, i) for i in indices]
+
+    def _indices_de(self, habitaciones):
+        lados = self.lados
+        indices = {}
+        for hab in habitaciones:
+            id = hab.id if isinstance(hab, HabitacionVista) else hab - 1
+            if not 0 <= id < self.num_habitaciones:
+                continue
+            for codigo in lados[4 * id:4 * id + 4]:
+                if codigo >= 0:
+                    indices[codigo] = None
+        return list(indices)
+
+    def abrir_puertas(self, habitaciones=None):
+        self._poner(True, habitaciones)
+
+    def cerrar_puertas(self, habitaciones=None):
+        self._poner(False, habitaciones)
+
+    def _poner(self, abierta, habitaciones):
+        if habitaciones is None:
+            n = len(self.abiertas)
+            self.abiertas[:] = (b'\x01' if abierta else b'\x00') * n
+            indices = range(n)
+        else:
+            indices = self._indices_de(habitaciones)
+            valor = 1 if abierta else 0
+            for i in indices:
+                self.abiertas[i] = valor
+        if bus.habilitado(TipoEvento.PUERTA):
+            estado = "ABIERTA" if abierta else "CERRADA"
+            for i in indices:
+                bus.emitir(TipoEvento.PUERTA, "Puerta {num1}-{num2} " + estado,
+                           puerta=PuertaVista(self, i), num1=self.puerta_lado1[i] + 1,
+                           num2=self.puerta_lado2[i] + 1, abierta=abierta)
+
+    def num_puertas_abiertas(self):
+        return self.abiertas.count(1)
+
+    def __str__(self):
+        return f"LaberintoRejilla({self.ancho}x{self.alto})"
@@ -0,0 +1,163 @@
+"""
+Relojes inyectables para el juego.
+
+'Modo.dormir', el hilo de cada bicho en 'Juego.lanzar_bicho' y el
+'Planificador' no llaman a time.sleep directamente: piden la hora y duermen
+a través de un Reloj.
+
+- RelojReal: tiempo de pared (time.monotonic / time.sleep).
+- RelojSimulado: tiempo virtual que avanza al instante. Una partida de diez
+  minutos termina en cuanto la CPU lo permite y con el mismo orden de
+  acciones que en tiempo real.
+"""
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+
+class Reloj:
+    """
+    Interfaz común de los relojes.
+    """
+    def ahora(self):
+        raise NotImplementedError("Subclase debe implementarlo")
+
+    def dormir(self, segundos):
+        raise NotImplementedError("Subclase debe implementarlo")
+
+    def envolver(self, funcion):
+        """
+        Adapta la función objetivo de un hilo que va a dormir con este reloj.
+        """
+        return funcion
+
+    def retener(self):
+        """
+        Impide que el tiempo avance mientras dure el bloque 'with'
+        (por ejemplo, mientras se lanzan todos los hilos de los bichos).
+        """
+        return contextlib.nullcontext()
+
+
+class RelojReal(Reloj):
+    def ahora(self):
+        return time.monotonic()
+
+    def dormir(self, segundos):
+        if segundos > 0:
+            time.sleep(segundos)
+
+
+RELOJ_REAL = RelojReal()
+
+
+class RelojSimulado(Reloj):
+    """
+    Reloj de eventos discretos.
+
+    Los hilos lanzados con envolver() (o que llaman a registrar()) son
+    'participantes': el tiempo solo avanza cuando todos ellos están dormidos,
+    y entonces se despierta únicamente al siguiente en la cola (por instante y,
+    a igualdad, por orden de alta). Así los bichos se ejecutan de uno en uno y
+    en un orden reproducible.
+
+    Un hilo no participante que duerme (p. ej. el principal) hace avanzar el
+    tiempo sin esperar a nadie cuando no hay participantes despiertos.
+    """
+    _SIN_ORDEN = float("inf")
+
+    def __init__(self, inicio=0.0):
+        self._ahora = inicio
+        self._cond = threading.Condition()
+        self._cola = []  # heap de [instante, orden_hilo, orden, participante, despierto]
+        self._secuencia = itertools.count()
+        self._altas = itertools.count()
+        self._participantes = 0
+        self._dormidos = 0
+        self._local = threading.local()
+
+    def ahora(self):
+        return self._ahora
+
+    def avanzar(self, segundos):
+        """
+        Adelanta el reloj desde fuera de la simulación (p. ej. en un test).
+        """
+        self.dormir(segundos)
+
+    # -- Participantes --
+    def registrar(self):
+        """
+        Hace participante al hilo actual.
+        """
+        with self._cond:
+            self._participantes += 1
+            self._local.orden = next(self._altas)
+        self._local.participante = True
+
+    def retirar(self):
+        """
+        El hilo actual deja de participar (por ejemplo, porque su bicho murió).
+        """
+        self._local.participante = False
+        with self._cond:
+            self._participantes -= 1
+            self._avanzar()
+
+    def envolver(self, funcion):
+        # El alta se hace ya, en el hilo que lanza, para que el tiempo no
+        # avance antes de que el nuevo hilo llegue a su primer dormir().
+        with self._cond:
+            self._participantes += 1
+            orden = next(self._altas)
+
+        def hilo(*args, **kwargs):
+            self._local.participante = True
+            self._local.orden = orden
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                self.retirar()
+        return hilo
+
+    @contextlib.contextmanager
+    def retener(self):
+        with self._cond:
+            self._participantes += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._participantes -= 1
+                self._avanzar()
+
+    # -- Tiempo --
+    def dormir(self, segundos):
+        participante = getattr(self._local, "participante", False)
+        orden = self._local.orden if participante else self._SIN_ORDEN
+        with self._cond:
+            entrada = [self._ahora + max(0.0, segundos), orden,
+                       next(self._secuencia), participante, False]
+            heapq.heappush(self._cola, entrada)
+            if participante:
+                self._dormidos += 1
+            self._avanzar()
+            while not entrada[4]:
+                self._cond.wait()
+
+    def _avanzar(self):
+        # Llamar con self._cond adquirido.
+        despertados = False
+        while self._cola and self._dormidos >= self._participantes:
+            entrada = heapq.heappop(self._cola)
+            if entrada[0] > self._ahora:
+                self._ahora = entrada[0]
+            entrada[4] = True
+            despertados = True
+            if entrada[3]:
+                self._dormidos -= 1
+                break
+        if despertados:
+            self._cond.notify_all()
@@ -0,0 +1,389 @@
+"""
+Registro de acciones de una partida y reproducción determinista.
+
+Un Grabador escucha el bus y añade a un archivo binario cada acción que
+cambia el estado: movimientos (Habitacion.entrar, a donde lleva
+Orientacion.caminar), ataques (Ente.es_atacado_por), puertas que se abren o
+cierran y muertes. Las acciones se empaquetan en un búfer y se escriben en
+bloques. Un cerrojo fija un orden único aunque los bichos vayan en hilos.
+
+Cada tick (Grabador.tick, o enganchado al al_tick de un Planificador) deja
+una marca. Cada 'cada' ticks se guarda además una instantánea completa
+(instantaneas.py): son los puntos de control para saltar a un tick.
+
+Un Reproductor vuelve a ejecutar las acciones sobre un juego construido con
+el mismo JSON, llamando a los mismos métodos (entrar, es_atacado_por,
+abrir/cerrar). No hay hilos, esperas ni azar, así que el resultado es
+siempre el mismo y va a la máxima velocidad. ir_a(tick) restaura el punto
+de control anterior y ejecuta solo lo que falta.
+
+Formato (little-endian): cabecera b"REP1" y versión, y luego registros que
+empiezan por su tipo:
+    MOVER, ATAQUE, PUERTA, MUERTE   tipo, a, b (ver Grabador)
+    TICK                            tipo, número de tick, instante del reloj
+    CONTROL                         tipo, tick, longitud y la instantánea
+                                    comprimida con zlib
+
+Los bichos se identifican por su posición en juego.bichos (el personaje es
+-1) y las puertas por su posición en el esquema de instantaneas.py.
+
+Uso:
+    grabador = Grabador(juego, "partida.rep")
+    grabador.enganchar(plan)
+    plan.ejecutar(duracion=600)
+    grabador.cerrar()
+
+    python repeticion.py partida.rep laberinto.json --hasta 500 --verificar
+"""
+import argparse
+import collections
+import json
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from eventos import SumideroNulo, TipoEvento, bus
+from instantaneas import Instantanea, capturar, esquema, restaurar
+from main import Director
+
+MAGIA = b"REP1"
+VERSION = 1
+
+_CABECERA = struct.Struct("<4sH")
+_ACCION = struct.Struct("<Bii")     # tipo, a, b
+_TICK = struct.Struct("<Bid")       # tipo, tick, instante
+_CONTROL = struct.Struct("<BiI")    # tipo, tick, longitud de la instantánea
+
+# Tipos de registro.
+MOVER = 1     # a = ente, b = num de la habitación de destino
+ATAQUE = 2    # a = víctima, b = atacante
+PUERTA = 3    # a = puerta, b = 1 si se abre, 0 si se cierra
+MUERTE = 4    # a = bicho
+TICK = 5
+CONTROL = 6
+
+PERSONAJE = -1
+_DESCONOCIDO = -2
+
+NOMBRES = {MOVER: "mover", ATAQUE: "ataque", PUERTA: "puerta", MUERTE: "muerte",
+           TICK: "tick", CONTROL: "control"}
+
+
+# =========================================
+# ===============  GRABADOR  ==============
+# =========================================
+class Grabador:
+    """
+    Graba las acciones de 'juego' en 'ruta'. Empieza con un punto de
+    control del estado actual y añade otro cada 'cada' ticks.
+    """
+    def __init__(self, juego, ruta, cada=100, tam_bloque=64 * 1024):
+        self.juego = juego
+        self.cada = cada
+        self.ticks = 0
+        self.acciones = 0
+        self._tam_bloque = tam_bloque
+        self._bufer = bytearray(_CABECERA.pack(MAGIA, VERSION))
+        self._cerrojo = threading.Lock()
+        self._archivo = open(ruta, "wb")
+        self._puertas, _, self._bichos = esquema(juego).indices()
+        self.punto_de_control()
+        bus.suscribir(TipoEvento.MOVIMIENTO, self._movimiento)
+        bus.suscribir(TipoEvento.ATAQUE, self._ataque)
+        bus.suscribir(TipoEvento.PUERTA, self._puerta)
+        bus.suscribir(TipoEvento.MUERTE, self._muerte)
+
+    def _ente(self, ente):
+        if ente is not None and ente is self.juego.person:
+            return PERSONAJE
+        return self._bichos.get(ente, _DESCONOCIDO)
+
+    def _anotar(self, tipo, a, b):
+        with self._cerrojo:
+            self._bufer += _ACCION.pack(tipo, a, b)
+            self.acciones += 1
+            if len(self._bufer) >= self._tam_bloque:
+                self._escribir()
+
+    # -- Eventos --
+    def _movimiento(self, evento):
+        ente = self._ente(evento.datos["ente"])
+        if ente != _DESCONOCIDO:
+            self._anotar(MOVER, ente, evento.datos["num"])
+
+    def _ataque(self, evento):
+        victima = self._ente(evento.datos["victima"])
+        atacante = self._ente(evento.datos["atacante"])
+        if victima != _DESCONOCIDO and atacante != _DESCONOCIDO:
+            self._anotar(ATAQUE, victima, atacante)
+
+    def _puerta(self, evento):
+        puerta = self._puertas.get(evento.datos["puerta"])
+        if puerta is not None:
+            self._anotar(PUERTA, puerta, 1 if evento.datos["abierta"] else 0)
+
+    def _muerte(self, evento):
+        bicho = self._bichos.get(evento.datos["bicho"])
+        if bicho is not None:
+            self._anotar(MUERTE, bicho, 0)
+
+    # -- Ticks y puntos de control --
+    def tick(self, ahora=None):
+        """
+        Marca el final de un tick (y guarda un punto de control si toca).
+        """
+        if ahora is None:
+            ahora = self.juego.reloj.ahora()
+        with self._cerrojo:
+            self.ticks += 1
+            self._bufer += _TICK.pack(TICK, self.ticks, ahora)
+        if self.cada and self.ticks % self.cada == 0:
+            self.punto_de_control()
+
+    def punto_de_control(self):
+        datos = zlib.compress(capturar(self.juego).a_bytes(), 1)
+        with self._cerrojo:
+            self._bufer += _CONTROL.pack(CONTROL, self.ticks, len(datos))
+            self._bufer += datos
+            self._escribir()
+
+    def enganchar(self, plan):
+        """
+        Marca un tick al final de cada tick del Planificador, después de su
+        al_tick anterior (si lo tenía).
+        """
+        anterior = plan.al_tick
+
+        def al_tick(ahora):
+            if anterior is not None:
+                anterior(ahora)
+            self.tick(ahora)
+        plan.al_tick = al_tick
+
+    # -- Archivo --
+    def _escribir(self):
+        self._archivo.write(self._bufer)
+        self._bufer.clear()
+
+    def vaciar(self):
+        with self._cerrojo:
+            self._escribir()
+            self._archivo.flush()
+
+    def cerrar(self):
+        """
+        Deja de escuchar, guarda un último punto de control y cierra el archivo.
+        """
+        bus.desuscribir(TipoEvento.MOVIMIENTO, self._movimiento)
+        bus.desuscribir(TipoEvento.ATAQUE, self._ataque)
+        bus.desuscribir(TipoEvento.PUERTA, self._puerta)
+        bus.desuscribir(TipoEvento.MUERTE, self._muerte)
+        if self._archivo.closed:
+            return
+        self.punto_de_control()
+        self._archivo.close()
+
+
+# =========================================
+# =============  REPRODUCTOR  =============
+# =========================================
+class Reproductor:
+    """
+    Reproduce un registro sobre 'juego', que debe tener el mismo laberinto
+    y los mismos bichos que el grabado (p. ej. construido con el mismo JSON).
+    Al crearlo, el juego queda en el primer punto de control.
+    """
+    def __init__(self, ruta, juego):
+        with open(ruta, "rb") as f:
+            self._datos = f.read()
+        magia, version = _CABECERA.unpack_from(self._datos, 0)
+        if magia != MAGIA or version != VERSION:
+            raise ValueError(f"{ruta}: no es un registro de partida ({magia!r}, v{version})")
+        self.juego = juego
+        # Puntos de control: (tick, inicio de la instantánea, fin del registro).
+        self.controles = []
+        self.ticks = 0
+        self.acciones = 0
+        self._indexar()
+        if not self.controles:
+            raise ValueError(f"{ruta}: no tiene ningún punto de control")
+        esq = esquema(juego)
+        self._puertas = esq.puertas
+        self._bichos = esq.bichos
+        self.tick_actual = None
+        self._pos = None
+        self._restaurar_control(0)
+
+    def _indexar(self):
+        # Una pasada por el archivo. Un registro final a medio escribir se ignora.
+        datos, pos, fin = self._datos, _CABECERA.size, len(self._datos)
+        while pos < fin:
+            tipo = datos[pos]
+            if tipo == CONTROL:
+                if pos + _CONTROL.size > fin:
+                    break
+                _, tick, largo = _CONTROL.unpack_from(datos, pos)
+                inicio = pos + _CONTROL.size
+                if inicio + largo > fin:
+                    break
+                pos = inicio + largo
+                self.controles.append((tick, inicio, pos))
+            elif tipo == TICK:
+                if pos + _TICK.size > fin:
+                    break
+                self.ticks = _TICK.unpack_from(datos, pos)[1]
+                pos += _TICK.size
+            elif tipo in NOMBRES:
+                if pos + _ACCION.size > fin:
+                    break
+                self.acciones += 1
+                pos += _ACCION.size
+            else:
+                raise ValueError(f"Registro desconocido {tipo} en la posición {pos}")
+        self._fin = pos
+
+    def control(self, i):
+        """
+        Instantánea del punto de control i.
+        """
+        _, inicio, fin = self.controles[i]
+        return Instantanea.desde_bytes(zlib.decompress(self._datos[inicio:fin]))
+
+    def _restaurar_control(self, i):
+        restaurar(self.juego, self.control(i))
+        self.tick_actual = self.controles[i][0]
+        self._pos = self.controles[i][2]
+
+    # -- Reproducción --
+    def ir_a(self, tick):
+        """
+        Deja el juego como estaba al final de 'tick'. Si hace falta volver
+        atrás o el salto es largo, parte del último punto de control anterior.
+        """
+        tick = max(0, min(tick, self.ticks))
+        i = max(k for k, (t, _, _) in enumerate(self.controles) if t <= tick)
+        if tick < self.tick_actual or self.controles[i][0] > self.tick_actual:
+            self._restaurar_control(i)
+        self.reproducir(hasta=None if tick >= self.ticks else tick)
+        return self.juego
+
+    def reproducir(self, hasta=None):
+        """
+        Ejecuta acciones desde la posición actual hasta el final de 'hasta'
+        (por defecto, hasta el final del registro). Devuelve cuántas ejecuta.
+        Si la partida termina en un tick, instante_fin es el instante de ese tick.
+        """
+        juego = self.juego
+        puertas, bichos = self._puertas, self._bichos
+        buscar = juego.laberinto.buscador()
+        datos, pos, fin = self._datos, self._pos, self._fin
+        accion = _ACCION.unpack_from
+        ejecutadas = 0
+        terminado = juego.terminado
+        while pos < fin and (hasta is None or self.tick_actual < hasta):
+            tipo = datos[pos]
+            if tipo == TICK:
+                _, self.tick_actual, instante = _TICK.unpack_from(datos, pos)
+                pos += _TICK.size
+                if juego.terminado and not terminado:
+                    juego.instante_fin = instante
+                    terminado = True
+                continue
+            if tipo == CONTROL:
+                pos += _CONTROL.size + _CONTROL.unpack_from(datos, pos)[2]
+                continue
+            _, a, b = accion(datos, pos)
+            pos += _ACCION.size
+            ejecutadas += 1
+            if tipo == MOVER:
+                ente = juego.person if a == PERSONAJE else bichos[a]
+                buscar(b).entrar(ente)
+            elif tipo == ATAQUE:
+                victima = juego.person if a == PERSONAJE else bichos[a]
+                atacante = juego.person if b == PERSONAJE else bichos[b]
+                victima.es_atacado_por(atacante)
+            elif tipo == PUERTA:
+                if b:
+                    puertas[a].abrir()
+                else:
+                    puertas[a].cerrar()
+            elif tipo == MUERTE:
+                # Las muertes por ataque ya ocurrieron al reproducir el ataque;
+                # solo quedan las de fin de partida (terminar_bichos).
+                bicho = bichos[a]
+                if bicho.esta_vivo():
+                    juego.terminar_bicho(bicho)
+        self._pos = pos
+        return ejecutadas
+
+    def verificar(self):
+        """
+        Reproduce todo desde el principio y compara el estado con cada punto
+        de control. Devuelve el tick del primero que no coincide, o None.
+        """
+        self._restaurar_control(0)
+        for i in range(1, len(self.controles)):
+            tick = self.controles[i][0]
+            self.reproducir(hasta=None if tick >= self.ticks else tick)
+            if _columnas(capturar(self.juego)) != _columnas(self.control(i)):
+                return tick
+        return None
+
+
+def _columnas(inst):
+    return (inst.puertas, inst.bombas, inst.vidas, inst.poder, inst.posiciones,
+            inst.modos, inst.personaje, inst.partida)
+
+
+def resumen(ruta):
+    """
+    Cuántos registros de cada tipo hay en 'ruta' (sin reproducirlo).
+    """
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    cuenta = collections.Counter()
+    pos = _CABECERA.size
+    while pos < len(datos):
+        tipo = datos[pos]
+        cuenta[NOMBRES.get(tipo, "desconocido")] += 1
+        if tipo == CONTROL:
+            pos += _CONTROL.size + _CONTROL.unpack_from(datos, pos)[2]
+        elif tipo == TICK:
+            pos += _TICK.size
+        else:
+            pos += _ACCION.size
+    return dict(cuenta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduce un registro de partida.")
+    parser.add_argument("registro", help="archivo grabado con Grabador")
+    parser.add_argument("laberinto", help="JSON con el que se construyó el juego")
+    parser.add_argument("--hasta", type=int, default=None, help="tick al que ir")
+    parser.add_argument("--verificar", action="store_true",
+                        help="comparar con todos los puntos de control")
+    args = parser.parse_args(argv)
+
+    bus.configurar(sumideros=[SumideroNulo()])
+    with open(args.laberinto, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    director = Director(compacto=True)
+    director.procesar_datos(datos)
+    rep = Reproductor(args.registro, director.obtener_juego())
+    informe = {"registros": resumen(args.registro), "ticks": rep.ticks}
+    if args.verificar:
+        informe["diverge_en_tick"] = rep.verificar()
+    inicio = time.perf_counter()
+    rep.ir_a(rep.ticks if args.hasta is None else args.hasta)
+    segundos = time.perf_counter() - inicio
+    informe.update({"tick": rep.tick_actual, "segundos": segundos,
+                    "poblacion": rep.juego.estadisticas_poblacion(),
+                    "ganador": rep.juego.ganador})
+    print(json.dumps(informe, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+"""
+Servidor de partidas: miles de Juego independientes en un solo proceso.
+
+demo.py juega una partida por proceso, con un input() bloqueante y un hilo
+por bicho. Aquí un bucle asyncio atiende todas las conexiones (TCP local o
+socket Unix) y cada conexión juega su propia partida con un protocolo de
+líneas de texto.
+
+Plantillas: cada laberinto se construye una sola vez con Director y se
+guarda en el formato binario de formato_binario.py. Ese buffer es inmutable
+y lo comparten todas las sesiones. Cada sesión lo abre con un
+LaberintoMapeado, que construye sus propias habitaciones y puertas solo
+cuando alguien las pide: lo que se modifica (ocupantes, puertas abiertas,
+bichos, personaje) es siempre de la sesión y lo que nadie ha tocado sigue
+sin copiarse.
+
+Los bichos de todas las sesiones comparten un Planificador, que el bucle
+despierta cada 'tick' segundos: una sesión no cuesta nada mientras sus
+bichos duermen. Como en demo.py, los bichos no persiguen al personaje; le
+atacan si coinciden en la misma habitación.
+
+Protocolo (una orden por línea, una respuesta por orden):
+    JUGAR [plantilla] [nombre]   -> OK sesion <id> hab <num>
+    MOVER norte|sur|este|oeste   -> OK hab <num>        (también w/s/d/a)
+    ATACAR                       -> OK vivos <bichos vivos>
+    ABRIR <lado> / CERRAR <lado> -> OK
+    ESTADO                       -> OK hab <num> vidas <vidas> vivos <n>
+    PLANTILLAS                   -> OK <nombre> <nombre>...
+    SALIR                        -> ADIOS
+Los errores responden "ERR <motivo>". El fin de la partida se avisa en una
+línea aparte que empieza por '*': "* FIN personaje" o "* FIN bichos".
+
+Uso:
+    python servidor.py servir lab.json [otro.json...] --puerto 7777
+    python servidor.py servir --rejilla 30 --bichos 100 --unix /tmp/lab.sock
+    python servidor.py carga --puerto 7777 --clientes 500 --comandos 200
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+
+from eventos import SumideroNulo, TipoEvento, bus
+from formato_binario import LaberintoMapeado, a_bytes
+from main import LADOS_POR_NOMBRE, ORIENTACIONES, Director
+from planificador import Planificador
+
+ATAJOS = {"w": "norte", "s": "sur", "d": "este", "a": "oeste"}
+
+
+# =========================================
+# ==============  PLANTILLAS  =============
+# =========================================
+class Plantilla:
+    """
+    Laberinto inmutable (buffer .lab) del que se crean las partidas.
+    """
+    def __init__(self, nombre, buffer):
+        self.nombre = nombre
+        self.buffer = buffer
+
+    @classmethod
+    def desde_datos(cls, nombre, datos):
+        """
+        Construye el laberinto del dict 'datos' con Director y lo congela.
+        """
+        director = Director(compacto=True)
+        director.procesar_datos(datos)
+        return cls(nombre, a_bytes(director.obtener_juego()))
+
+    @classmethod
+    def desde_archivo(cls, ruta):
+        """
+        Plantilla de un .json (con Director) o de un .lab ya convertido.
+        """
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        if ruta.endswith(".lab"):
+            with open(ruta, "rb") as f:
+                return cls(nombre, f.read())
+        with open(ruta, "r", encoding="utf-8") as f:
+            return cls.desde_datos(nombre, json.load(f))
+
+    def nuevo_juego(self):
+        return LaberintoMapeado(buffer=self.buffer).fabricar_juego()
+
+
+# =========================================
+# ===============  SESIONES  ==============
+# =========================================
+class Sesion:
+    """
+    Una partida: su juego y la conexión a la que avisar del final.
+    """
+    __slots__ = ('id', 'plantilla', 'juego', 'escritor')
+
+    def __init__(self, id, plantilla, juego, escritor):
+        self.id = id
+        self.plantilla = plantilla
+        self.juego = juego
+        self.escritor = escritor
+
+
+class Servidor:
+    """
+    Sesiones, plantillas y el Planificador compartido. ejecutar(sesion, linea)
+    interpreta una orden sin tocar la red; atender() la conecta a un socket.
+    """
+    def __init__(self, plantillas, tick=0.05):
+        self.plantillas = {p.nombre: p for p in plantillas}
+        if not self.plantillas:
+            raise ValueError("El servidor necesita al menos una plantilla")
+        self.por_defecto = next(iter(self.plantillas))
+        self.plan = Planificador(tick=tick)
+        self.sesiones = {}
+        self._por_juego = {}
+        self._ids = itertools.count(1)
+        self.ordenes = 0
+        bus.suscribir(TipoEvento.FIN_JUEGO, self._al_terminar)
+
+    # -- Sesiones --
+    def abrir_sesion(self, nombre_plantilla=None, jugador="Jugador", escritor=None):
+        plantilla = self.plantillas.get(nombre_plantilla or self.por_defecto)
+        if plantilla is None:
+            raise KeyError(nombre_plantilla)
+        juego = plantilla.nuevo_juego()
+        juego.agregar_personaje(jugador)
+        sesion = Sesion(next(self._ids), plantilla, juego, escritor)
+        self.sesiones[sesion.id] = sesion
+        self._por_juego[juego] = sesion
+        self.plan.agregar_juego(juego)
+        return sesion
+
+    def cerrar_sesion(self, sesion):
+        if self.sesiones.pop(sesion.id, None) is None:
+            return
+        self._por_juego.pop(sesion.juego, None)
+        sesion.juego.terminar_bichos()  # el Planificador los descarta
+
+    def _al_terminar(self, evento):
+        sesion = self._por_juego.get(evento.datos["juego"])
+        if sesion is not None and sesion.escritor is not None:
+            sesion.escritor.write(f"* FIN {evento.datos['ganador']}\n".encode("utf-8"))
+
+    # -- Órdenes --
+    def ejecutar(self, sesion, linea):
+        """
+        Ejecuta una línea del protocolo. Devuelve (sesion, respuesta): JUGAR
+        cambia la sesión de la conexión.
+        """
+        partes = linea.split()
+        if not partes:
+            return sesion, "ERR orden vacía"
+        orden, args = partes[0].upper(), partes[1:]
+        self.ordenes += 1
+        if orden == "JUGAR":
+            # La partida en curso solo se cierra si la nueva se ha abierto.
+            nombre = args[0] if args else None
+            if nombre is not None and nombre not in self.plantillas:
+                return sesion, f"ERR no existe la plantilla {nombre}"
+            try:
+                nueva = self.abrir_sesion(nombre, args[1] if len(args) > 1 else "Jugador",
+                                          sesion.escritor if sesion is not None else None)
+            except Exception as e:
+                return sesion, self._error(orden, e)
+            if sesion is not None:
+                self.cerrar_sesion(sesion)
+            return nueva, f"OK sesion {nueva.id} hab {nueva.juego.person.posicion.num}"
+        if orden == "PLANTILLAS":
+            return sesion, "OK " + " ".join(self.plantillas)
+        if orden == "SALIR":
+            return sesion, "ADIOS"
+        manejador = self._ORDENES.get(orden)
+        if manejador is None:
+            return sesion, f"ERR orden desconocida {partes[0]}"
+        if sesion is None:
+            return sesion, "ERR sin partida (JUGAR)"
+        if sesion.juego.terminado and orden != "ESTADO":
+            return sesion, "ERR partida terminada"
+        try:
+            return sesion, manejador(self, sesion.juego, args)
+        except Exception as e:
+            return sesion, self._error(orden, e)
+
+    def _error(self, orden, e):
+        # Un fallo del juego al ejecutar una orden se contesta con ERR en
+        # lugar de cerrar la conexión.
+        motivo = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        bus.emitir(TipoEvento.INCIDENCIA, "Error en {orden}: {motivo}", orden=orden, motivo=motivo)
+        return f"ERR {motivo}"
+
+    def _lado(self, juego, args):
+        if not args:
+            return None, "ERR falta el lado"
+        lado = LADOS_POR_NOMBRE.get(ATAJOS.get(args[0], args[0]))
+        if lado is None:
+            return None, f"ERR lado desconocido {args[0]}"
+        return lado, None
+
+    def _mover(self, juego, args):
+        lado, error = self._lado(juego, args)
+        if error:
+            return error
+        juego.mover_personaje_hacia(ORIENTACIONES[lado])
+        return f"OK hab {juego.person.posicion.num}"
+
+    def _atacar(self, juego, args):
+        juego.person.atacar()
+        return f"OK vivos {juego.num_bichos_vivos()}"
+
+    def _puerta(self, juego, args, abrir):
+        lado, error = self._lado(juego, args)
+        if error:
+            return error
+        elemento = getattr(juego.person.posicion, lado)
+        if elemento is None or not elemento.es_puerta():
+            return f"ERR no hay puerta al {lado}"
+        if abrir:
+            elemento.abrir()
+        else:
+            elemento.cerrar()
+        return "OK"
+
+    def _estado(self, juego, args):
+        p = juego.person
+        return f"OK hab {p.posicion.num} vidas {p.vidas} vivos {juego.num_bichos_vivos()}"
+
+    _ORDENES = {
+        "MOVER": _mover,
+        "ATACAR": _atacar,
+        "ABRIR": lambda self, juego, args: self._puerta(juego, args, True),
+        "CERRAR": lambda self, juego, args: self._puerta(juego, args, False),
+        "ESTADO": _estado,
+    }
+
+    # -- Red --
+    async def atender(self, lector, escritor):
+        sesion = None
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                sesion, respuesta = self.ejecutar(sesion, linea.decode("utf-8", "replace"))
+                if sesion is not None:
+                    sesion.escritor = escritor
+                escritor.write(respuesta.encode("utf-8") + b"\n")
+                if respuesta == "ADIOS":
+                    break
+                await escritor.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if sesion is not None:
+                self.cerrar_sesion(sesion)
+            escritor.close()
+
+    async def latir(self):
+        """
+        Despierta a los bichos de todas las sesiones cada 'tick' segundos.
+        """
+        plan = self.plan
+        while True:
+            plan.paso(plan.ahora())
+            await asyncio.sleep(plan.tick)
+
+    async def servir(self, anfitrion="127.0.0.1", puerto=7777, unix=None):
+        """
+        Escucha en TCP (anfitrion:puerto) o en el socket Unix 'unix' hasta
+        que se cancele.
+        """
+        if unix:
+            servidor = await asyncio.start_unix_server(self.atender, path=unix, backlog=4096)
+        else:
+            servidor = await asyncio.start_server(self.atender, anfitrion, puerto, backlog=4096)
+        latido = asyncio.create_task(self.latir())
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            latido.cancel()
+
+    def cerrar(self):
+        for sesion in list(self.sesiones.values()):
+            self.cerrar_sesion(sesion)
+        bus.desuscribir(TipoEvento.FIN_JUEGO, self._al_terminar)
+
+
+# =========================================
+# ========  GENERADOR DE CARGA  ===========
+# =========================================
+async def _leer_respuesta(lector):
+    while True:
+        linea = await lector.readline()
+        if not linea:
+            raise ConnectionError("el servidor cerró la conexión")
+        if not linea.startswith(b"*"):  # avisos de fin de partida
+            return linea.decode("utf-8").rstrip("\n")
+
+
+async def _cliente(conectar, comandos, rng, latencias, plantilla):
+    lector, escritor = await conectar()
+    jugar = f"JUGAR {plantilla}\n".encode("utf-8") if plantilla else b"JUGAR\n"
+    errores = 0
+    try:
+        escritor.write(jugar)
+        await _leer_respuesta(lector)
+        for _ in range(comandos):
+            tirada = rng.random()
+            if tirada < 0.5:
+                orden = f"MOVER {rng.choice('wasd')}\n".encode("utf-8")
+            elif tirada < 0.8:
+                orden = b"ATACAR\n"
+            elif tirada < 0.9:
+                orden = f"ABRIR {rng.choice('wasd')}\n".encode("utf-8")
+            else:
+                orden = b"ESTADO\n"
+            inicio = time.perf_counter()
+            escritor.write(orden)
+            respuesta = await _leer_respuesta(lector)
+            latencias.append(time.perf_counter() - inicio)
+            if respuesta == "ERR partida terminada":
+                escritor.write(jugar)
+                await _leer_respuesta(lector)
+            elif respuesta.startswith("ERR") and not respuesta.startswith("ERR no hay puerta"):
+                errores += 1
+        escritor.write(b"SALIR\n")
+        await _leer_respuesta(lector)
+    finally:
+        escritor.close()
+    return errores
+
+
+def _percentil(ordenadas, q):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+
+async def generar_carga(anfitrion="127.0.0.1", puerto=7777, unix=None, clientes=100,
+                        comandos=100, semilla=0, plantilla=None):
+    """
+    Abre 'clientes' conexiones a la vez; cada una juega una partida y envía
+    'comandos' órdenes al azar esperando cada respuesta. Devuelve órdenes por
+    segundo y latencias (p50, p99, máxima) en segundos.
+    """
+    if unix:
+        def conectar():
+            return asyncio.open_unix_connection(unix)
+    else:
+        def conectar():
+            return asyncio.open_connection(anfitrion, puerto)
+    latencias = []
+    inicio = time.perf_counter()
+    errores = await asyncio.gather(*(
+        _cliente(conectar, comandos, random.Random(semilla * 100_003 + i), latencias, plantilla)
+        for i in range(clientes)))
+    segundos = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "clientes": clientes,
+        "ordenes": len(latencias),
+        "segundos": segundos,
+        "ordenes_por_segundo": len(latencias) / segundos if segundos else 0.0,
+        "p50": _percentil(latencias, 0.50),
+        "p99": _percentil(latencias, 0.99),
+        "maxima": latencias[-1] if latencias else 0.0,
+        "errores": sum(errores),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de partidas asyncio.")
+    sub = parser.add_subparsers(dest="accion", required=True)
+
+    servir = sub.add_parser("servir", help="atender partidas")
+    servir.add_argument("laberintos", nargs="*", help="archivos .json o .lab (plantillas)")
+    servir.add_argument("--rejilla", type=int, default=30,
+                        help="sin archivos: rejilla sintética de lado x lado")
+    servir.add_argument("--bichos", type=int, default=100)
+    servir.add_argument("--tick", type=float, default=0.05)
+
+    carga = sub.add_parser("carga", help="generador de carga")
+    carga.add_argument("--clientes", type=int, default=100)
+    carga.add_argument("--comandos", type=int, default=100, help="órdenes por cliente")
+    carga.add_argument("--semilla", type=int, default=0)
+    carga.add_argument("--plantilla", default=None)
+
+    for p in (servir, carga):
+        p.add_argument("--anfitrion", default="127.0.0.1")
+        p.add_argument("--puerto", type=int, default=7777)
+        p.add_argument("--unix", default=None, help="ruta de un socket Unix en vez de TCP")
+    args = parser.parse_args(argv)
+
+    if args.accion == "carga":
+        r = asyncio.run(generar_carga(args.anfitrion, args.puerto, args.unix, args.clientes,
+                                      args.comandos, args.semilla, args.plantilla))
+        print(f"{r['ordenes']} órdenes de {r['clientes']} clientes en {r['segundos']:.2f} s: "
+              f"{r['ordenes_por_segundo']:,.0f} órdenes/s, p50 {r['p50'] * 1e3:.2f} ms, "
+              f"p99 {r['p99'] * 1e3:.2f} ms, máx {r['maxima'] * 1e3:.2f} ms, "
+              f"{r['errores']} errores")
+        return
+
+    bus.configurar(sumideros=[SumideroNulo()])
+    if args.laberintos:
+        plantillas = [Plantilla.desde_archivo(ruta) for ruta in args.laberintos]
+    else:
+        from benchmark import generar_json_rejilla
+        datos = generar_json_rejilla(args.rejilla, args.rejilla, args.bichos)
+        plantillas = [Plantilla.desde_datos("rejilla", datos)]
+    servidor = Servidor(plantillas, tick=args.tick)
+    donde = args.unix or f"{args.anfitrion}:{args.puerto}"
+    print(f"Sirviendo {', '.join(servidor.plantillas)} en {donde}")
+    try:
+        asyncio.run(servidor.servir(args.anfitrion, args.puerto, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.cerrar()
+
+
+if __name__ == "__main__":
+    main()